@@ -75,6 +75,34 @@ class DefaultSpecificState(enum.Enum):
     UNKNOWN = "UNKNOWN"
 
 
+class _RoleObjects(OrderedDict):
+    """Contained objects mapped by role, some of which may be deferred
+
+    A deferred role has a loader, that is called the first time the role
+    is looked up, and that must set the object with ConfiguredObject.replace_object.
+    """
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.loaders: Dict[str, Callable[[], None]] = {}
+
+    def __getitem__(self, role: str) -> Union[object, None]:
+        loader = self.loaders.get(role)
+        if loader is not None:
+            loader()
+            self.loaders.pop(role, None)
+        return super().__getitem__(role)
+
+    def get(self, role: str, default: Any = None) -> Union[object, None]:
+        if role in self:
+            return self[role]
+        return default
+
+    def copy(self) -> TOrderedDict[str, Union[object, None]]:
+        """Copy of the objects loaded so far, deferred roles are not loaded"""
+        return OrderedDict((role, dict.__getitem__(self, role)) for role in self)
+
+
 class ConfiguredObject:
     """Superclass for classes that take configuration from YAML files"""
 
@@ -95,7 +123,7 @@ class ConfiguredObject:
 
         self.name = name
 
-        self._objects: TOrderedDict[str, Union[object, None]] = OrderedDict(
+        self._objects: TOrderedDict[str, Union[object, None]] = _RoleObjects(
             (role, None) for role in self.all_roles
         )
 
@@ -122,6 +150,31 @@ class ConfiguredObject:
         else:
             raise ValueError("Unknown contained Object role: %s" % role)
 
+    def defer_object(self, role: str, loader: Callable[[], None]) -> None:
+        """Defer the loading of a contained Object to the first access to its role
+
+        Args:
+            role (str): Role name of contained Object
+            loader (Callable[[], None]): Called on first access,
+                must set the object with replace_object
+
+        Raises:
+            ValueError: If contained object role is unknown.
+        """
+        if role in self._objects:
+            self._objects.loaders[role] = loader
+        else:
+            raise ValueError("Unknown contained Object role: %s" % role)
+
+    @property
+    def deferred_roles(self) -> Tuple[str]:
+        """Roles of the contained Objects that are not loaded yet
+
+        Returns:
+            Tuple[str]: Deferred object roles
+        """
+        return tuple(self._objects.loaders)
+
     # NB this function must be re-implemented in nested subclasses
     @property
     def all_roles(self) -> Tuple[str]:
@@ -137,6 +190,7 @@ class ConfiguredObject:
         """All contained Objects mapped by role (in specification order).
 
         Includes objects defined in subclasses.
+        Deferred objects that are not loaded yet are None.
 
         Returns:
             OrderedDict[str, Union[Self, None]]: Contained objects mapped by role.
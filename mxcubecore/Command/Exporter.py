@@ -34,15 +34,24 @@ __license__ = "LGPLv3+"
 EXPORTER_CLIENTS = {}
 
 
-def start_exporter(address, port, timeout=3, retries=1):
+def start_exporter(address, port, timeout=3, retries=1, pipelined=False):
     """Start the exporter"""
     global EXPORTER_CLIENTS
     if (address, port) not in EXPORTER_CLIENTS:
-        client = Exporter(address, port, timeout)
+        client = Exporter(address, port, timeout, pipelined=pipelined)
         EXPORTER_CLIENTS[(address, port)] = client
         client.start()
         return client
-    return EXPORTER_CLIENTS[(address, port)]
+    client = EXPORTER_CLIENTS[(address, port)]
+    if pipelined != client.pipelined:
+        logging.getLogger("HWR").warning(
+            "Exporter %s:%s already started with pipelined=%s, pipelined=%s ignored",
+            address,
+            port,
+            client.pipelined,
+            pipelined,
+        )
+    return client
 
 
 class Exporter(ExporterClient.ExporterClient, object):
@@ -69,8 +78,10 @@ class Exporter(ExporterClient.ExporterClient, object):
     STATE_FAULT = "Fault"
     STATE_UNKNOWN = "Unknown"
 
-    def __init__(self, address, port, timeout=3, retries=1):
-        super(Exporter, self).__init__(address, port, PROTOCOL.STREAM, timeout, retries)
+    def __init__(self, address, port, timeout=3, retries=1, pipelined=False):
+        super(Exporter, self).__init__(
+            address, port, PROTOCOL.STREAM, timeout, retries, pipelined
+        )
 
         self.started = False
         self.callbacks = {}
@@ -180,7 +191,9 @@ class ExporterCommand(CommandObject):
     ):
         CommandObject.__init__(self, name, username, **kwargs)
         self.command = command
-        self.__exporter = start_exporter(address, port, timeout)
+        self.__exporter = start_exporter(
+            address, port, timeout, pipelined=kwargs.get("pipelined", False)
+        )
         msg = "Attaching Exporter command: {} {}".format(address, name)
         logging.getLogger("HWR").debug(msg)
 
@@ -229,7 +242,9 @@ class ExporterChannel(ChannelObject):
     ):
         ChannelObject.__init__(self, name, username, **kwargs)
 
-        self.__exporter = start_exporter(address, port, timeout)
+        self.__exporter = start_exporter(
+            address, port, timeout, pipelined=kwargs.get("pipelined", False)
+        )
         self.attribute_name = attribute_name
         self.value = None
 
@@ -19,14 +19,10 @@
 #  along with MXCuBE. If not, see <http://www.gnu.org/licenses/>.
 
 import logging
+import weakref
 import gevent
 import gevent.event
-
-try:
-    import Queue as queue
-except ImportError:
-    import queue
-
+from gevent import _threading
 
 from mxcubecore.CommandContainer import (
     CommandObject,
@@ -118,38 +114,225 @@ class TangoCommand(CommandObject):
         return self.device is not None
 
 
-def process_tango_events():
-    while not TangoChannel._tangoEventsQueue.empty():
+class _TangoEventQueue:
+    """Coalescing queue of Tango events
+
+    Events are pushed from the Tango threads; only the latest value of each
+    channel is kept until the gevent hub wakes up, then all the pending
+    values are delivered to their receivers in a single greenlet.
+    """
+
+    def __init__(self):
+        self._lock = _threading.Lock()
+        self._pending = {}
+        # one receiver per subscribed channel, removed when the channel dies
+        self._receivers = {}
+        self.events_received = 0
+        self.events_coalesced = 0
+        self.events_delivered = 0
+        self._async_watcher = gevent.get_hub().loop.async_()
+        self._async_watcher.start(self._process)
+
+    def register(self, channel_id, receiver):
+        def remove_receiver(_):
+            self._receivers.pop(channel_id, None)
+
+        self._receivers[channel_id] = saferef.safe_ref(receiver, remove_receiver)
+
+    def put(self, channel_id, value):
+        with self._lock:
+            self.events_received += 1
+            if channel_id in self._pending:
+                self.events_coalesced += 1
+            self._pending[channel_id] = value
+        self._async_watcher.send()
+
+    def get_statistics(self):
+        return {
+            "receivers": len(self._receivers),
+            "pending": len(self._pending),
+            "events_received": self.events_received,
+            "events_coalesced": self.events_coalesced,
+            "events_delivered": self.events_delivered,
+        }
+
+    def _process(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if pending:
+            gevent.spawn(self._deliver, pending)
+
+    def _deliver(self, pending):
+        for channel_id, value in pending.items():
+            receiver_ref = self._receivers.get(channel_id)
+            receiver = receiver_ref() if receiver_ref is not None else None
+            if receiver is None:
+                continue
+            self.events_delivered += 1
+            try:
+                receiver(value)
+            except Exception:
+                log.exception("Error while processing Tango event")
+
+
+def get_event_statistics():
+    """Return the counters of the Tango events queue"""
+    return TangoChannel._tango_events.get_statistics()
+
+
+class _PolledDevice:
+    """Attributes of one Tango device polled with the same period
+
+    All the attributes are read with a single read_attributes() call, the
+    values are then dispatched to the channels, with the same change
+    detection as a channel polled on its own. If the grouped read fails,
+    the attributes are read one by one: the channels of the attributes
+    which cannot be read fail, and are no longer polled, as a channel
+    polled on its own.
+    """
+
+    # number of network round-trips saved by grouping the reads
+    round_trips_saved = 0
+
+    def __init__(self, device_name, polling, read_as_str):
+        self.key = (device_name, polling, read_as_str)
+        self.device_name = device_name
+        self.polling = polling
+        self.read_as_str = read_as_str
+        self.raw_device = DeviceProxy(device_name)
+        # read from the polling threads, changed in the gevent hub only
+        self._lock = _threading.Lock()
+        self.channels = []
+        self.poller = None
+
+    def add_channel(self, channel):
+        with self._lock:
+            self.channels.append((weakref.ref(channel), channel.attribute_name))
+        if self.poller is None:
+            self.poller = Poller.poll(
+                self.read,
+                polling_period=self.polling,
+                value_changed_callback=self.dispatch,
+                error_callback=self.poll_failed,
+                compare=False,
+            )
+
+    def _read(self, read_call, *args):
+        while True:
+            try:  # in case of tango communication errors, retry reading the attributes
+                return read_call(*args)
+            except PyTango.CommunicationFailed:
+                log.warning(
+                    f"error polling {self.raw_device} {args[0]}, retrying.",
+                    exc_info=True,
+                )
+
+    def read(self):
+        with self._lock:
+            channels = [(ref, attr) for ref, attr in self.channels if ref() is not None]
+        attribute_names = [attr for _, attr in channels]
+        if not attribute_names:
+            return []
+
+        if self.read_as_str:
+            extract_as = PyTango.DeviceAttribute.ExtractAs.String
+        else:
+            extract_as = PyTango.DeviceAttribute.ExtractAs.Numpy
+
         try:
-            ev = TangoChannel._tangoEventsQueue.get_nowait()
-        except queue.Empty:
-            break
+            attributes = self._read(
+                self.raw_device.read_attributes, attribute_names, extract_as
+            )
+        except PyTango.DevFailed as error:
+            if len(attribute_names) == 1:
+                raise
+            attributes = []
+            for attribute_name in attribute_names:
+                try:
+                    attributes.append(
+                        self._read(
+                            self.raw_device.read_attribute, attribute_name, extract_as
+                        )
+                    )
+                except PyTango.DevFailed as attribute_error:
+                    attributes.append(attribute_error)
+            if all(isinstance(attr, PyTango.DevFailed) for attr in attributes):
+                # the device itself cannot be read
+                raise error
         else:
-            try:
-                receiverCbRef = TangoChannel._eventReceivers[id(ev)]
-                receiverCb = receiverCbRef()
-                if receiverCb is not None:
-                    try:
-                        gevent.spawn(receiverCb, ev.event.attr_value.value)
-                    except AttributeError:
-                        pass
-            except KeyError:
-                pass
+            _PolledDevice.round_trips_saved += len(attribute_names) - 1
+        return [(ref, attr) for (ref, _), attr in zip(channels, attributes)]
+
+    def dispatch(self, values):
+        failed = []
+        for ref, attr in values:
+            channel = ref()
+            if channel is None:
+                failed.append(ref)
+            elif isinstance(attr, PyTango.DevFailed):
+                failed.append(ref)
+                channel.poll_failed(attr, None)
+            elif getattr(attr, "has_failed", False):
+                # no value, as a channel polled on its own: None, on change only
+                channel.polled_value_changed(None)
+            else:
+                channel.polled_value_changed(attr.value)
 
+        with self._lock:
+            self.channels = [
+                (ref, attr)
+                for ref, attr in self.channels
+                if ref not in failed and ref() is not None
+            ]
+        if not self.channels:
+            self.stop()
 
-class E:
-    def __init__(self, event):
-        self.event = event
+    def poll_failed(self, e, poller_id):
+        # a new poller is started when the next channel is added
+        if self.poller is not None:
+            self.poller.stop()
+            self.poller = None
 
+        with self._lock:
+            channels = list(self.channels)
+        for ref, _ in channels:
+            channel = ref()
+            if channel is not None:
+                channel.poll_failed(e, poller_id)
 
-class TangoChannel(ChannelObject):
-    _tangoEventsQueue = queue.Queue()
-    _eventReceivers = {}
+    def stop(self):
+        if self.poller is not None:
+            self.poller.stop()
+            self.poller = None
+        if _POLLED_DEVICES.get(self.key) is self:
+            del _POLLED_DEVICES[self.key]
 
-    _tangoEventsProcessingTimer = gevent.get_hub().loop.async_()
 
-    # start Tango events processing timer
-    _tangoEventsProcessingTimer.start(process_tango_events)
+_POLLED_DEVICES = {}
+
+
+def get_polled_device(device_name, polling, read_as_str=False):
+    """Return the group of polled attributes for a device and polling period"""
+    key = (device_name, polling, read_as_str)
+    polled_device = _POLLED_DEVICES.get(key)
+    if polled_device is None:
+        polled_device = _POLLED_DEVICES[key] = _PolledDevice(*key)
+    return polled_device
+
+
+def get_polling_statistics():
+    """Return the number of grouped polled devices and of round-trips saved"""
+    return {
+        "polled_devices": len(_POLLED_DEVICES),
+        "polled_attributes": sum(
+            len(polled_device.channels) for polled_device in _POLLED_DEVICES.values()
+        ),
+        "round_trips_saved": _PolledDevice.round_trips_saved,
+    }
+
+
+class TangoChannel(ChannelObject):
+    _tango_events = _TangoEventQueue()
 
     def __init__(
         self,
@@ -170,8 +353,11 @@ class TangoChannel(ChannelObject):
         self.polling = polling
         self.polling_timer = None
         self.polling_events = False
+        self._polled_value = Poller.NotInitializedValue
         self.timeout = int(timeout)
         self.read_as_str = kwargs.get("read_as_str", False)
+        # keep array values as read-only numpy arrays instead of lists
+        self.as_ndarray = kwargs.get("as_ndarray", False)
         self._device_initialized = gevent.event.Event()
         self.init_device()
         self.continue_init(None)
@@ -197,19 +383,17 @@ class TangoChannel(ChannelObject):
         # self.init_poller.stop()
 
         if isinstance(self.polling, int):
-            self.raw_device = DeviceProxy(self.device_name)
-
-            Poller.poll(
-                self.poll,
-                polling_period=self.polling,
-                value_changed_callback=self.update,
-                error_callback=self.poll_failed,
+            polled_device = get_polled_device(
+                self.device_name, self.polling, self.read_as_str
             )
+            self.raw_device = polled_device.raw_device
+            polled_device.add_channel(self)
         else:
             if self.polling == "events":
                 # try to register event
                 try:
                     self.polling_events = True
+                    TangoChannel._tango_events.register(id(self), self.update)
                     # logging.getLogger("HWR").debug("subscribing to CHANGE event for %s", self.attribute_name)
                     self.device.subscribe_event(
                         self.attribute_name,
@@ -266,30 +450,12 @@ class TangoChannel(ChannelObject):
         else:
             pass
             # logging.getLogger("HWR").debug("%s, receiving good event", self.name())
-        ev = E(event)
-        TangoChannel._eventReceivers[id(ev)] = saferef.safe_ref(self.update)
-        TangoChannel._tangoEventsQueue.put(ev)
-        TangoChannel._tangoEventsProcessingTimer.send()
-
-    def poll(self):
-        def read_attr():
-            if self.read_as_str:
-                value = self.raw_device.read_attribute(
-                    self.attribute_name, PyTango.DeviceAttribute.ExtractAs.String
-                ).value
-            else:
-                value = self.raw_device.read_attribute(self.attribute_name).value
+        TangoChannel._tango_events.put(id(self), event.attr_value.value)
 
-            return value
-
-        while True:
-            try:  # in case of tango communication errors, retry reading the attribute
-                return read_attr()
-            except PyTango.CommunicationFailed:
-                log.warning(
-                    f"error polling {self.raw_device} {self.attribute_name} attribute, retrying.",
-                    exc_info=True,
-                )
+    def polled_value_changed(self, value):
+        if not Poller.is_equal(value, self._polled_value):
+            self._polled_value = value
+            self.update(value)
 
     def poll_failed(self, e, poller_id):
         self.emit("update", None)
@@ -328,7 +494,10 @@ class TangoChannel(ChannelObject):
         # start with checking if we have a numpy array, as comparing
         # numpy.ndarray to Poller.NotInitializedValue raises a ValueError exception
         if isinstance(value, numpy.ndarray):
-            value = value.tolist()
+            if self.as_ndarray:
+                value.flags.writeable = False
+            else:
+                value = value.tolist()
         elif value == Poller.NotInitializedValue:
             value = self.get_value()
         elif isinstance(value, tuple):
@@ -345,10 +514,7 @@ class TangoChannel(ChannelObject):
         else:
             value = self.device.read_attribute(self.attribute_name).value
 
-        if isinstance(value, numpy.ndarray):
-            if not numpy.array_equal(value, self.value):
-                self.update(value)
-        elif value != self.value:
+        if not Poller.is_equal(value, self.value):
             self.update(value)
 
         return value
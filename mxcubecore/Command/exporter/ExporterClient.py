@@ -21,6 +21,7 @@
 """Exporter Client implementation"""
 
 import logging
+import gevent
 from .StandardClient import StandardClient, ProtocolError
 
 __copyright__ = """ Copyright © 2019 by the MXCuBE collaboration """
@@ -45,6 +46,8 @@ ARRAY_SEPARATOR = ""  # 0x001F
 class ExporterClient(StandardClient):
     """ExporterClient class"""
 
+    PIPELINE_PROBE_CMD = CMD_NAME
+
     def on_message_received(self, msg):
         """Act if the message is an event, pass to StandardClient otherwise.
         Args:
@@ -186,6 +189,23 @@ class ExporterClient(StandardClient):
             pass
         return process_return
 
+    def read_properties(self, props, timeout=-1):
+        """Read several properties. The requests are all sent at once if
+        the client is pipelined, one after the other otherwise.
+        Args:
+            props(list): property names
+        Returns:
+            (list): replies from the process, in the same order.
+        Raises:
+            The error of the first request which failed.
+        """
+        if not self.check_pipeline_support():
+            return [self.read_property(prop, timeout) for prop in props]
+
+        tasks = [gevent.spawn(self.read_property, prop, timeout) for prop in props]
+        gevent.joinall(tasks)
+        return [task.get() for task in tasks]
+
     def read_property_as_string_array(self, prop):
         """Read a propery and convert the return value to list of strings.
         Args:
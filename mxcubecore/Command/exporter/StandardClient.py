@@ -19,9 +19,11 @@
 #  along with MXCuBE. If not, see <http://www.gnu.org/licenses/>.
 
 """ ProtocolError and StandardClient implementation"""
+import logging
 import sys
 import socket
 import gevent
+import gevent.event
 import gevent.lock
 
 __copyright__ = """ Copyright © 2019 by the MXCuBE collaboration """
@@ -66,6 +68,72 @@ else:
 
 MAX_SIZE_STREAM_MSG = 500000
 
+_STX = b"\x02"
+_ETX = b"\x03"
+
+
+class StreamFramer:
+    """Extract the STX ... ETX delimited frames from a byte stream.
+
+    The received chunks are searched with bytes.find and the frame content
+    is copied in bulk into a reusable bytearray.
+    Bytes outside a frame are ignored, a STX inside a frame restarts it.
+    """
+
+    def __init__(self, max_size=MAX_SIZE_STREAM_MSG):
+        self.max_size = max_size
+        self.buffer = bytearray()
+        self.receiving = False
+
+    def reset(self):
+        """Drop the frame being received"""
+        self.buffer.clear()
+        self.receiving = False
+
+    def feed(self, data):
+        """Process a received chunk.
+        Args:
+            data(bytes): received bytes
+        Returns:
+            (list): the complete frames (bytes), without STX and ETX
+        """
+        frames = []
+        view = memoryview(data)
+        pos = 0
+        size = len(data)
+        while pos < size:
+            if not self.receiving:
+                stx = data.find(_STX, pos)
+                if stx < 0:
+                    break
+                self.buffer.clear()
+                self.receiving = True
+                pos = stx + 1
+                continue
+
+            etx = data.find(_ETX, pos)
+            stx = data.find(_STX, pos, size if etx < 0 else etx)
+            if stx >= 0:
+                # new frame started before the end of the current one
+                self.buffer.clear()
+                pos = stx + 1
+            elif etx < 0:
+                self.buffer += view[pos:]
+                break
+            else:
+                if self.buffer:
+                    self.buffer += view[pos:etx]
+                    frames.append(bytes(self.buffer))
+                    self.buffer.clear()
+                else:
+                    frames.append(data[pos:etx])
+                self.receiving = False
+                pos = etx + 1
+
+        if len(self.buffer) > self.max_size:
+            self.reset()
+        return frames
+
 
 class PROTOCOL:
     """Protocol"""
@@ -75,9 +143,25 @@ class PROTOCOL:
 
 
 class StandardClient:
-    """Standard JLib client"""
-
-    def __init__(self, server_ip, server_port, protocol, timeout, retries):
+    """Standard JLib client
+
+    In stream mode the requests are serialized: one request is sent and its
+    reply awaited before the next one. With pipelined=True, the requests are
+    tagged with a message number (as the datagrams are) and many of them can
+    be in flight, the replies being matched to the requests by their number.
+    The server support is checked with PIPELINE_PROBE_CMD on the first
+    request; the client falls back to the serialized mode if the reply is
+    not tagged, or if the probe got no reply PIPELINE_PROBE_ATTEMPTS times.
+    """
+
+    # command used to check if the server supports tagged requests
+    PIPELINE_PROBE_CMD = None
+    # number of probes without reply before falling back to serialized mode
+    PIPELINE_PROBE_ATTEMPTS = 3
+
+    def __init__(
+        self, server_ip, server_port, protocol, timeout, retries, pipelined=False
+    ):
         self.server_ip = server_ip
         self.server_port = server_port
         self.timeout = timeout
@@ -93,6 +177,11 @@ class StandardClient:
         self.__sock = None
         self.__constant_local_port = True
         self._is_connected = False
+        self.pipelined = pipelined and self.PIPELINE_PROBE_CMD is not None
+        self._pipeline_supported = None
+        self._pipeline_probe_failures = 0
+        self._pending_requests = {}
+        self._request_index = 0
 
     def __create_socket(self):
         """Create socket"""
@@ -111,6 +200,9 @@ class StandardClient:
         self._is_connected = False
         self.__sock = None
         self.received_msg = None
+        pending_requests, self._pending_requests = self._pending_requests, {}
+        for result in pending_requests.values():
+            result.set_exception(SocketError("Socket error: disconnected"))
 
     def connect(self):
         """Socket connect"""
@@ -234,11 +326,23 @@ class StandardClient:
         else:
             self.disconnect()
 
+    def is_pipelined(self):
+        """Check if the requests are pipelined
+        Returns:
+            (bool): True if many requests can be in flight
+        """
+        return bool(self.pipelined and self._pipeline_supported)
+
     def on_message_received(self, msg):
         """Actions
         Args:
             msg(str): Message
         """
+        if self._pending_requests and msg[4:5] == " ":
+            result = self._pending_requests.pop(msg[:4], None)
+            if result is not None:
+                result.set(msg[5:])
+                return
         self.received_msg = msg
         self.msg_received_event.set()
 
@@ -248,8 +352,7 @@ class StandardClient:
             self.on_connected()
         except Exception:
             pass
-        buffer = empty_buffer()
-        mReceivedSTX = False
+        framer = StreamFramer()
         while True:
             ret = self.__sock.recv(4096)
             if not ret:
@@ -257,32 +360,16 @@ class StandardClient:
                 self.error = "Disconnected"
                 self.__close_socket()
                 break
-            for b in ret:
-                if b == STX:
-                    buffer = empty_buffer()
-                    mReceivedSTX = True
-                elif b == ETX:
-                    if mReceivedSTX:
-                        try:
-                            # Unicode decoding exception catching,
-                            # consider errors='ignore'
-                            buffer_utf8 = buffer.decode()
-                        except UnicodeDecodeError as e:
-                            # Syntax not allowed in Python 2
-                            # raise ProtocolError from e
-                            raise ProtocolError(
-                                "UnicodeDecodeError: %s" % (sys.exc_info(),)
-                            )
-                        self.on_message_received(buffer_utf8)
-                        mReceivedSTX = False
-                        buffer = empty_buffer()
-                else:
-                    if mReceivedSTX:
-                        buffer += _bytes([b])
-
-            if len(buffer) > MAX_SIZE_STREAM_MSG:
-                mReceivedSTX = False
-                buffer = empty_buffer()
+            for frame in framer.feed(ret):
+                try:
+                    # Unicode decoding exception catching,
+                    # consider errors='ignore'
+                    buffer_utf8 = frame.decode()
+                except UnicodeDecodeError as e:
+                    # Syntax not allowed in Python 2
+                    # raise ProtocolError from e
+                    raise ProtocolError("UnicodeDecodeError: %s" % (sys.exc_info(),))
+                self.on_message_received(buffer_utf8)
         try:
             self.on_disconnected()
         except Exception:
@@ -322,6 +409,85 @@ class StandardClient:
                 self.msg_received_event.wait()
             return self.received_msg
 
+    def __next_request_tag(self):
+        """Get a free message number
+        Returns:
+            (str): The four digits message number
+        """
+        while True:
+            self._request_index = self._request_index % 9999 + 1
+            tag = "%04d" % self._request_index
+            if tag not in self._pending_requests:
+                return tag
+
+    def check_pipeline_support(self):
+        """Send the probe command tagged, the reply is tagged as well
+        if the server supports pipelined requests. If the probe fails, it is
+        sent again with the next request, up to PIPELINE_PROBE_ATTEMPTS times.
+        Returns:
+            (bool): True if the requests are pipelined
+        """
+        if not self.pipelined or self._pipeline_supported is not None:
+            return self.is_pipelined()
+
+        self._lock.acquire()
+        try:
+            if self._pipeline_supported is None:
+                ret = self.__send_receive_stream("0000 " + self.PIPELINE_PROBE_CMD)
+                self._pipeline_supported = ret[:5] == "0000 "
+                if not self._pipeline_supported:
+                    logging.getLogger("HWR").info(
+                        "%s:%s does not support pipelined requests, "
+                        "falling back to serialized mode",
+                        self.server_ip,
+                        self.server_port,
+                    )
+        except (TimeoutError, SocketError):
+            # the server did not answer: probe again with the next request
+            self._pipeline_probe_failures += 1
+            if self._pipeline_probe_failures < self.PIPELINE_PROBE_ATTEMPTS:
+                logging.getLogger("HWR").debug(
+                    "%s:%s pipelined requests probe failed, requests serialized",
+                    self.server_ip,
+                    self.server_port,
+                )
+            else:
+                self._pipeline_supported = False
+                logging.getLogger("HWR").warning(
+                    "%s:%s pipelined requests probe failed %d times, "
+                    "falling back to serialized mode",
+                    self.server_ip,
+                    self.server_port,
+                    self._pipeline_probe_failures,
+                )
+        finally:
+            self._lock.release()
+        return self.is_pipelined()
+
+    def __send_receive_pipelined(self, cmd, timeout):
+        """Send a tagged command and wait for the reply with the same tag.
+        Args:
+            cmd(str): command
+            timeout(float): timeout [s], None for no timeout
+        Returns:
+            (str): reply form the socket
+        Raises:
+            TimeoutError, SocketError
+        """
+        if not self.is_connected():
+            self.connect()
+        tag = self.__next_request_tag()
+        result = gevent.event.AsyncResult()
+        self._pending_requests[tag] = result
+        try:
+            self.__send_stream(tag + " " + cmd)
+            try:
+                return result.get(timeout=timeout)
+            except gevent.Timeout:
+                raise TimeoutError("Timeout error: no reply to %s" % cmd)
+        finally:
+            self._pending_requests.pop(tag, None)
+
     def send_receive(self, cmd, timeout=-1):
         """Send/receive command, locking the socket.
         Args:
@@ -329,6 +495,11 @@ class StandardClient:
         Returns:
             (str): reply form the socket
         """
+        if self.protocol == PROTOCOL.STREAM and self.check_pipeline_support():
+            if timeout is not None and timeout < 0:
+                timeout = self.default_timeout
+            return self.__send_receive_pipelined(cmd, timeout)
+
         self._lock.acquire()
         try:
             if (timeout is None) or (timeout >= 0):
@@ -27,6 +27,7 @@ import xml.sax
 from xml.sax.handler import ContentHandler
 
 from mxcubecore import BaseHardwareObjects
+from mxcubecore.utils import config_cache
 
 
 CURRENT_XML = None
@@ -57,17 +58,23 @@ def parse(filename, name):
     except Exception:
         CURRENT_XML = None
 
-    xml.sax.parse(filename, cur_handler)
+    if CURRENT_XML is not None and config_cache.get_cache_directory():
+        events = config_cache.load_xml_events(filename, CURRENT_XML)
+        config_cache.replay_xml_events(events, cur_handler)
+    else:
+        xml.sax.parse(filename, cur_handler)
 
     return cur_handler.get_hardware_object()
 
 
-def parse_string(xml_hardware_object, name):
+def parse_string(xml_hardware_object, name, filename=None):
     """[summary]
 
     Args:
         xml_hardware_object ([type]): [description]
         name ([type]): [description]
+        filename (str): File the XML string was read from, if any.
+            Used as key in the configuration cache.
 
     Returns:
         [type]: [description]
@@ -75,7 +82,11 @@ def parse_string(xml_hardware_object, name):
     global CURRENT_XML
     CURRENT_XML = xml_hardware_object
     cur_handler = HardwareObjectHandler(name)
-    xml.sax.parseString(str.encode(xml_hardware_object), cur_handler)
+    if filename is not None and config_cache.get_cache_directory():
+        events = config_cache.load_xml_events(filename, xml_hardware_object)
+        config_cache.replay_xml_events(events, cur_handler)
+    else:
+        xml.sax.parseString(str.encode(xml_hardware_object), cur_handler)
     return cur_handler.get_hardware_object()
 
 
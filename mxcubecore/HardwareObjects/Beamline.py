@@ -168,6 +168,19 @@ class Beamline(ConfiguredObject):
         """
         self._hardware_object_id_dict = self._get_id_dict()
 
+    def replace_object(self, role: str, new_object: object) -> None:
+        """Replace already defined Object with a new one - for runtime use
+
+        Args:
+            role (str): Role name of contained Object
+            new_object (object): New contained Object
+        """
+        super().replace_object(role, new_object)
+        if self._hardware_object_id_dict and new_object:
+            # e.g. a deferred object, loaded on first access
+            self._hardware_object_id_dict[new_object] = role
+            self._get_id_dict_rec(new_object, role, self._hardware_object_id_dict)
+
     def get_id(self, ho: HardwareObject) -> str:
         """
         Returns "dotted path/attribute" which is unique within the context of
@@ -205,9 +218,8 @@ class Beamline(ConfiguredObject):
         """
         result = {}
 
-        for ho_name in self.all_roles:
-            ho = self._objects.get(ho_name)
-
+        # Deferred objects are added when they are loaded, see replace_object
+        for ho_name, ho in self.all_objects_by_role.items():
             if ho:
                 result[ho] = ho_name
                 self._get_id_dict_rec(ho, ho_name, result)
@@ -16,13 +16,14 @@
 #
 #  You should have received a copy of the GNU Lesser General Public License
 #  along with MXCuBE. If not, see <http://www.gnu.org/licenses/>.
-import redis
 import json
 import gevent
 import logging
 
 from enum import Enum, unique
 
+import numpy as np
+
 from mxcubecore.BaseHardwareObjects import HardwareObject
 
 
@@ -76,15 +77,80 @@ def two_d_data(x, y):
     return {"x": x, "y": y, "z": z}
 
 
+class DataBuffer:
+    """
+    Last data points of a source, in a preallocated ring buffer
+    """
+
+    def __init__(self, capacity, data_dim=PlotDim.ONE_D.value):
+        """
+        Args:
+            capacity (int): Number of points kept, the oldest points being
+                            overwritten by the new ones
+            data_dim (int): Data dimension, 1 for x, y and 2 for x, y, z data
+        """
+        self.axes = ("x", "y", "z")[: data_dim + 1]
+        self._data = np.full((capacity, len(self.axes)), np.nan)
+        self._count = 0
+
+    def __len__(self):
+        return min(self._count, len(self._data))
+
+    @property
+    def capacity(self):
+        return len(self._data)
+
+    def append(self, point):
+        """
+        Append point
+
+        Args:
+            point (dict): x, y, (z) data
+        """
+        self._data[self._count % len(self._data)] = [
+            point.get(axis, float("nan")) for axis in self.axes
+        ]
+        self._count += 1
+
+    def clear(self):
+        self._count = 0
+
+    def get(self, start=0, stop=None):
+        """
+        Points start to stop (excluded, as in a slice) of the points kept
+
+        Returns:
+            (dict): Lists of the x, y, (z) values, as floats
+        """
+        size = len(self)
+        indices = range(size)[start:stop]
+        rows = (np.arange(indices.start, indices.stop) + self._count - size) % len(
+            self._data
+        )
+        values = self._data[rows]
+        return {axis: values[:, i].tolist() for i, axis in enumerate(self.axes)}
+
+
 class DataPublisher(HardwareObject):
     """
     DataPublisher handles data publishing
+
+    The data of each source is kept in a DataBuffer of buffer_size points,
+    and written to redis (limited to the same number of points) in batches:
+    when flush_size points are waiting or every flush_interval seconds.
     """
 
     def __init__(self, name):
         super(DataPublisher, self).__init__(name)
         self._r = None
         self._subsribe_task = None
+        self._buffers = {}
+        self._pending = {}
+        self._flush_task = None
+        self._flush_failures = 0
+        self._buffer_size = 100000
+        self._flush_size = 100
+        self._flush_interval = 0.5
 
     def init(self):
         """
@@ -92,10 +158,19 @@ class DataPublisher(HardwareObject):
         """
         super(DataPublisher, self).init()
 
+        # only needed when a data publisher is configured
+        import redis
+
         rhost = self.get_property("host", "localhost")
         rport = self.get_property("port", 6379)
         rdb = self.get_property("db", 11)
 
+        self._buffer_size = int(self.get_property("buffer_size", self._buffer_size))
+        self._flush_size = int(self.get_property("flush_size", self._flush_size))
+        self._flush_interval = float(
+            self.get_property("flush_interval", self._flush_interval)
+        )
+
         self._r = redis.Redis(
             host=rhost, port=rport, db=rdb, charset="utf-8", decode_responses=True
         )
@@ -110,61 +185,60 @@ class DataPublisher(HardwareObject):
         pubsub = self._r.pubsub(ignore_subscribe_messages=True)
         pubsub.psubscribe("HWR_DP_NEW_DATA_POINT_*")
 
-        _data = {}
-
         # The descriptions of active sources for fast access
         # while publishing data
         active_source_desc = {}
 
         for message in pubsub.listen():
             if message:
-                try:
-                    redis_channel = message["channel"]
-                    _id = redis_channel.split("_")[-1]
-
-                    data = json.loads(message["data"])
-
-                    if data["type"] == FrameType.START.value:
-                        _data[redis_channel] = {"x": [], "y": []}
-
-                        self._update_description(_id, {"running": True})
-
-                        # Clear previous data so that we are not acumelating
-                        # with previously published data
-                        self._clear_data(_id)
-
-                        self.emit(
-                            "start", self.get_description(_id, include_data=True)[0]
-                        )
-
-                        active_source_desc[redis_channel] = self._get_description(_id)
-
-                    elif data["type"] == FrameType.STOP.value:
-                        self._update_description(_id, {"running": False})
-                        self.emit(
-                            "end", self.get_description(_id, include_data=True)[0]
-                        )
-                        active_source_desc.pop(redis_channel)
-                    elif data["type"] == FrameType.DATA.value:
-                        _data[redis_channel] = {
-                            "x": _data[redis_channel]["x"] + [data["data"]["x"]],
-                            "y": _data[redis_channel]["y"] + [data["data"]["y"]],
-                        }
-
-                        self.emit(
-                            "data",
-                            {"id": _id, "data": data["data"]},
-                        )
-
-                        self._append_data(
-                            _id, data["data"], active_source_desc[redis_channel]
-                        )
-                    else:
-                        msg = "Unknown frame type %s" % message
-                        logging.getLogger("HWR").error(msg)
-                except Exception:
-                    msg = "Could not parse data in %s" % message
-                    logging.getLogger("HWR").exception(msg)
+                self._handle_message(message, active_source_desc)
+
+    def _handle_message(self, message, active_source_desc):
+        """
+        Handles a published message
+
+        Args:
+            message (dict): pubsub message
+            active_source_desc (dict): description of each active source
+        """
+        try:
+            redis_channel = message["channel"]
+            _id = redis_channel.split("_")[-1]
+
+            data = json.loads(message["data"])
+
+            if data["type"] == FrameType.START.value:
+                self._update_description(_id, {"running": True})
+
+                # Clear previous data so that we are not acumelating
+                # with previously published data
+                self._clear_data(_id)
+
+                desc = self._get_description(_id)
+                self._buffers[_id] = DataBuffer(self._buffer_size, desc["data_dim"])
+
+                self.emit("start", self.get_description(_id, include_data=True)[0])
+
+                active_source_desc[redis_channel] = desc
+
+            elif data["type"] == FrameType.STOP.value:
+                self._flush_data(_id)
+                self._update_description(_id, {"running": False})
+                self.emit("end", self.get_description(_id, include_data=True)[0])
+                active_source_desc.pop(redis_channel)
+            elif data["type"] == FrameType.DATA.value:
+                self.emit(
+                    "data",
+                    {"id": _id, "data": data["data"]},
+                )
+
+                self._append_data(_id, data["data"], active_source_desc[redis_channel])
+            else:
+                msg = "Unknown frame type %s" % message
+                logging.getLogger("HWR").error(msg)
+        except Exception:
+            msg = "Could not parse data in %s" % message
+            logging.getLogger("HWR").exception(msg)
 
     def _remove_available(self, _id):
         """
@@ -255,18 +329,84 @@ class DataPublisher(HardwareObject):
 
     def _append_data(self, _id, data, desc):
         """
-        Append data to source with _id
+        Append data to source with _id. The data is written to redis by
+        _flush_data, when flush_size points are waiting or after
+        flush_interval seconds.
 
         Args:
             _id (str): The id of the source to remove
             desc (dict): Publisher description
             data: x, y, (z) data to append
         """
-        self._r.rpush("HWR_DP_%s_DATA_X" % _id, data.get("x", float("nan")))
-        self._r.rpush("HWR_DP_%s_DATA_Y" % _id, data.get("y", float("nan")))
+        buffer = self._buffers.get(_id)
+        if buffer is None:
+            buffer = self._buffers[_id] = DataBuffer(
+                self._buffer_size, desc["data_dim"]
+            )
+        buffer.append(data)
+
+        pending = self._pending.setdefault(_id, [])
+        pending.append(data)
+        if len(pending) >= self._flush_size:
+            self._flush_data(_id)
+        elif self._flush_task is None:
+            self._flush_task = gevent.spawn_later(
+                self._flush_interval, self._flush_data
+            )
 
-        if desc["data_dim"] > 1:
-            self._r.rpush("HWR_DP_%s_DATA_Z" % _id, data.get("z", float("nan")))
+    def _flush_data(self, _id=None):
+        """
+        Write the data waiting to be written of source with _id, or of all
+        sources, to redis: one pipeline with an rpush per list. If redis
+        fails, the data is written with the next data.
+        """
+        if _id is None:
+            self._flush_task = None
+            ids = list(self._pending)
+        else:
+            ids = [_id]
+
+        pipeline = self._r.pipeline(transaction=False)
+        flushed = {}
+        for _id in ids:
+            points = self._pending.pop(_id, None)
+            if not points:
+                continue
+            flushed[_id] = points
+            axes = self._buffers[_id].axes
+            for axis in axes:
+                key = "HWR_DP_%s_DATA_%s" % (_id, axis.upper())
+                pipeline.rpush(
+                    key, *[point.get(axis, float("nan")) for point in points]
+                )
+                pipeline.ltrim(key, -self._buffer_size, -1)
+        try:
+            pipeline.execute()
+        except Exception:
+            self._flush_failures += 1
+            if self._flush_failures == 1:
+                logging.getLogger("HWR").exception(
+                    "Could not write data to redis, retrying with the next data"
+                )
+            # the oldest points are dropped, as they would be in redis
+            for _id, points in flushed.items():
+                points.extend(self._pending.get(_id, []))
+                self._pending[_id] = points[-self._buffer_size :]
+            if self._flush_task is None:
+                self._flush_task = gevent.spawn_later(
+                    self._flush_interval, self._flush_data
+                )
+            return
+
+        if self._flush_failures:
+            logging.getLogger("HWR").info(
+                "Data written to redis after %d failed attempts", self._flush_failures
+            )
+            self._flush_failures = 0
+
+        if not self._pending and self._flush_task is not None:
+            self._flush_task.kill(block=False)
+            self._flush_task = None
 
     def _clear_data(self, _id):
         """
@@ -274,6 +414,11 @@ class DataPublisher(HardwareObject):
         """
         desc = self._get_description(_id)
 
+        self._pending.pop(_id, None)
+        buffer = self._buffers.get(_id)
+        if buffer is not None:
+            buffer.clear()
+
         self._r.delete("HWR_DP_%s_DATA_X" % _id)
         self._r.delete("HWR_DP_%s_DATA_Y" % _id)
 
@@ -359,18 +504,31 @@ class DataPublisher(HardwareObject):
 
         return desc
 
-    def get_data(self, _id):
-        desc = self._get_description(_id)
-        data = {
-            "x": self._r.lrange("HWR_DP_%s_DATA_X" % _id, 0, -1),
-            "y": self._r.lrange("HWR_DP_%s_DATA_Y" % _id, 0, -1),
-        }
+    def get_data(self, _id, start=0, stop=None):
+        """
+        Data of source with _id, points start to stop (excluded, as in a
+        slice), from the buffer of the source or from redis
 
-        if desc["data_dim"] > 1:
-            data.update(
-                {
-                    "z": self._r.lrange("HWR_DP_%s_DATA_Z" % _id, 0, -1),
-                }
-            )
+        Returns:
+            (dict): Lists of the x, y, (z) values, as floats
+        """
+        buffer = self._buffers.get(_id)
+        if buffer is not None:
+            return buffer.get(start, stop)
 
-        return data
+        desc = self._get_description(_id)
+        axes = ("x", "y", "z") if desc["data_dim"] > 1 else ("x", "y")
+        if stop == 0:
+            return {axis: [] for axis in axes}
+
+        # redis ranges include the last index
+        end = -1 if stop is None else stop - 1
+        return {
+            axis: [
+                float(value)
+                for value in self._r.lrange(
+                    "HWR_DP_%s_DATA_%s" % (_id, axis.upper()), start, end
+                )
+            ]
+            for axis in axes
+        }
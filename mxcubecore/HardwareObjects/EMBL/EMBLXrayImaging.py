@@ -24,12 +24,14 @@ import json
 import time
 import Image
 import logging
-import threading
+import tempfile
 import collections
 from queue import Queue
 from copy import deepcopy
 
 import gevent
+import gevent.monkey
+import gevent.threadpool
 
 import cv2 as cv
 import numpy as np
@@ -66,6 +68,24 @@ def read_image(filename, timeout=10):
         return cv.imread(filename, cv.IMREAD_ANYDEPTH)
 
 
+# time.sleep of the thread pool threads, not switching to a gevent hub
+_thread_sleep = gevent.monkey.get_original("time", "sleep")
+
+
+def read_frame(filename, timeout=10, poll_interval=0.05):
+    """Wait for an image file and read it, in a thread pool thread
+
+    Returns:
+        (numpy.ndarray): the image, None if the file is not there in time
+    """
+    deadline = time.time() + timeout
+    while not os.path.isfile(filename):
+        if time.time() > deadline:
+            return None
+        _thread_sleep(poll_interval)
+    return cv.imread(filename, cv.IMREAD_ANYDEPTH)
+
+
 class EMBLXrayImaging(QtGraphicsManager, AbstractCollect):
     def __init__(self, *args):
         QtGraphicsManager.__init__(self, *args)
@@ -77,7 +97,8 @@ class EMBLXrayImaging(QtGraphicsManager, AbstractCollect):
         self.qpixmap = None
         self.image_count = 0
         self.image_reading_thread = None
-        self.ff_corrected_list = []
+        self.image_reading_workers = None
+        self.image_cache_directory = None
         self.config_dict = {}
         self.collect_omega_start = 0
         self.omega_start = 0
@@ -142,6 +163,8 @@ class EMBLXrayImaging(QtGraphicsManager, AbstractCollect):
         self.image_dimension = (2048, 2048)
         self.reference_distance = self.get_property("reference_distance")
         self.reference_angle = self.get_property("reference_angle")
+        self.image_reading_workers = self.get_property("image_reading_workers", 8)
+        self.image_cache_directory = self.get_property("image_cache_directory")
 
         QtGraphicsManager.init(self)
 
@@ -703,46 +726,28 @@ class EMBLXrayImaging(QtGraphicsManager, AbstractCollect):
         # self.graphics_omega_reference_item.set_phi_position(angle)
         self.current_image_index = index
 
-        raw_image = self.image_reading_thread.get_raw_image(index)
-
         if self.ff_apply:
-            if self.ff_corrected_list[index] is None:
-                corrected_im_min_max = (
-                    self.image_reading_thread.get_corrected_im_min_max()
-                )
-                ff_image = self.image_reading_thread.get_ff_image(index).astype(float)
-                ff_corrected_image = np.divide(
-                    raw_image.astype(float),
-                    ff_image,
-                    out=np.ones_like(raw_image.astype(float)),
-                    where=ff_image != 0,
-                )
-                im = (
-                    255.0
-                    * (ff_corrected_image - corrected_im_min_max[0])
-                    / (corrected_im_min_max[1] - corrected_im_min_max[0])
-                )
-                self.ff_corrected_list[index] = im.astype(np.uint16)
-            else:
-                im = self.ff_corrected_list[index]
+            image = self.image_reading_thread.get_corrected_image(index)
+            im_min_max = self.image_reading_thread.get_corrected_im_min_max()
         else:
-            raw_im_min_max = self.image_reading_thread.get_raw_im_min_max()
-            im = (
-                255.0
-                * (raw_image - raw_im_min_max[0])
-                / (raw_im_min_max[1] - raw_im_min_max[0])
-            )
+            image = self.image_reading_thread.get_raw_image(index)
+            im_min_max = self.image_reading_thread.get_raw_im_min_max()
 
-        if im is not None:
-            self.qimage = qt_import.QImage(
-                im.astype(np.uint8),
-                im.shape[1],
-                im.shape[0],
-                im.shape[1],
-                qt_import.QImage.Format_Indexed8,
-            )
-            self.graphics_camera_frame.setPixmap(self.qpixmap.fromImage(self.qimage))
-            self.emit("imageLoaded", index)
+        if image is None:
+            return
+        im = np.subtract(image, im_min_max[0], dtype=np.float32)
+        im *= 255.0 / (im_min_max[1] - im_min_max[0])
+        np.clip(im, 0, 255, out=im)
+
+        self.qimage = qt_import.QImage(
+            im.astype(np.uint8),
+            im.shape[1],
+            im.shape[0],
+            im.shape[1],
+            qt_import.QImage.Format_Indexed8,
+        )
+        self.graphics_camera_frame.setPixmap(self.qpixmap.fromImage(self.qimage))
+        self.emit("imageLoaded", index)
 
     def display_image_relative(self, relative_index):
         self.display_image(self.current_image_index + relative_index)
@@ -786,6 +791,8 @@ class EMBLXrayImaging(QtGraphicsManager, AbstractCollect):
         self.config_dict = {}
         self.omega_start = HWR.beamline.diffractometer.get_omega_position()
         self.motor_positions = None
+        if self.image_reading_thread is not None:
+            self.image_reading_thread.set_stop()
         self.image_reading_thread = None
 
         if not data_model:
@@ -867,13 +874,13 @@ class EMBLXrayImaging(QtGraphicsManager, AbstractCollect):
                 )
 
         self.image_count = len(raw_filename_list)
-        if self.image_reading_thread is not None:
-            self.image_reading_thread.set_stop()
-
-        self.ff_corrected_list = [None] * self.image_count
 
-        self.image_reading_thread = ImageReadingThread(
-            raw_filename_list, ff_filename_list, ff_ssim
+        self.image_reading_thread = ImageFrameCache(
+            raw_filename_list,
+            ff_filename_list,
+            ff_ssim,
+            workers=self.image_reading_workers,
+            cache_directory=self.image_cache_directory,
         )
         self.image_reading_thread.start()
 
@@ -1008,26 +1015,54 @@ class GraphicsView(qt_import.QGraphicsView):
         self.wheelSignal.emit(event.delta())
 
 
-class ImageReadingThread(threading.Thread):
-    def __init__(self, raw_filename_list, ff_filename_list=[], ff_ssim=[]):
-        threading.Thread.__init__(self)
+class ImageFrameCache:
+    """Frames of an imaging collection, read by a thread pool
 
+    The raw frames are read into one preallocated (N, H, W) memory mapped
+    array, in the order they are read. The flat field corrected frames, as
+    float32, are computed the first time they are asked for, and kept in a
+    second memory mapped array of the same shape.
+    """
+
+    def __init__(
+        self,
+        raw_filename_list,
+        ff_filename_list=[],
+        ff_ssim=None,
+        workers=8,
+        cache_directory=None,
+    ):
+        """
+        Args:
+            raw_filename_list (list): raw image files, in collection order.
+            ff_filename_list (list): flat field image files.
+            ff_ssim (list): flat field to use for each raw image, as computed
+                            by the camera server (index 2, starting at 1).
+            workers (int): number of threads reading the files.
+            cache_directory (str): directory of the memory mapped files,
+                                   None for the system temporary directory.
+        """
         self.stopped = False
-        self.failed_to_read_count = 10
         self.raw_filename_list = raw_filename_list
         self.ff_filename_list = ff_filename_list
+        self.ff_ssim = ff_ssim
+        self.workers = workers
+        self.cache_directory = cache_directory
 
-        self.raw_image_list = [None] * len(self.raw_filename_list)
+        self.raw_images = None
         self.ff_image_list = [None] * len(self.ff_filename_list)
+        self.corrected_images = None
+        self.raw_loaded = np.zeros(len(self.raw_filename_list), dtype=bool)
+        self.corrected_done = np.zeros(len(self.raw_filename_list), dtype=bool)
 
-        self.ff_ssim = None
         self.raw_im_min_max = [pow(2, 16), 0]
         self.corrected_im_min_max = [pow(2, 16), 0]
+        self.thread_done = None
 
     def start(self):
-        # self.thread_watcher = gevent.get_hub().loop.async()
         self.thread_done = gevent.event.Event()
-        threading.Thread.start(self)
+        reading_task = gevent.spawn(self.run)
+        reading_task.link(lambda _: self.thread_done.set())
         return self.thread_done
 
     def set_stop(self):
@@ -1039,50 +1074,87 @@ class ImageReadingThread(threading.Thread):
 
     def run(self):
         logging.getLogger("GUI").info("Image reading started...")
-        for index, filename in enumerate(self.ff_filename_list):
-            if self.stopped:
-                # self.thread_watcher.send()
-                return
-            self.ff_image_list[index] = read_image(filename)
-
-        progress_step = 20
+        pool = gevent.threadpool.ThreadPool(self.workers)
+        try:
+            for index, ff_image in enumerate(
+                pool.imap(read_frame, self.ff_filename_list)
+            ):
+                if self.stopped:
+                    return
+                self.ff_image_list[index] = ff_image
 
-        for index, filename in enumerate(self.raw_filename_list):
-            if self.stopped:
+            if not self.raw_filename_list:
                 return
-
-            raw_image = read_image(filename)
-            self.raw_image_list[index] = raw_image
-
-            if index == 0:
-                self.raw_im_min_max[0] = raw_image[8:].min()
-                self.raw_im_min_max[1] = raw_image[8:].max()
-
-            if self.ff_filename_list and index == 0:
-                ff_image = self.get_ff_image(index)
-                ff_applied = np.divide(
-                    raw_image.astype(float),
-                    ff_image.astype(float),
-                    out=np.ones_like(raw_image.astype(float)),
-                    where=ff_image.astype(float) != 0,
+            # the first frame gives the shape of the cache
+            first_image = pool.apply(read_frame, (self.raw_filename_list[0],))
+            if first_image is None:
+                logging.getLogger("GUI").error(
+                    "Imaging: Unable to read image %s" % self.raw_filename_list[0]
                 )
-                ff_applied[ff_image == (pow(2, 16) - 1)] = 1
-
-                self.corrected_im_min_max[0] = ff_applied[8:].min()
-                self.corrected_im_min_max[1] = ff_applied[8:].max()
-
-            done_per = int(float(index) / len(self.raw_filename_list) * 100)
-            if (
-                not index % (len(self.raw_filename_list) / (100 / progress_step))
-                and done_per > 0
+                return
+            self.raw_images = self._create_cache(first_image.shape, first_image.dtype)
+            self._add_raw_image(0, first_image)
+
+            progress_step = 20
+            progress = 0
+            for read_count, (index, raw_image) in enumerate(
+                pool.imap_unordered(
+                    self._read_raw_image, range(1, len(self.raw_filename_list))
+                ),
+                2,
             ):
-                logging.getLogger("GUI").info("Image reading %d%% completed" % done_per)
+                if self.stopped:
+                    return
+                if raw_image is None:
+                    logging.getLogger("GUI").error(
+                        "Imaging: Unable to read image %s"
+                        % self.raw_filename_list[index]
+                    )
+                else:
+                    self._add_raw_image(index, raw_image)
+
+                done_per = int(100.0 * read_count / len(self.raw_filename_list))
+                if done_per // progress_step > progress and done_per < 100:
+                    progress = done_per // progress_step
+                    logging.getLogger("GUI").info(
+                        "Image reading %d%% completed" % done_per
+                    )
+        finally:
+            pool.kill()
 
         logging.getLogger("GUI").info("Image reading finished")
-        # self.thread_watcher.send()
+
+    def _read_raw_image(self, index):
+        return index, read_frame(self.raw_filename_list[index])
+
+    def _create_cache(self, image_shape, dtype):
+        # the file is deleted once closed, the mapping stays valid
+        with tempfile.TemporaryFile(
+            prefix="mxcube_imaging_", dir=self.cache_directory
+        ) as cache_file:
+            return np.memmap(
+                cache_file,
+                dtype=dtype,
+                mode="w+",
+                shape=(len(self.raw_filename_list),) + tuple(image_shape),
+            )
+
+    def _add_raw_image(self, index, raw_image):
+        self.raw_images[index] = raw_image
+        self.raw_loaded[index] = True
+
+        if index == 0:
+            self.raw_im_min_max[0] = raw_image[8:].min()
+            self.raw_im_min_max[1] = raw_image[8:].max()
+            corrected_image = self.get_corrected_image(index)
+            if corrected_image is not None:
+                self.corrected_im_min_max[0] = corrected_image[8:].min()
+                self.corrected_im_min_max[1] = corrected_image[8:].max()
 
     def get_raw_image(self, index):
-        return self.raw_image_list[index]
+        if not self.raw_loaded[index]:
+            return None
+        return self.raw_images[index]
 
     def get_raw_im_min_max(self):
         return self.raw_im_min_max
@@ -1091,14 +1163,43 @@ class ImageReadingThread(threading.Thread):
         return self.corrected_im_min_max
 
     def get_ff_image(self, raw_image_index):
-        print("get_ff_image ", raw_image_index)
+        if not self.ff_image_list:
+            return None
         if self.ff_ssim:
             ff_index = self.ff_ssim[raw_image_index][2] - 1
         else:
             ff_index = int(
                 raw_image_index
-                / float(len(self.raw_image_list))
+                / float(len(self.raw_filename_list))
                 * len(self.ff_image_list)
             )
-        print(ff_index)
         return self.ff_image_list[ff_index]
+
+    def get_corrected_image(self, index):
+        """Flat field corrected image, computed on first use
+
+        Pixels with a null or saturated flat field are set to 1.
+
+        Returns:
+            (numpy.ndarray): float32 image, None if the raw image or its flat
+                             field are not read yet.
+        """
+        if not self.corrected_done[index]:
+            raw_image = self.get_raw_image(index)
+            ff_image = self.get_ff_image(index)
+            if raw_image is None or ff_image is None:
+                return None
+            if self.corrected_images is None:
+                self.corrected_images = self._create_cache(
+                    self.raw_images.shape[1:], np.float32
+                )
+            corrected_image = self.corrected_images[index]
+            corrected_image.fill(1)
+            np.divide(
+                raw_image,
+                ff_image,
+                out=corrected_image,
+                where=(ff_image != 0) & (ff_image != pow(2, 16) - 1),
+            )
+            self.corrected_done[index] = True
+        return self.corrected_images[index]
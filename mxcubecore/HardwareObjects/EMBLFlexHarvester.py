@@ -77,7 +77,7 @@ class EMBLFlexHarvester(EMBLFlexHCD):
         if ha_sample_lists:
             for i in range(len(ha_sample_lists)):
                 sample = sample_list[i]
-                sample.id = ha_sample_lists[i]
+                sample._set_id(ha_sample_lists[i])
                 sample._name = ha_sample_names[i]
                 # if all sample come with proteinAcronym
                 if len(ha_sample_acronyms) > 0 and len(ha_sample_acronyms) == len(
@@ -215,6 +215,9 @@ class GenericDiffractometer(HardwareObject):
         "beam_y",
     ]
 
+    # columns of the motor positions of motor_positions_to_screen_batch
+    SCREEN_PROJECTION_MOTORS = ("phi", "phiy", "phiz", "sampx", "sampy")
+
     STATE_CHANGED_EVENT = "stateChanged"
     STATUS_CHANGED_EVENT = "statusChanged"
     MOTOR_POSITION_CHANGED_EVENT = "motorPositionsChanged"
@@ -913,6 +916,7 @@ class GenericDiffractometer(HardwareObject):
                     new_point_cb=lambda point: self.emit(
                         "newAutomaticCentringPoint", (point,)
                     ),
+                    mode=self.get_property("auto_centring_mode", "sequential"),
                 )
             else:
                 self.current_centring_procedure = gevent.spawn(self.automatic_centring)
@@ -1030,45 +1034,81 @@ class GenericDiffractometer(HardwareObject):
     def motor_positions_to_screen(self, centred_positions_dict):
         """ """
         if self.use_sample_centring:
-            self.update_zoom_calibration()
-            if None in (self.pixels_per_mm_x, self.pixels_per_mm_y):
-                return 0, 0
-            phi_angle = math.radians(
-                self.centring_phi.direction * self.centring_phi.get_value()
-            )
-            sampx = self.centring_sampx.direction * (
-                centred_positions_dict["sampx"] - self.centring_sampx.get_value()
-            )
-            sampy = self.centring_sampy.direction * (
-                centred_positions_dict["sampy"] - self.centring_sampy.get_value()
-            )
-            phiy = self.centring_phiy.direction * (
-                centred_positions_dict["phiy"] - self.centring_phiy.get_value()
-            )
-            phiz = self.centring_phiz.direction * (
-                centred_positions_dict["phiz"] - self.centring_phiz.get_value()
-            )
-            rot_matrix = numpy.matrix(
-                [
-                    math.cos(phi_angle),
-                    -math.sin(phi_angle),
-                    math.sin(phi_angle),
-                    math.cos(phi_angle),
-                ]
-            )
-            rot_matrix.shape = (2, 2)
-            inv_rot_matrix = numpy.array(rot_matrix.I)
-            dx, dy = (
-                numpy.dot(numpy.array([sampx, sampy]), inv_rot_matrix)
-                * self.pixels_per_mm_x
-            )
+            # projected at the current phi position, the phi of the
+            # centred position is not used
+            positions = [
+                centred_positions_dict[name] if name != "phi" else 0
+                for name in self.SCREEN_PROJECTION_MOTORS
+            ]
+            x, y = self._project_positions_to_screen([positions])[0]
+            return float(x), float(y)
+        else:
+            raise NotImplementedError
 
-            x = (phiy * self.pixels_per_mm_x) + self.beam_position[0]
-            y = dy + (phiz * self.pixels_per_mm_y) + self.beam_position[1]
+    def supports_batch_projection(self):
+        """Check if the screen positions are projected in batch: not the
+        case if the diffractometer has its own motor_positions_to_screen
+        Returns:
+            (bool): True if motor_positions_to_screen is not overridden
+        """
+        return (
+            type(self).motor_positions_to_screen
+            is GenericDiffractometer.motor_positions_to_screen
+        )
 
-            return x, y
-        else:
+    def motor_positions_to_screen_batch(self, positions):
+        """Screen positions of several motor positions, the current motor
+        positions being read once
+        Args:
+            positions (numpy.ndarray): (N, 5) motor positions, the columns in
+                                       the order of SCREEN_PROJECTION_MOTORS
+        Returns:
+            (numpy.ndarray): (N, 2) screen positions (x, y)
+        """
+        positions = numpy.asarray(positions, dtype=float).reshape(-1, 5)
+        if not self.supports_batch_projection():
+            # projection specific to the diffractometer, one position at a time
+            return numpy.array(
+                [
+                    self.motor_positions_to_screen(
+                        dict(zip(self.SCREEN_PROJECTION_MOTORS, row))
+                    )
+                    for row in positions
+                ],
+                dtype=float,
+            ).reshape(-1, 2)
+        if not self.use_sample_centring:
             raise NotImplementedError
+        return self._project_positions_to_screen(positions)
+
+    def _project_positions_to_screen(self, positions):
+        """Projection of motor_positions_to_screen_batch, also used by
+        motor_positions_to_screen: an override calling it with super()
+        does not come back to the override
+        """
+        positions = numpy.asarray(positions, dtype=float).reshape(-1, 5)
+        self.update_zoom_calibration()
+        if None in (self.pixels_per_mm_x, self.pixels_per_mm_y):
+            return numpy.zeros((len(positions), 2))
+        motors = [
+            getattr(self, "centring_" + name) for name in self.SCREEN_PROJECTION_MOTORS
+        ]
+        current = numpy.array([motor.get_value() for motor in motors], dtype=float)
+        directions = numpy.array([motor.direction for motor in motors], dtype=float)
+        _, phiy, phiz, sampx, sampy = ((positions - current) * directions).T
+
+        # sample motors displacement, rotated back to the phi position
+        phi_angle = math.radians(directions[0] * current[0])
+        dy = sampx * math.sin(phi_angle) + sampy * math.cos(phi_angle)
+
+        screen_positions = numpy.empty((len(positions), 2))
+        screen_positions[:, 0] = phiy * self.pixels_per_mm_x + self.beam_position[0]
+        screen_positions[:, 1] = (
+            dy * self.pixels_per_mm_x
+            + phiz * self.pixels_per_mm_y
+            + self.beam_position[1]
+        )
+        return screen_positions
 
     def move_to_centred_position(self, centred_position):
         """ """
@@ -20,10 +20,10 @@ except Exception:
 
 from suds.sudsobject import asdict
 from suds import WebFault
-from suds.client import Client
 from mxcubecore.BaseHardwareObjects import HardwareObject
 from mxcubecore.utils.conversion import string_types
 from mxcubecore import HardwareRepository as HWR
+from mxcubecore.utils import soap_clients
 
 """
 A client for ISPyB Webservices.
@@ -236,72 +236,40 @@ class ISPyBClient(HardwareObject):
                 _WS_COLLECTION_URL = _WSDL_ROOT + "ToolsForCollectionWebService?wsdl"
                 _WS_AUTOPROC_URL = _WSDL_ROOT + "ToolsForAutoprocessingWebService?wsdl"
 
-                if self.ws_root.strip().startswith("https://"):
-                    from suds.transport.https import HttpAuthenticated
-                else:
-                    from suds.transport.http import HttpAuthenticated
-
-                t1 = HttpAuthenticated(
-                    username=self.ws_username,
-                    password=self.ws_password,
-                    proxy=self.proxy,
-                )
-
-                t2 = HttpAuthenticated(
-                    username=self.ws_username,
-                    password=self.ws_password,
-                    proxy=self.proxy,
-                )
-
-                t3 = HttpAuthenticated(
-                    username=self.ws_username,
-                    password=self.ws_password,
-                    proxy=self.proxy,
-                )
-
-                t4 = HttpAuthenticated(
-                    username=self.ws_username,
-                    password=self.ws_password,
-                    proxy=self.proxy,
-                )
+                wsdl_cache_directory = self.get_property("wsdl_cache_directory")
+                if wsdl_cache_directory is not None:
+                    soap_clients.REGISTRY.set_cache_directory(
+                        wsdl_cache_directory.strip(),
+                        self.get_property("wsdl_cache_days", 1),
+                    )
 
                 try:
-                    self._shipping = Client(
-                        _WS_SHIPPING_URL,
-                        timeout=3,
-                        transport=t1,
-                        cache=None,
-                        proxy=self.proxy,
-                    )
-                    self._collection = Client(
-                        _WS_COLLECTION_URL,
-                        timeout=3,
-                        transport=t2,
-                        cache=None,
-                        proxy=self.proxy,
-                    )
-                    self._tools_ws = Client(
-                        _WS_BL_SAMPLE_URL,
-                        timeout=3,
-                        transport=t3,
-                        cache=None,
-                        proxy=self.proxy,
-                    )
-                    self._autoproc_ws = Client(
-                        _WS_AUTOPROC_URL,
-                        timeout=3,
-                        transport=t4,
-                        cache=None,
-                        proxy=self.proxy,
-                    )
+                    # clients, and their HTTP session, are shared in the process
+                    (
+                        self._shipping,
+                        self._collection,
+                        self._tools_ws,
+                        self._autoproc_ws,
+                    ) = [
+                        soap_clients.REGISTRY.get_client(
+                            url,
+                            username=self.ws_username,
+                            password=self.ws_password,
+                            proxy=self.proxy,
+                            timeout=3,
+                        )
+                        for url in (
+                            _WS_SHIPPING_URL,
+                            _WS_COLLECTION_URL,
+                            _WS_BL_SAMPLE_URL,
+                            _WS_AUTOPROC_URL,
+                        )
+                    ]
 
-                    # ensure that suds do not create those files in tmp
-                    self._shipping.set_options(cache=None, location=_WS_SHIPPING_URL)
-                    self._collection.set_options(
-                        cache=None, location=_WS_COLLECTION_URL
-                    )
-                    self._tools_ws.set_options(cache=None, location=_WS_BL_SAMPLE_URL)
-                    self._autoproc_ws.set_options(cache=None, location=_WS_AUTOPROC_URL)
+                    self._shipping.set_options(location=_WS_SHIPPING_URL)
+                    self._collection.set_options(location=_WS_COLLECTION_URL)
+                    self._tools_ws.set_options(location=_WS_BL_SAMPLE_URL)
+                    self._autoproc_ws.set_options(location=_WS_AUTOPROC_URL)
                 except URLError:
                     logging.getLogger("ispyb_client").exception(_CONNECTION_ERROR_MSG)
                     return
@@ -1623,6 +1591,17 @@ class ISPyBClient(HardwareObject):
     def is_connected(self):
         return self.login_ok
 
+    def get_ws_latency_metrics(self):
+        """
+        Latencies of the web service calls of the process, by web service
+        and operation.
+
+        :returns: {"service.operation": {"calls", "errors", "mean_time",
+                  "max_time"}}, times in s
+        :rtype: dict
+        """
+        return soap_clients.REGISTRY.get_latency_metrics()
+
     def isInhouseUser(self, proposal_code, proposal_number):
         """
         Returns True if the proposal is considered to be a
@@ -2443,12 +2422,12 @@ class ISPyBValueFactory:
         Ceates workflow3VO from worflow_info_dict.
         :rtype: workflow3VO
         """
-        ws_client = None
         workflow_vo = None
 
         try:
-            ws_client = Client(_WS_COLLECTION_URL, cache=None)
-            workflow_vo = ws_client.factory.create("workflow3VO")
+            workflow_vo = soap_clients.REGISTRY.create_object(
+                _WS_COLLECTION_URL, "workflow3VO"
+            )
         except Exception:
             raise
 
@@ -2474,12 +2453,12 @@ class ISPyBValueFactory:
         Ceates workflowMesh3VO from worflow_info_dict.
         :rtype: workflowMesh3VO
         """
-        ws_client = None
         workflow_mesh_vo = None
 
         try:
-            ws_client = Client(_WS_COLLECTION_URL, cache=None)
-            workflow_mesh_vo = ws_client.factory.create("workflowMeshWS3VO")
+            workflow_mesh_vo = soap_clients.REGISTRY.create_object(
+                _WS_COLLECTION_URL, "workflowMeshWS3VO"
+            )
         except Exception:
             raise
 
@@ -2508,12 +2487,12 @@ class ISPyBValueFactory:
         Ceates workflow3VO from worflow_info_dict.
         :rtype: workflow3VO
         """
-        ws_client = None
         workflow_vo = None
 
         try:
-            ws_client = Client(_WS_COLLECTION_URL, cache=None)
-            workflow_step_vo = ws_client.factory.create("workflowStep3VO")
+            workflow_step_vo = soap_clients.REGISTRY.create_object(
+                _WS_COLLECTION_URL, "workflowStep3VO"
+            )
         except Exception:
             raise
 
@@ -2546,12 +2525,12 @@ class ISPyBValueFactory:
         Ceates grid3VO from worflow_info_dict.
         :rtype: grid3VO
         """
-        ws_client = None
         grid_info_vo = None
 
         try:
-            ws_client = Client(_WS_COLLECTION_URL, cache=None)
-            grid_info_vo = ws_client.factory.create("gridInfoWS3VO")
+            grid_info_vo = soap_clients.REGISTRY.create_object(
+                _WS_COLLECTION_URL, "gridInfoWS3VO"
+            )
         except Exception:
             raise
 
@@ -906,6 +906,7 @@ class MiniDiff(HardwareObject):
             chi_angle=float(self.chiAngle),
             msg_cb=self.emitProgressMessage,
             new_point_cb=lambda point: self.emit("newAutomaticCentringPoint", point),
+            mode=self.get_property("auto_centring_mode", "sequential"),
         )
 
         self.current_centring_procedure.link(self.autoCentringDone)
@@ -6,11 +6,18 @@ XML configuration for more details.
 The Queue manager acts as both the controller of execution and as the root/
 container of the queue, note the inheritance from QueueEntryContainer. See the
 documentation for the queue_entry module for more information.
+
+With the pipelined_sample_exchange property set (or set_pipelined), the
+sample changer prepares the load of the next sample, for instance picks it
+from the dewar, while the sample mounted is collected, and LIMS robot
+actions are stored in the background.
 """
 import logging
+import time
 import gevent
 import traceback
 
+from mxcubecore import HardwareRepository as HWR
 from mxcubecore import queue_entry
 from mxcubecore.BaseHardwareObjects import HardwareObject
 from mxcubecore.queue_entry.base_queue_entry import QUEUE_ENTRY_STATUS
@@ -31,6 +38,11 @@ class QueueManager(HardwareObject, QueueEntryContainer):
         self._running = False
         self._disable_collect = False
         self._is_stopped = False
+        self._pipelined = False
+        # (sample queue entry, greenlet preparing its load)
+        self._prefetch = None
+        self._deferred_tasks = []
+        self._sample_exchange_times = []
 
     def init(self):
         site_entry_path = self.get_property("site_entry_path")
@@ -38,11 +50,14 @@ class QueueManager(HardwareObject, QueueEntryContainer):
             queue_entry.import_queue_entries(site_entry_path.split(","))
         else:
             queue_entry.import_queue_entries()
+        self._pipelined = self.get_property("pipelined_sample_exchange", False)
 
     def __getstate__(self):
         d = dict(self.__dict__)
         d["_root_task"] = None
         d["_paused_event"] = None
+        d["_prefetch"] = None
+        d["_deferred_tasks"] = []
         return d
 
     def __setstate__(self, d):
@@ -92,6 +107,7 @@ class QueueManager(HardwareObject, QueueEntryContainer):
 
             if not entry:
                 self._current_queue_entries = []
+                self._sample_exchange_times = []
                 self._set_in_queue_flag()
                 self._root_task = gevent.spawn(self.__execute_task)
             else:
@@ -177,6 +193,8 @@ class QueueManager(HardwareObject, QueueEntryContainer):
 
                     raise ex
         finally:
+            self._cancel_prefetch()
+            self._join_deferred_tasks()
             self._running = False
             self.emit("queue_execution_finished", (None,))
 
@@ -201,7 +219,14 @@ class QueueManager(HardwareObject, QueueEntryContainer):
             # of task.
             entry.status = QUEUE_ENTRY_STATUS.RUNNING
             entry.pre_execute()
+            prefetch = self._pipelined and isinstance(
+                entry, queue_entry.SampleQueueEntry
+            )
+            if prefetch:
+                self._wait_prefetch(entry)
             entry.execute()
+            if prefetch:
+                self._start_prefetch(entry)
 
             for child in entry._queue_entry_list:
                 self.__execute_entry(child)
@@ -282,6 +307,7 @@ class QueueManager(HardwareObject, QueueEntryContainer):
         self._queue_end()
 
     def _queue_end(self):
+        self._cancel_prefetch()
         # Reset the pause event, incase we were waiting.
         self.set_pause(False)
         self._is_stopped = True
@@ -341,6 +367,191 @@ class QueueManager(HardwareObject, QueueEntryContainer):
         """
         self._paused_event.wait()
 
+    def set_pipelined(self, state):
+        """
+        Sets the pipelined execution to <state>: the load of the next sample
+        is prepared while the current one is collected, and LIMS robot
+        actions are stored in the background.
+
+        :param state: Pipelined if True, sequential if False
+        :type state: bool
+
+        :returns: None
+        :rtype: NoneType
+        """
+        self._pipelined = state
+
+    def is_pipelined(self):
+        """
+        :returns: True if the execution is pipelined, see set_pipelined()
+        :rtype: bool
+        """
+        return self._pipelined
+
+    def run_deferred(self, function, *args):
+        """
+        Runs <function> in the background if the execution is pipelined, the
+        queue joining it when it ends, and at once otherwise. Exceptions are
+        logged.
+
+        :param function: The function to run, with the arguments <args>.
+        :type function: callable
+
+        :returns: None
+        :rtype: NoneType
+        """
+        if not self._pipelined:
+            function(*args)
+            return
+        self._deferred_tasks = [
+            task for task in self._deferred_tasks if not task.ready()
+        ]
+        task = gevent.spawn(function, *args)
+        task.link_exception(
+            lambda task: logging.getLogger("HWR").error(
+                "Queue: %s failed: %s", function.__name__, task.exception
+            )
+        )
+        self._deferred_tasks.append(task)
+
+    def get_sample_exchange_times(self):
+        """
+        Times of the sample loads prepared while the previous sample was
+        collected, since the queue was started.
+
+        :returns: dictionaries with the sample location, the time taken by
+                  prepare_load (prepare_time), the time the queue waited for
+                  it (wait_time), and the dead time saved (saved_time), in s
+        :rtype: list
+        """
+        return list(self._sample_exchange_times)
+
+    def _get_sample_entries(self, container=None):
+        """
+        :returns: The sample queue entries, in order, including those in
+                  baskets
+        :rtype: list
+        """
+        if container is None:
+            container = self
+        entries = []
+        for entry in container._queue_entry_list:
+            if isinstance(entry, queue_entry.SampleQueueEntry):
+                entries.append(entry)
+            else:
+                entries.extend(self._get_sample_entries(entry))
+        return entries
+
+    def _get_next_sample_entry(self, entry):
+        """
+        :returns: The next sample queue entry to mount a sample with the
+                  sample changer after <entry>, None if there is none
+        :rtype: SampleQueueEntry
+        """
+        entries = self._get_sample_entries()
+        if entry not in entries:
+            return None
+        for next_entry in entries[entries.index(entry) + 1 :]:
+            data_model = next_entry.get_data_model()
+            if next_entry.is_enabled() and data_model.get_children():
+                if data_model.free_pin_mode:
+                    return None
+                return next_entry
+        return None
+
+    def _start_prefetch(self, entry):
+        """
+        Starts preparing the load of the sample following <entry>.
+        """
+        sample_changer = HWR.beamline.sample_changer
+        diffractometer = HWR.beamline.diffractometer
+        if sample_changer is None or (
+            diffractometer is not None and diffractometer.in_plate_mode()
+        ):
+            return
+        next_entry = self._get_next_sample_entry(entry)
+        if next_entry is None:
+            return
+        location = tuple(next_entry.get_data_model().location)
+        if sample_changer.is_mounted_sample(location):
+            return
+
+        def prepare_load():
+            start = time.time()
+            prepared = sample_changer.prepare_load(location)
+            return prepared, time.time() - start
+
+        logging.getLogger("queue_exec").info(
+            "Preparing the load of sample %s", str(location)
+        )
+        self._prefetch = (next_entry, gevent.spawn(prepare_load))
+
+    def _wait_prefetch(self, entry):
+        """
+        Waits for the load of the sample of <entry> to be prepared, and
+        records the time saved. The load prepared for an other sample is
+        cancelled.
+        """
+        if self._prefetch is None:
+            return
+        prefetch_entry, task = self._prefetch
+        if prefetch_entry is not entry:
+            self._cancel_prefetch()
+            return
+        self._prefetch = None
+        start = time.time()
+        task.join()
+        wait_time = time.time() - start
+        if not task.successful():
+            logging.getLogger("HWR").warning(
+                "Queue: could not prepare the load of sample %s: %s",
+                str(entry.get_data_model().location),
+                task.exception,
+            )
+            self._cancel_prepared_load()
+            return
+        prepared, prepare_time = task.value
+        if prepared:
+            saved_time = max(prepare_time - wait_time, 0)
+            self._sample_exchange_times.append(
+                {
+                    "location": tuple(entry.get_data_model().location),
+                    "prepare_time": prepare_time,
+                    "wait_time": wait_time,
+                    "saved_time": saved_time,
+                }
+            )
+            logging.getLogger("queue_exec").info(
+                "Sample %s load prepared during the previous collection,"
+                " %.1f s saved",
+                str(entry.get_data_model().location),
+                saved_time,
+            )
+
+    def _cancel_prefetch(self):
+        """
+        Stops preparing the load of the next sample, and puts the sample
+        back if it was prepared.
+        """
+        if self._prefetch is None:
+            return
+        _, task = self._prefetch
+        self._prefetch = None
+        task.kill()
+        self._cancel_prepared_load()
+
+    def _cancel_prepared_load(self):
+        try:
+            HWR.beamline.sample_changer.cancel_prepared_load()
+        except Exception:
+            logging.getLogger("HWR").exception(
+                "Queue: could not cancel the prepared sample load"
+            )
+
+    def _join_deferred_tasks(self):
+        gevent.joinall(self._deferred_tasks)
+        self._deferred_tasks = []
+
     def disable(self, state):
         """
         Sets the disable state to <state>, disables the possibility
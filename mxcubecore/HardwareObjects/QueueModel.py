@@ -28,6 +28,7 @@ handle several models by using register_model and select_model.
 
 import os
 import json
+import bisect
 import logging
 import jsonpickle
 
@@ -35,6 +36,7 @@ from mxcubecore.BaseHardwareObjects import HardwareObject
 from mxcubecore import queue_entry
 from mxcubecore.model import queue_model_objects
 from mxcubecore import HardwareRepository as HWR
+from mxcubecore.utils.queue_journal import FileJournalBackend, QueueJournal
 
 
 class Serializer(object):
@@ -43,6 +45,115 @@ class Serializer(object):
         return json.dumps(object, default=lambda o: o.__dict__.values()[0])
 
 
+class QueueModelIndex(object):
+    """
+    Indexes of the nodes of a model: node by node id, and run numbers and
+    image ranges of the path templates by directory and prefix.
+    """
+
+    def __init__(self):
+        self.nodes = {}
+        # id(path template): [path template, key and entry in runs, nodes using it]
+        self._path_templates = {}
+        # (directory, prefix): sorted (run number, first image, last image + 1,
+        # id(path template)) list
+        self._runs = {}
+
+    @staticmethod
+    def _walk(node):
+        yield node
+        for child in node.get_children():
+            yield from QueueModelIndex._walk(child)
+
+    @staticmethod
+    def _key(path_template):
+        return (os.path.normpath(path_template.directory), path_template.get_prefix())
+
+    @staticmethod
+    def _entry(path_template):
+        return (
+            path_template.run_number,
+            path_template.start_num,
+            path_template.start_num + path_template.num_files,
+            id(path_template),
+        )
+
+    def add(self, node):
+        """Indexes the node, and the nodes under it"""
+        for child in self._walk(node):
+            if child._node_id is not None:
+                self.nodes[child._node_id] = child
+            path_template = child.get_path_template()
+            if not path_template:
+                continue
+            indexed = self._path_templates.get(id(path_template))
+            if indexed is None:
+                indexed = [path_template, None, None, 0]
+                self._path_templates[id(path_template)] = indexed
+                self._add_entry(indexed)
+            indexed[3] += 1
+
+    def remove(self, node):
+        """Removes the node, and the nodes under it, from the index"""
+        for child in self._walk(node):
+            if self.nodes.get(child._node_id) is child:
+                del self.nodes[child._node_id]
+            path_template = child.get_path_template()
+            indexed = path_template and self._path_templates.get(id(path_template))
+            if not indexed:
+                continue
+            indexed[3] -= 1
+            if not indexed[3]:
+                del self._path_templates[id(path_template)]
+                self._remove_entry(indexed)
+
+    def update_path_template(self, path_template):
+        """Moves an indexed path template, after its files changed"""
+        indexed = self._path_templates.get(id(path_template))
+        if indexed is not None:
+            self._remove_entry(indexed)
+            self._add_entry(indexed)
+
+    def _add_entry(self, indexed):
+        indexed[1] = self._key(indexed[0])
+        indexed[2] = self._entry(indexed[0])
+        bisect.insort(self._runs.setdefault(indexed[1], []), indexed[2])
+
+    def _remove_entry(self, indexed):
+        runs = self._runs[indexed[1]]
+        del runs[bisect.bisect_left(runs, indexed[2])]
+        if not runs:
+            del self._runs[indexed[1]]
+
+    def get_max_run_number(self, path_template, exclude_current=True):
+        """
+        Returns the highest run number of the indexed path templates with
+        the directory and prefix of path_template, 0 if none.
+        """
+        for entry in reversed(self._runs.get(self._key(path_template), [])):
+            if exclude_current and entry[3] == id(path_template):
+                continue
+            return max(entry[0], 0)
+        return 0
+
+    def has_collision(self, path_template):
+        """
+        Returns True if an other indexed path template writes any of the
+        files of path_template.
+        """
+        runs = self._runs.get(self._key(path_template), [])
+        run_number = path_template.run_number
+        start = path_template.start_num
+        end = start + path_template.num_files
+        index = bisect.bisect_left(runs, (run_number,))
+        while index < len(runs) and runs[index][0] == run_number:
+            entry = runs[index]
+            if entry[3] != id(path_template) and entry[1] < end and start < entry[2]:
+                return True
+            index += 1
+        return False
+
+
 class QueueModel(HardwareObject):
     def __init__(self, name):
         HardwareObject.__init__(self, name)
@@ -60,7 +171,12 @@ class QueueModel(HardwareObject):
             "plate": self._plate_model,
         }
 
+        self._indexes = dict((name, QueueModelIndex()) for name in self._models.keys())
+
         self._selected_model = self._ispyb_model
+        self._journal = None
+        queue_model_objects.PathTemplate.add_observer(self)
+        queue_model_objects.TaskNode.add_observer(self)
 
     def __getstate__(self):
         d = dict(self.__dict__)
@@ -78,7 +194,41 @@ class QueueModel(HardwareObject):
 
         You should normaly not need to call this method.
         """
-        pass
+        journal_directory = self.get_property("journal_directory")
+        if journal_directory:
+            self.set_journal(QueueJournal(self, FileJournalBackend(journal_directory)))
+
+    def set_journal(self, journal):
+        """
+        Sets the journal recording the changes of the queue, None to stop
+        recording them.
+
+        :param journal: The journal.
+        :type journal: QueueJournal
+        """
+        if self._journal is not None and self._journal is not journal:
+            self._journal.close()
+        self._journal = journal
+
+    def get_journal(self):
+        """
+        :returns: The journal recording the changes of the queue, or None.
+        :rtype: QueueJournal
+        """
+        return self._journal
+
+    def node_changed(self, node):
+        """
+        Records the change of <node> in the journal. Called by TaskNode when
+        the enabled or executed state of a node changes. The parameters of
+        the tasks are not watched: to be called after editing the parameters
+        of a task already in the queue, for the edit to be journaled.
+
+        :param node: The node edited.
+        :type node: TaskNode
+        """
+        if self._journal is not None:
+            self._journal.node_modified(node)
 
     def select_model(self, name):
         """
@@ -93,6 +243,8 @@ class QueueModel(HardwareObject):
         self._selected_model = self._models[name]
         HWR.beamline.queue_manager.clear()
         self._re_emit(self._selected_model)
+        if self._journal is not None:
+            self._journal.model_selected()
 
     def get_model_root(self):
         """
@@ -101,6 +253,16 @@ class QueueModel(HardwareObject):
         """
         return self._selected_model
 
+    def get_selected_model_name(self):
+        """
+        :returns: The name of the selected model, "" if it is not registered.
+        :rtype: str
+        """
+        for name, root in self._models.items():
+            if root is self._selected_model:
+                return name
+        return ""
+
     def clear_model(self, name=None):
         """
         Clears the model with name <name>, clears all if name is None
@@ -112,10 +274,12 @@ class QueueModel(HardwareObject):
         :rtype: NoneType
         """
         self._models[name] = queue_model_objects.RootNode()
+        self._indexes[name] = QueueModelIndex()
 
         if not name:
             for name in self._models.keys():
                 self._models[name] = queue_model_objects.RootNode()
+                self._indexes[name] = QueueModelIndex()
 
         HWR.beamline.queue_manager.clear()
 
@@ -137,6 +301,35 @@ class QueueModel(HardwareObject):
         else:
             self._models[name]
 
+    def _get_index(self, node):
+        """
+        Returns the index of the model the node belongs to, None if the node
+        is not in a model.
+        """
+        while node._parent is not None:
+            node = node._parent
+        for name, root in self._models.items():
+            if root is node:
+                return self._indexes[name]
+        return None
+
+    def _get_selected_index(self):
+        index = self._get_index(self._selected_model)
+        if index is None:
+            # the selected model was cleared: index it on the fly
+            index = QueueModelIndex()
+            for child in self._selected_model.get_children():
+                index.add(child)
+        return index
+
+    def path_template_changed(self, path_template):
+        """
+        Updates the indexes, after the files of path_template changed.
+        Called by PathTemplate.
+        """
+        for index in self._indexes.values():
+            index.update_path_template(path_template)
+
     def _re_emit(self, parent_node):
         """
         Re-emits the 'child_added' for all the nodes in the model.
@@ -165,6 +358,11 @@ class QueueModel(HardwareObject):
             child._node_id = self._selected_model._total_node_count
             parent._children.append(child)
             child._set_name(child._name)
+            index = self._get_index(parent)
+            if index is not None:
+                index.add(child)
+                if self._journal is not None:
+                    self._journal.node_added(child)
             self.emit("child_added", (parent, child))
         else:
             raise TypeError("Expected type TaskNode, got %s " % str(type(child)))
@@ -201,6 +399,11 @@ class QueueModel(HardwareObject):
         """
         if parent is None:
             parent = self._selected_model
+            index = self._get_index(parent)
+            node = index.nodes.get(_id) if index is not None else None
+            # nodes are only moved through QueueModel, but check anyway
+            if node is not None and self._get_index(node) is index:
+                return node
 
         for node in parent._children:
             if node._node_id == _id:
@@ -223,6 +426,11 @@ class QueueModel(HardwareObject):
         """
         if child in parent._children:
             parent._children.remove(child)
+            index = self._get_index(parent)
+            if index is not None:
+                index.remove(child)
+                if self._journal is not None:
+                    self._journal.node_removed(child)
             self.emit("child_removed", (parent, child))
 
     def _detach_child(self, parent, child):
@@ -248,11 +456,21 @@ class QueueModel(HardwareObject):
         :param child: The child
         :type child: TaskNode Object
         """
+        index = self._get_index(child)
+        if index is not None:
+            index.remove(child)
+            if self._journal is not None:
+                self._journal.node_removed(child)
         if child._parent:
             self._detach_child(parent, child)
             child.set_parent(parent)
         else:
             child._parent = parent
+        index = self._get_index(child)
+        if index is not None:
+            index.add(child)
+            if self._journal is not None:
+                self._journal.node_added(child)
 
     def view_created(self, view_item, task_model):
         """
@@ -303,19 +521,8 @@ class QueueModel(HardwareObject):
         :returns: The next available run number for the given path_template.
         :rtype: int
         """
-        all_path_templates = self.get_path_templates()
-        conflicting_path_templates = [0]
-
-        for pt in all_path_templates:
-            if exclude_current:
-                if pt[1] is not new_path_template:
-                    if pt[1] == new_path_template:
-                        conflicting_path_templates.append(pt[1].run_number)
-            else:
-                if pt[1] == new_path_template:
-                    conflicting_path_templates.append(pt[1].run_number)
-
-        return max(conflicting_path_templates) + 1
+        index = self._get_selected_index()
+        return index.get_max_run_number(new_path_template, exclude_current) + 1
 
     def get_path_templates(self):
         """
@@ -349,15 +556,7 @@ class QueueModel(HardwareObject):
 
         :returns: True if there is a potential path collision.
         """
-        result = False
-        path_template_list = self.get_path_templates()
-
-        for pt in path_template_list:
-            if pt[1] is not new_path_template:
-                if new_path_template.intersection(pt[1]):
-                    result = True
-
-        return result
+        return self._get_selected_index().has_collision(new_path_template)
 
     def copy_node(self, node):
         """
@@ -423,16 +622,17 @@ class QueueModel(HardwareObject):
     def save_queue(self, filename=None):
         """Saves queue in the file. Current selected model is saved as a list
         of dictionaries. Information about samples and baskets is not saved
+
+        With a journal, the journal is saved too (see restore_queue).
         """
+        if self._journal is not None:
+            self._journal.save()
         if not filename:
             filename = os.path.join(self.user_file_directory, "queue_active.dat")
 
         items_to_save = []
 
-        selected_model = ""
-        for key in self._models:
-            if self._selected_model == self._models[key]:
-                selected_model = key
+        selected_model = self.get_selected_model_name()
 
         queue_entry_list = HWR.beamline.queue_manager.get_queue_entry_list()
         for item in queue_entry_list:
@@ -461,10 +661,7 @@ class QueueModel(HardwareObject):
     def get_queue_as_json_list(self):
         items_to_save = []
 
-        selected_model = ""
-        for key in self._models:
-            if self._selected_model == self._models[key]:
-                selected_model = key
+        selected_model = self.get_selected_model_name()
 
         queue_entry_list = HWR.beamline.queue_manager.get_queue_entry_list()
         for item in queue_entry_list:
@@ -481,6 +678,18 @@ class QueueModel(HardwareObject):
 
         return selected_model, items_to_save
 
+    def restore_queue(self, snapshot=None):
+        """Restores the queue saved by the journal, in the model it was saved
+        from. Samples are not restored: tasks are added to the samples of the
+        model at the same location.
+
+        :returns: model name 'free-pin', 'ispyb' or 'plate', None if there is
+                  no journal or nothing saved
+        """
+        if self._journal is None:
+            return None
+        return self._journal.restore(snapshot=snapshot)
+
     def load_queue_from_json_list(self, queue_list, snapshot):
         # Prepare list of samplesL
         sample_dict = {}
@@ -24,6 +24,10 @@ Install redis: sudo pip install redis
 Start server on local pc: redis-server &
 It is recommended to start redis with mxcube
 
+With the queue_journal property set, the changes of the queue are recorded
+as they are made, in a journal compacted into snapshots (see
+mxcubecore.utils.queue_journal), instead of the queue being saved whole.
+
 example xml:
 NBNB OBSOLETE there is no longer a beamline_setup
 
@@ -40,6 +44,7 @@ import jsonpickle
 
 from mxcubecore.BaseHardwareObjects import HardwareObject
 from mxcubecore import HardwareRepository as HWR
+from mxcubecore.utils.queue_journal import QueueJournal, RedisJournalBackend
 
 
 __version__ = "2.3."
@@ -95,6 +100,17 @@ class RedisClient(HardwareObject):
 
         if self.active:
             self.init_beamline_setup()
+            if self.get_property("queue_journal", False):
+                HWR.beamline.queue_model.set_journal(
+                    QueueJournal(
+                        HWR.beamline.queue_model,
+                        RedisJournalBackend(
+                            self.redis_client,
+                            "mxcube:%s:%s:queue_journal"
+                            % (self.proposal_id, self.beamline_name),
+                        ),
+                    )
+                )
 
     def save_queue(self):
         """Saves queue in RedisDB"""
@@ -103,6 +119,11 @@ class RedisClient(HardwareObject):
 
     def save_queue_task(self):
         """Queue saving tasks"""
+        journal = HWR.beamline.queue_model.get_journal()
+        if journal is not None:
+            # the changes are already saved by the journal
+            journal.save()
+            return
         selected_model, queue_list = HWR.beamline.queue_model.get_queue_as_json_list()
         self.redis_client.set(
             "mxcube:%s:%s:queue_model" % (self.proposal_id, self.beamline_name),
@@ -120,6 +141,14 @@ class RedisClient(HardwareObject):
             self.active = False
             selected_model = None
 
+            if HWR.beamline.queue_model.get_journal() is not None:
+                selected_model = HWR.beamline.queue_model.restore_queue(
+                    snapshot=HWR.beamline.sample_view.get_scene_snapshot()
+                )
+                self.active = True
+                logging.getLogger("HWR").debug("RedisClient: Queue restored")
+                return selected_model
+
             selected_model = self.redis_client.get(
                 "mxcube:%s:%s:queue_model" % (self.proposal_id, self.beamline_name)
             )
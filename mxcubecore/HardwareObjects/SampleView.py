@@ -21,8 +21,11 @@ __copyright__ = """2019 by the MXCuBE collaboration """
 __license__ = "LGPLv3+"
 
 import copy
+import time
 from functools import reduce
 
+import gevent
+
 from mxcubecore.model import queue_model_objects
 
 from mxcubecore.HardwareObjects.abstract.AbstractSampleView import (
@@ -44,14 +47,63 @@ class SampleView(AbstractSampleView):
         self._last_oav_image = None
 
         self.hide_grid_threshold = self.get_property("hide_grid_threshold", 5)
+
+        # maximum number of shape position updates per second, 0 for no limit
+        rate = float(self.get_property("shape_update_rate", 10))
+        self._shape_update_interval = 1.0 / rate if rate > 0 else 0
+        self._last_shape_update = 0
+        self._shape_update_task = None
+
         for motor_name, motor_ho in HWR.beamline.diffractometer.get_motors().items():
             if motor_ho:
                 motor_ho.connect("stateChanged", self._update_shape_positions)
 
     def _update_shape_positions(self, *args, **kwargs):
+        """Update the shape positions, at most shape_update_rate times per
+        second: an update requested in the meantime is done when it is due.
+        """
+        if self._shape_update_task is not None:
+            return
+        delay = self._last_shape_update + self._shape_update_interval - time.monotonic()
+        if delay > 0:
+            self._shape_update_task = gevent.spawn_later(
+                delay, self.update_shape_positions
+            )
+        else:
+            self.update_shape_positions()
 
-        for shape in self.get_shapes():
-            shape.update_position(HWR.beamline.diffractometer.motor_positions_to_screen)
+    def update_shape_positions(self):
+        """Project the centred positions of all the shapes on the screen,
+        in one batch when the diffractometer supports it.
+        """
+        self._shape_update_task = None
+        self._last_shape_update = time.monotonic()
+        diffractometer = HWR.beamline.diffractometer
+        shapes = list(self.get_shapes())
+
+        # a diffractometer with its own projection projects the positions
+        # one at a time
+        supports_batch_projection = getattr(
+            diffractometer, "supports_batch_projection", None
+        )
+        if not (supports_batch_projection and supports_batch_projection()):
+            for shape in shapes:
+                shape.update_position(diffractometer.motor_positions_to_screen)
+        elif shapes:
+            motor_names = diffractometer.SCREEN_PROJECTION_MOTORS
+            positions = [
+                [cpos[name] for name in motor_names]
+                for cpos in (cp.as_dict() for shape in shapes for cp in shape.cp_list)
+            ]
+            screen_positions = diffractometer.motor_positions_to_screen_batch(positions)
+            phi_position = diffractometer.omega.get_value()
+            index = 0
+            for shape in shapes:
+                count = len(shape.cp_list)
+                shape.set_screen_positions(
+                    screen_positions[index : index + count], phi_position
+                )
+                index += count
 
         self.emit("shapesChanged")
 
@@ -428,6 +480,16 @@ class Shape(object):
         spos_list = tuple([pos for l in spos_list for pos in l])
         self.screen_coord = spos_list
 
+    def set_screen_positions(self, screen_positions, phi_position=None):
+        """Set the screen positions of the centred positions
+        Args:
+            screen_positions (list): (x, y) of each centred position
+            phi_position (float): current phi position, for the shapes
+                                  hidden at some phi positions (Grid),
+                                  read from the diffractometer if None
+        """
+        self.screen_coord = tuple(float(pos) for xy in screen_positions for pos in xy)
+
     def add_cp_from_mp(self, mpos_list):
         for mp in mpos_list:
             self.cp_list.append(queue_model_objects.CentredPosition(mp))
@@ -553,16 +615,27 @@ class Grid(Shape):
 
         self.set_id(Grid.SHAPE_COUNT)
 
-    def update_position(self, transform):
-        phi_pos = HWR.beamline.diffractometer.omega.get_value() % 360
-        _d = abs((self.get_centred_position().phi % 360) - phi_pos)
+    def is_hidden_at(self, phi_position):
+        """The grid is hidden when phi is too far from the grid phi"""
+        _d = abs((self.get_centred_position().phi % 360) - phi_position % 360)
+        return min(_d, 360 - _d) > self.shapes_hw_object.hide_grid_threshold
 
-        if min(_d, 360 - _d) > self.shapes_hw_object.hide_grid_threshold:
+    def update_position(self, transform):
+        if self.is_hidden_at(HWR.beamline.diffractometer.omega.get_value()):
             self.state = "HIDDEN"
         else:
             super(Grid, self).update_position(transform)
             self.state = "SAVED"
 
+    def set_screen_positions(self, screen_positions, phi_position=None):
+        if phi_position is None:
+            phi_position = HWR.beamline.diffractometer.omega.get_value()
+        if self.is_hidden_at(phi_position):
+            self.state = "HIDDEN"
+        else:
+            super(Grid, self).set_screen_positions(screen_positions, phi_position)
+            self.state = "SAVED"
+
     def get_centred_position(self):
         return self.cp_list[0]
 
@@ -28,13 +28,16 @@ import sys
 import logging
 import time
 import errno
+import uuid
 import abc
 import collections
+import functools
 import gevent
 import gevent.event
 from mxcubecore.TaskUtils import task
 from mxcubecore.BaseHardwareObjects import HardwareObject
 from mxcubecore import HardwareRepository as HWR
+from mxcubecore.utils.lims_writer import LimsWriteQueue
 
 
 __credits__ = ["MXCuBE collaboration"]
@@ -64,6 +67,16 @@ BeamlineConfig = collections.namedtuple(
     ],
 )
 
+# Undulator of the beamline configuration sent to the LIMS write queue, which
+# takes plain data
+LimsUndulator = collections.namedtuple("LimsUndulator", ["type"])
+
+# A step of the hardware preparation of a data collection: function(*args) is
+# run once the steps named in after are done
+PrepareStep = collections.namedtuple(
+    "PrepareStep", ["name", "message", "function", "args", "after"]
+)
+
 
 class AbstractCollect(HardwareObject, object):
     __metaclass__ = abc.ABCMeta
@@ -84,9 +97,19 @@ class AbstractCollect(HardwareObject, object):
         self.run_offline_processing = None
         self.run_online_processing = None
         self.ready_event = None
+        self.prepare_timeout = None
+        self.lims_writer = None
+        self.lims_store_timeout = None
 
     def init(self):
         self.ready_event = gevent.event.Event()
+        self.prepare_timeout = self.get_property("prepare_timeout", 300)
+        self.lims_store_timeout = self.get_property("lims_store_timeout", 10)
+        if self.get_property("lims_write_behind", False):
+            self.lims_writer = LimsWriteQueue(
+                HWR.beamline.lims, self.get_property("lims_spool_directory")
+            )
+            self.lims_writer.recover()
 
         undulators = []
         try:
@@ -203,49 +226,10 @@ class AbstractCollect(HardwareObject, object):
                     ] = current_diffractometer_position.get(motor)
 
             # ----------------------------------------------------------------
-            # Move to the centered position and take crystal snapshots
+            # Move to the centered position, take crystal snapshots and set
+            # data collection parameters
 
-            log.info("Collection: Moving to centred position")
-            self.move_to_centered_position()
-            self.take_crystal_snapshots()
-            self.move_to_centered_position()
-
-            # ----------------------------------------------------------------
-            # Set data collection parameters
-
-            if "transmission" in self.current_dc_parameters:
-                log.info(
-                    "Collection: Setting transmission to %.2f",
-                    self.current_dc_parameters["transmission"],
-                )
-                self.set_transmission(self.current_dc_parameters["transmission"])
-
-            if "wavelength" in self.current_dc_parameters:
-                log.info(
-                    "Collection: Setting wavelength to %.4f",
-                    self.current_dc_parameters["wavelength"],
-                )
-                self.set_wavelength(self.current_dc_parameters["wavelength"])
-
-            elif "energy" in self.current_dc_parameters:
-                log.info(
-                    "Collection: Setting energy to %.4f",
-                    self.current_dc_parameters["energy"],
-                )
-                self.set_energy(self.current_dc_parameters["energy"])
-
-            dd = self.current_dc_parameters.get("resolution")
-            if dd and dd.get("upper"):
-                resolution = dd["upper"]
-                log.info("Collection: Setting resolution to %.3f", resolution)
-                self.set_resolution(resolution)
-
-            elif "detector_distance" in self.current_dc_parameters:
-                log.info(
-                    "Collection: Moving detector to %.2f",
-                    self.current_dc_parameters["detector_distance"],
-                )
-                self.move_detector(self.current_dc_parameters["detector_distance"])
+            self.prepare_hardware(self.get_prepare_steps())
 
             # ----------------------------------------------------------------
             # Site specific implementation of a data collection
@@ -271,6 +255,150 @@ class AbstractCollect(HardwareObject, object):
         finally:
             self.data_collection_cleanup()
 
+    def get_prepare_steps(self):
+        """
+        Steps of the hardware preparation of the current data collection.
+        Energy comes before transmission and resolution, both depending on it,
+        other steps run concurrently.
+        Returns:
+            (list): PrepareStep tuples
+        """
+        params = self.current_dc_parameters
+        steps = [
+            PrepareStep(
+                "centring",
+                "Moving to centred position",
+                self.move_to_centred_position_with_snapshots,
+                (),
+                (),
+            )
+        ]
+
+        if "wavelength" in params:
+            steps.append(
+                PrepareStep(
+                    "energy",
+                    "Setting wavelength to %.4f" % params["wavelength"],
+                    self.set_wavelength,
+                    (params["wavelength"],),
+                    (),
+                )
+            )
+        elif "energy" in params:
+            steps.append(
+                PrepareStep(
+                    "energy",
+                    "Setting energy to %.4f" % params["energy"],
+                    self.set_energy,
+                    (params["energy"],),
+                    (),
+                )
+            )
+
+        if "transmission" in params:
+            steps.append(
+                PrepareStep(
+                    "transmission",
+                    "Setting transmission to %.2f" % params["transmission"],
+                    self.set_transmission,
+                    (params["transmission"],),
+                    ("energy",),
+                )
+            )
+
+        dd = params.get("resolution")
+        if dd and dd.get("upper"):
+            steps.append(
+                PrepareStep(
+                    "resolution",
+                    "Setting resolution to %.3f" % dd["upper"],
+                    self.set_resolution,
+                    (dd["upper"],),
+                    ("energy",),
+                )
+            )
+        elif "detector_distance" in params:
+            steps.append(
+                PrepareStep(
+                    "resolution",
+                    "Moving detector to %.2f" % params["detector_distance"],
+                    self.move_detector,
+                    (params["detector_distance"],),
+                    (),
+                )
+            )
+        return steps
+
+    def prepare_hardware(self, steps, timeout=None):
+        """
+        Runs the preparation steps, each one as soon as the steps it comes
+        after are done, and stores their durations [s] in
+        current_dc_parameters["prepare_durations"].
+        Args:
+            steps (list): PrepareStep tuples. A step can only come after
+                          steps listed before it, others are ignored.
+            timeout (float): time to prepare [s], defaults to prepare_timeout.
+        Raises:
+            RuntimeError: if the preparation takes longer than the timeout.
+        """
+        log = logging.getLogger("user_level_log")
+        durations = {}
+        step_tasks = {}
+
+        def run_step(step, previous_tasks):
+            gevent.joinall(previous_tasks, raise_error=True)
+            log.info("Collection: %s", step.message)
+            start_time = time.time()
+            step.function(*step.args)
+            durations[step.name] = time.time() - start_time
+
+        start_time = time.time()
+        for step in steps:
+            previous_tasks = [
+                step_tasks[name] for name in step.after if name in step_tasks
+            ]
+            step_tasks[step.name] = gevent.spawn(run_step, step, previous_tasks)
+
+        if timeout is None:
+            timeout = self.prepare_timeout
+        try:
+            with gevent.Timeout(
+                timeout, RuntimeError("Timeout preparing the data collection")
+            ):
+                gevent.joinall(list(step_tasks.values()), raise_error=True)
+        finally:
+            gevent.killall(list(step_tasks.values()))
+            durations["total"] = time.time() - start_time
+            self.current_dc_parameters["prepare_durations"] = durations
+
+    def move_to_centred_position_with_snapshots(self):
+        """
+        Moves to the centred position and takes the crystal snapshots,
+        moving back to the centred position if the snapshots rotated the sample
+        """
+        self.move_to_centered_position()
+        self.take_crystal_snapshots()
+        if not self.is_at_centered_position():
+            self.move_to_centered_position()
+
+    def is_at_centered_position(self, tolerance=1e-4):
+        """
+        Returns:
+            (bool): True if the diffractometer motors are at the centred position
+        """
+        positions = HWR.beamline.diffractometer.get_positions()
+        for motor, position in self.current_dc_parameters["motors"].items():
+            if position is None:
+                continue
+            if not isinstance(motor, str):
+                return False
+            current_position = positions.get(motor)
+            if current_position is None:
+                return False
+            if abs(current_position - position) > tolerance:
+                return False
+        return True
+
     def data_collection_cleanup(self):
         """
         Method called when at end of data collection, successful or not.
@@ -571,6 +699,9 @@ class AbstractCollect(HardwareObject, object):
                 self.current_dc_parameters[
                     "synchrotronMode"
                 ] = self.get_machine_fill_mode()
+                if self.lims_writer is not None:
+                    self.store_data_collection_write_behind()
+                    return
                 (collection_id, detector_id,) = HWR.beamline.lims.store_data_collection(
                     self.current_dc_parameters, self.bl_config
                 )
@@ -583,6 +714,85 @@ class AbstractCollect(HardwareObject, object):
                     "Could not store data collection in LIMS"
                 )
 
+    def store_data_collection_write_behind(self):
+        """
+        Submits the data collection to the LIMS write queue, and waits for
+        its collection id at most lims_store_timeout. The collection goes on
+        without it if the LIMS is slower: the writes of the collection that
+        follow get it once the data collection is stored, and so do the
+        collection parameters.
+        """
+        params = self.current_dc_parameters
+        params["lims_write_key"] = "dc-" + uuid.uuid4().hex
+        write = self.lims_writer.submit(
+            "store_data_collection",
+            self.get_lims_parameters(params),
+            self.get_lims_bl_config(),
+            key=params["lims_write_key"],
+        )
+        if not write.wait(self.lims_store_timeout):
+            logging.getLogger("HWR").warning(
+                "LIMS: data collection not stored yet, collecting without"
+                " collection id"
+            )
+        write.link(functools.partial(self._data_collection_stored, params))
+
+    def _data_collection_stored(self, params, write):
+        """Sets the collection id returned by the LIMS in the parameters of
+        the data collection stored, still current or not"""
+        collection_id, detector_id = write.result[:2]
+        params["collection_id"] = collection_id
+        if detector_id:
+            params["detector_id"] = detector_id
+        if params is self.current_dc_parameters:
+            self.collection_id = collection_id
+
+    def get_lims_parameters(self, params):
+        """
+        The data collection parameters as plain data, for the LIMS write
+        queue: the motors are keyed by name.
+
+        Args:
+            params (dict): data collection parameters.
+        Returns:
+            (dict): a copy of params, the motors keyed by name.
+        """
+        params = dict(params)
+        if "motors" in params:
+            params["motors"] = {
+                motor if isinstance(motor, str) else motor.getMotorMnemonic(): position
+                for motor, position in params["motors"].items()
+            }
+        return params
+
+    def get_lims_bl_config(self):
+        """
+        Returns:
+            (BeamlineConfig): the beamline configuration as plain data, for
+                              the LIMS write queue.
+        """
+        if not self.bl_config.undulators:
+            return self.bl_config
+        return self.bl_config._replace(
+            undulators=[
+                LimsUndulator(undulator.type) for undulator in self.bl_config.undulators
+            ]
+        )
+
+    def flush_lims_writes(self, timeout=None):
+        """
+        Waits for the LIMS writes submitted to be made, for instance at the
+        end of a session.
+
+        Args:
+            timeout (float): maximum time to wait [s], None to wait for all.
+        Returns:
+            (bool): True if all the writes are made.
+        """
+        if self.lims_writer is None:
+            return True
+        return self.lims_writer.flush(timeout)
+
     def update_data_collection_in_lims(self):
         """
         Descript. :
@@ -616,7 +826,17 @@ class AbstractCollect(HardwareObject, object):
             params["slitGapHorizontal"] = hor_gap
             params["slitGapVertical"] = vert_gap
             try:
-                HWR.beamline.lims.update_data_collection(params)
+                if self.lims_writer is not None:
+                    # the parameters are sent whole: the last update is enough
+                    self.lims_writer.submit(
+                        "update_data_collection",
+                        self.get_lims_parameters(params),
+                        key=params.get("lims_write_key"),
+                        coalesce=True,
+                        wait=True,
+                    )
+                else:
+                    HWR.beamline.lims.update_data_collection(params)
             except BaseException:
                 logging.getLogger("HWR").exception(
                     "Could not update data collection in LIMS"
@@ -628,7 +848,14 @@ class AbstractCollect(HardwareObject, object):
         """
         lims = HWR.beamline.lims
         if lims and lims.is_connected() and not self.current_dc_parameters["in_interleave"]:
-            HWR.beamline.lims.update_bl_sample(self.current_lims_sample)
+            if self.lims_writer is not None:
+                self.lims_writer.submit(
+                    "update_bl_sample",
+                    self.current_lims_sample,
+                    key=self.current_dc_parameters.get("lims_write_key"),
+                )
+            else:
+                HWR.beamline.lims.update_bl_sample(self.current_lims_sample)
 
     def store_image_in_lims(self, frame_number, motor_position_id=None):
         """
@@ -669,6 +896,14 @@ class AbstractCollect(HardwareObject, object):
                 lims_image["jpegThumbnailFileFullPath"] = jpeg_thumbnail_full_path
             if motor_position_id:
                 lims_image["motorPositionId"] = motor_position_id
+            if self.lims_writer is not None and not lims_image["dataCollectionId"]:
+                # stored once the data collection is, with its collection id
+                self.lims_writer.submit(
+                    "store_image",
+                    lims_image,
+                    key=self.current_dc_parameters.get("lims_write_key"),
+                )
+                return None
             image_id = HWR.beamline.lims.store_image(lims_image)
             return image_id
 
@@ -688,7 +923,18 @@ class AbstractCollect(HardwareObject, object):
                     self.current_dc_parameters[
                         "xtalSnapshotFullPath3"
                     ] = grid_snapshot_filename
-                HWR.beamline.lims.update_data_collection(self.current_dc_parameters)
+                if self.lims_writer is not None:
+                    self.lims_writer.submit(
+                        "update_data_collection",
+                        self.get_lims_parameters(self.current_dc_parameters),
+                        key=self.current_dc_parameters.get("lims_write_key"),
+                        coalesce=True,
+                        wait=True,
+                    )
+                else:
+                    HWR.beamline.lims.update_data_collection(
+                        self.current_dc_parameters
+                    )
             except BaseException:
                 logging.getLogger("HWR").exception(
                     "Could not store data collection into ISPyB"
@@ -20,8 +20,6 @@
 """AbstractFlux class
 Defines get_average_flux_density.
 """
-from scipy.interpolate import interp1d
-
 from mxcubecore.HardwareObjects.abstract.AbstractActuator import AbstractActuator
 
 from mxcubecore import HardwareRepository as HWR
@@ -46,9 +44,6 @@ class AbstractFlux(AbstractActuator):
     # Dose rate for a standard composition crystal, in Gy/s
     # As a function of energy in keV
     #
-    # NB this can be called as a function, the same as if it was defined thus:
-    # def get_dose_rate_per_photon_per_mmsq(self, energy):
-    #
     # The interpolation table get_dose_rate_per_photon_per_mmsq was created using
     # "Absorbed dose calculations for macromolecular crystals: improvements to RADDOSE"
     # Paithankar, K.S., Owen, R.L and Garman, E.F J. Syn. Rad. (2009), 16, 152-162,
@@ -59,22 +54,34 @@ class AbstractFlux(AbstractActuator):
     # The necessary approximations should be done locally.
     # See GphlWorkflow for an example of how to do it.
     #
-    get_dose_rate_per_photon_per_mmsq = interp1d(
-        [4.0, 6.6, 9.2, 11.8, 14.4, 17.0, 19.6, 22.2, 24.8, 27.4, 30.0],
-        [
-            4590.0e-12,
-            1620.0e-12,
-            790.0e-12,
-            457.0e-12,
-            293.0e-12,
-            202.0e-12,
-            146.0e-12,
-            111.0e-12,
-            86.1e-12,
-            68.7e-12,
-            55.2e-12,
-        ],
-    )
+    _dose_rate_interpolation = None
+
+    @staticmethod
+    def get_dose_rate_per_photon_per_mmsq(energy):
+        """Dose rate per photon per mm^2 at energy (keV), in Gy/s
+
+        The interpolation (scipy) is created on first use.
+        """
+        if AbstractFlux._dose_rate_interpolation is None:
+            from scipy.interpolate import interp1d
+
+            AbstractFlux._dose_rate_interpolation = interp1d(
+                [4.0, 6.6, 9.2, 11.8, 14.4, 17.0, 19.6, 22.2, 24.8, 27.4, 30.0],
+                [
+                    4590.0e-12,
+                    1620.0e-12,
+                    790.0e-12,
+                    457.0e-12,
+                    293.0e-12,
+                    202.0e-12,
+                    146.0e-12,
+                    111.0e-12,
+                    86.1e-12,
+                    68.7e-12,
+                    55.2e-12,
+                ],
+            )
+        return AbstractFlux._dose_rate_interpolation(energy)
 
     def get_average_flux_density(self, transmission=None):
         """Get average flux density over the beam area in photons / mm^2
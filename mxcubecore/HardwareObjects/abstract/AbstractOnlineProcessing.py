@@ -24,17 +24,13 @@ import json
 import subprocess
 
 from copy import copy
-from scipy import ndimage
-from scipy.interpolate import UnivariateSpline
-import matplotlib.pyplot as plt
-from mpl_toolkits.axes_grid1 import make_axes_locatable
-
 import numpy as np
 import gevent
 
 import SimpleHTML
 from mxcubecore.BaseHardwareObjects import HardwareObject
 from mxcubecore import HardwareRepository as HWR
+from mxcubecore.utils.report_writer import ReportWriter
 
 
 __copyright__ = """ Copyright © 2010-2022 by the MXCuBE collaboration """
@@ -88,6 +84,9 @@ class AbstractOnlineProcessing(HardwareObject):
 
         self.current_grid_index = None
         self.grid_properties = []
+        self.report_writer = None
+        # (grid, first_image_num, images_num, cols, rows) of get_grid_cells
+        self._grid_cells = None
 
     def init(self):
         self.done_event = gevent.event.Event()
@@ -97,6 +96,10 @@ class AbstractOnlineProcessing(HardwareObject):
         self.start_command = str(self.get_property("processing_command"))
         self.kill_command = str(self.get_property("kill_command"))
         self.interpolate_results = self.get_property("interpolate_results")
+        self.report_writer = ReportWriter(
+            max_pending=self.get_property("report_queue_size", 8),
+            processes=self.get_property("report_processes", 0),
+        )
 
     def get_result_types(self):
         return self.result_types
@@ -111,6 +114,7 @@ class AbstractOnlineProcessing(HardwareObject):
         acquisition = self.data_collection.acquisitions[0]
         acq_params = acquisition.acquisition_parameters
         self.grid = self.data_collection.grid
+        self._grid_cells = None
 
         grid_params = None
         if self.grid:
@@ -422,62 +426,124 @@ class AbstractOnlineProcessing(HardwareObject):
 
     def store_processing_results(self, status):
         """Stores result plots. In the case of MeshScan and XrayCentering
-           html is created and results saved in ISPyB
+           html is created and results saved in ISPyB.
+           The results are copied, and stored in the background by the
+           report writer: the next processing can start at once.
 
         :param status: status type
         :type status: str
+        :returns: report job
+        :rtype: ReportJob
         """
-        log = logging.getLogger("HWR")
-
         self.started = False
         self.params_dict["status"] = status
-
-        # ---------------------------------------------------------------------
-        # Assembling all file names
         self.params_dict["max_dozor_score"] = float(self.results_aligned["score"].max())
-        best_positions = self.results_aligned.get("best_positions", [])
 
-        processing_grid_overlay_file = os.path.join(
-            self.params_dict["archive_directory"], "grid_overlay.png"
-        )
+        params_dict = dict(self.params_dict)
+        results_raw = {
+            key: copy(self.results_raw[key])
+            for key in ("score", "spots_num", "spots_resolution", "is")
+            if key in self.results_raw
+        }
+        results_aligned = {
+            key: copy(value) for key, value in self.results_aligned.items()
+        }
+        best_positions = results_aligned.get("best_positions", [])
+        best_cell = None
+        if best_positions:
+            best_cell = (best_positions[0]["col"], best_positions[0]["row"])
 
         # If MeshScan and XrayCentring then info is stored in ISPyB
-        if self.params_dict["workflow_type"] in (
-            "MeshScan",
-            "XrayCentering",
-            "LineScan",
-        ):
-            if self.workflow_info is not None:
-                self.params_dict["workflow_id"] = self.workflow_info["workflow_id"]
+        previous_workflow = None
+        if params_dict["workflow_type"] in ("MeshScan", "XrayCentering", "LineScan"):
+            previous_workflow = self.workflow_info
+            if params_dict["workflow_type"] == "XrayCentering" and self.grid:
+                # the workflow_id is set when the workflow is stored in ISPyB
+                self.workflow_info = {
+                    "workflow_id": None,
+                    "process_root_directory": params_dict["process_root_directory"],
+                    "archive_root_directory": params_dict["archive_root_directory"],
+                }
+            else:
+                self.workflow_info = None
+
+        try:
+            det_pixel_size = HWR.beamline.detector.get_pixel_size()
+        except Exception:
+            det_pixel_size = None
+
+        if self.report_writer is None:
+            self.report_writer = ReportWriter()
+        return self.report_writer.submit(
+            "Online processing %s" % params_dict["archive_directory"],
+            (
+                self.store_results_in_lims,
+                (
+                    params_dict,
+                    best_positions,
+                    previous_workflow,
+                    self.workflow_info,
+                    HWR.beamline.collect.collection_id,
+                ),
+                False,
+            ),
+            (
+                write_processing_files,
+                (
+                    params_dict,
+                    {
+                        key: results_aligned[key]
+                        for key in results_raw
+                        if key in results_aligned
+                    },
+                    results_raw,
+                    best_cell,
+                    det_pixel_size,
+                ),
+                True,
+            ),
+            (
+                self.processing_files_written,
+                (params_dict, results_aligned, self.grid),
+                False,
+            ),
+        )
+
+    def store_results_in_lims(
+        self, params_dict, best_positions, previous_workflow, workflow, collection_id
+    ):
+        """Stores the workflow (MeshScan, XrayCentering or LineScan) and the
+        image quality indicators plot in ISPyB
+        Args:
+            params_dict (dict): processing parameters
+            best_positions (list): best positions of the results
+            previous_workflow (dict): workflow continued, or None
+            workflow (dict): workflow info, updated with the workflow_id
+            collection_id (int): data collection id
+        """
+        log = logging.getLogger("HWR")
+
+        if params_dict["workflow_type"] in ("MeshScan", "XrayCentering", "LineScan"):
+            if previous_workflow is not None:
+                params_dict["workflow_id"] = previous_workflow["workflow_id"]
 
             (
                 workflow_id,
                 workflow_mesh_id,
                 grid_info_id,
-            ) = HWR.beamline.lims.store_workflow(self.params_dict)
+            ) = HWR.beamline.lims.store_workflow(params_dict)
 
-            self.params_dict["workflow_id"] = workflow_id
-            self.params_dict["workflow_mesh_id"] = workflow_mesh_id
-            self.params_dict["grid_info_id"] = grid_info_id
-
-            if self.params_dict["workflow_type"] == "XrayCentering" and self.grid:
-                self.workflow_info = {
-                    "workflow_id": self.params_dict["workflow_id"],
-                    "process_root_directory": self.params_dict[
-                        "process_root_directory"
-                    ],
-                    "archive_root_directory": self.params_dict[
-                        "archive_root_directory"
-                    ],
-                }
-            else:
-                self.workflow_info = None
+            params_dict["workflow_id"] = workflow_id
+            params_dict["workflow_mesh_id"] = workflow_mesh_id
+            params_dict["grid_info_id"] = grid_info_id
+            if workflow is not None:
+                workflow["workflow_id"] = workflow_id
 
             HWR.beamline.collect.update_lims_with_workflow(
-                workflow_id, self.params_dict["snapshot_path"]
+                workflow_id, params_dict["snapshot_path"]
             )
 
-            HWR.beamline.lims.store_workflow_step(self.params_dict)
+            HWR.beamline.lims.store_workflow_step(params_dict)
             if len(best_positions) > 0:
                 HWR.beamline.collect._store_image_in_lims_by_frame_num(
                     best_positions[0]["index"]
@@ -485,245 +551,75 @@ class AbstractOnlineProcessing(HardwareObject):
             log.info("Online processing: Results saved in ISPyB")
 
         HWR.beamline.lims.set_image_quality_indicators_plot(
-            HWR.beamline.collect.collection_id,
-            self.params_dict["cartography_path"],
-            self.params_dict["csv_file_path"],
+            collection_id,
+            params_dict["cartography_path"],
+            params_dict["csv_file_path"],
         )
 
-        if self.params_dict["lines_num"] > 1:
-            fig, ax = plt.subplots(nrows=1, ncols=1)
-            current_max = max(fig.get_size_inches())
-            grid_width = self.params_dict["steps_x"] * self.params_dict["xOffset"]
-            grid_height = self.params_dict["steps_y"] * self.params_dict["yOffset"]
-
-            if grid_width > grid_height:
-                fig.set_size_inches(current_max, current_max * grid_height / grid_width)
-            else:
-                fig.set_size_inches(current_max * grid_width / grid_height, current_max)
-
-            im = ax.imshow(
-                np.transpose(self.results_aligned["score"]),
-                interpolation="none",
-                aspect="auto",
-                extent=[
-                    0,
-                    self.results_aligned["score"].shape[0],
-                    0,
-                    self.results_aligned["score"].shape[1],
-                ],
+    def processing_files_written(self, params_dict, results_aligned, grid):
+        """Displays the grid overlay and generates the html and json reports,
+        once the plots and the csv file are written (the files which could
+        not be written are already logged)
+        """
+        log = logging.getLogger("HWR")
+        if os.path.exists(params_dict["cartography_path"]):
+            log.info(
+                "Online processing: Plot saved in %s" % params_dict["cartography_path"]
+            )
+        if os.path.exists(params_dict["csv_file_path"]):
+            log.info(
+                "Online processing: Raw data stored in %s"
+                % params_dict["csv_file_path"]
             )
-            im.set_cmap("hot")
 
+        processing_grid_overlay_file = os.path.join(
+            params_dict["archive_directory"], "grid_overlay.png"
+        )
+        if params_dict["lines_num"] > 1 and os.path.exists(
+            processing_grid_overlay_file
+        ):
             try:
-                if not os.path.exists(os.path.dirname(processing_grid_overlay_file)):
-                    os.makedirs(os.path.dirname(processing_grid_overlay_file))
-
-                plt.imsave(
-                    processing_grid_overlay_file,
-                    np.transpose(self.results_aligned["score"]),
-                    format="png",
-                    cmap="hot",
-                )
-                self.grid.set_overlay_pixmap(processing_grid_overlay_file)
+                grid.set_overlay_pixmap(processing_grid_overlay_file)
                 log.info(
                     "Online processing: Grid overlay figure saved %s"
                     % processing_grid_overlay_file
                 )
             except Exception:
                 log.exception(
-                    "Online processing: Could not save grid overlay figure %s"
+                    "Online processing: Could not display grid overlay figure %s"
                     % processing_grid_overlay_file
                 )
 
-            if len(best_positions) > 0:
-                plt.axvline(x=best_positions[0]["col"], linewidth=0.5)
-                plt.axhline(y=best_positions[0]["row"], linewidth=0.5)
-
-                divider = make_axes_locatable(ax)
-                cax = divider.append_axes("right", size=0.1, pad=0.05)
-                cax.tick_params(axis="x", labelsize=8)
-                cax.tick_params(axis="y", labelsize=8)
-                plt.colorbar(im, cax=cax)
-        else:
-            fig, ax = plt.subplots(nrows=2, ncols=1)
-            max_resolution = self.params_dict["resolution"]
-            min_resolution = self.results_aligned["spots_resolution"].max()
-            max_score = self.results_aligned["score"].max()
-
-            if max_score == 0:
-                max_score = 1
-            max_spots_num = self.results_aligned["spots_num"].max()
-            if max_spots_num == 0:
-                max_spots_num = 1
-
-            ax[0].plot(
-                self.results_aligned["score"] / max_score, ",", label="Score", c="r"
-            )
-            ax[0].plot(
-                self.results_aligned["spots_num"] / max_spots_num,
-                ",",
-                label="Number of spots",
-                c="b",
-            )
-            ax[0].plot(
-                self.results_aligned["spots_resolution"], ".", label="Resolution", c="y"
-            )
-
-            ax[0].legend(
-                loc="lower center",
-                fancybox=True,
-                numpoints=1,
-                borderaxespad=0.0,
-                # bbox_to_anchor=(0.5, -0.13),
-                ncol=3,
-                fontsize=8,
-            )
-            ax[0].set_ylim(-0.01, 1.1)
-            ax[0].set_xlim(0, self.params_dict["images_num"])
-
-            positions = np.linspace(
-                0, self.results_aligned["spots_resolution"].max(), 5
-            )
-            labels = ["inf"]
-            for item in positions[1:]:
-                labels.append("%.2f" % (1.0 / item))
-            ax[0].set_yticks(positions)
-            ax[0].set_yticklabels(labels)
-
-            # new_labels = numpy.linspace(min_resolution, max_resolution / 1.2, len(ax.get_yticklabels()))
-            # new_labels = numpy.round(new_labels, 1)
-            # ax.set_yticklabels(new_labels)
-            ax[0].set_ylabel("Resolution")
-
-            ay1 = ax[0].twinx()
-            new_labels = np.linspace(
-                0,
-                self.results_aligned["spots_num"].max(),
-                len(ay1.get_yticklabels()),
-                dtype=np.int16,
-            )
-            ay1.set_yticklabels(new_labels)
-            ay1.set_ylabel("Number of spots")
-
-            ax[1].plot(self.results_raw["is"], ",", label="Intensity", c="g")
-            ax[1].set_ylabel("Intensity")
-
-            for ax_plot in ax:
-                ax_plot.tick_params(axis="x", labelsize=8)
-                ax_plot.tick_params(axis="y", labelsize=8)
-                ax_plot.grid(True)
-
-        # ---------------------------------------------------------------------
-        # Stores plot in the processing directory
-        try:
-            if not os.path.exists(
-                os.path.dirname(self.params_dict["cartography_path"])
-            ):
-                os.makedirs(os.path.dirname(self.params_dict["cartography_path"]))
-            fig.savefig(
-                self.params_dict["cartography_path"], dpi=100, bbox_inches="tight"
-            )
-            log.info(
-                "Online processing: Plot saved in %s"
-                % self.params_dict["cartography_path"]
-            )
-        except Exception:
-            log.exception(
-                "Online processing: Could not save plot in %s"
-                % self.params_dict["cartography_path"]
-            )
-
-        # ---------------------------------------------------------------------
-        # Stores plot for ISPyB
-        try:
-            if not os.path.exists(
-                os.path.dirname(self.params_dict["cartography_path"])
-            ):
-                os.makedirs(os.path.dirname(self.params_dict["cartography_path"]))
-            fig.savefig(
-                self.params_dict["cartography_path"], dpi=100, bbox_inches="tight"
-            )
-            log.info(
-                "Online processing: Plot for ISPyB saved in %s"
-                % self.params_dict["cartography_path"]
-            )
-        except Exception:
-            log.exception(
-                "Online processing: Could not save plot for ISPyB %s"
-                % self.params_dict["cartography_path"]
-            )
-
-        plt.close(fig)
-
         # ---------------------------------------------------------------------
         # Generates html and json files
         try:
-            SimpleHTML.generate_online_processing_report(
-                self.results_aligned, self.params_dict
-            )
+            SimpleHTML.generate_online_processing_report(results_aligned, params_dict)
             log.info(
                 "Online processing: Html report saved in %s"
-                % self.params_dict["html_file_path"]
+                % params_dict["html_file_path"]
             )
             log.info(
                 "Online processing: Json report saved in %s"
-                % self.params_dict["json_file_path"]
+                % params_dict["json_file_path"]
             )
         except Exception as ex:
             log.exception(
                 "Online processing: Could not save results html %s: %s"
-                % (self.params_dict["html_file_path"], str(ex))
+                % (params_dict["html_file_path"], str(ex))
             )
             log.exception(
                 "Online processing: Could not save json results in %s : %s"
-                % (self.params_dict["json_file_path"], str(ex))
-            )
-
-        # ---------------------------------------------------------------------
-        # Writes results in the csv file
-        try:
-            det_pixel_size = HWR.beamline.detector.get_pixel_size()
-            with open(self.params_dict["csv_file_path"], "w") as processing_csv_file:
-                processing_csv_file.write(
-                    "%s,%d,%d,%d,%d,%d,%s,%d,%d\n"
-                    % (
-                        self.params_dict["template"],
-                        self.params_dict["first_image_num"],
-                        self.params_dict["images_num"],
-                        self.params_dict["run_number"],
-                        self.params_dict["run_number"],
-                        self.params_dict["lines_num"],
-                        str(self.params_dict["reversing_rotation"]),
-                        det_pixel_size[0],
-                        det_pixel_size[1],
-                    )
-                )
-                for index in range(self.params_dict["images_num"]):
-                    processing_csv_file.write(
-                        "%d,%f,%d,%f\n"
-                        % (
-                            index,
-                            self.results_raw["score"][index],
-                            self.results_raw["spots_num"][index],
-                            self.results_raw["spots_resolution"][index],
-                        )
-                    )
-            log.info(
-                "Online processing: Raw data stored in %s"
-                % self.params_dict["csv_file_path"]
+                % (params_dict["json_file_path"], str(ex))
             )
-        except Exception:
-            log.error(
-                "Online processing: Unable to store raw data in %s"
-                % self.params_dict["csv_file_path"]
-            )
-        # ---------------------------------------------------------------------
 
     def align_processing_results(self, start_index, end_index):
         """Realigns all results. Each results (one dimensional numpy array)
         is converted to 2d numpy array according to diffractometer geometry.
         Function also extracts 10 (if they exist) best positions
         """
+        from scipy import ndimage
+        from scipy.interpolate import UnivariateSpline
+
         # Each result array is realigned
 
         for score_key in self.results_raw:
@@ -731,17 +627,7 @@ class AbstractOnlineProcessing(HardwareObject):
                 self.grid
                 and self.results_raw[score_key].size == self.params_dict["images_num"]
             ):
-                for cell_index in range(start_index, end_index + 1):
-                    col, row = self.grid.get_col_row_from_image_serial(
-                        cell_index + self.params_dict["first_image_num"]
-                    )
-                    if (
-                        col < self.results_aligned[score_key].shape[0]
-                        and row < self.results_aligned[score_key].shape[1]
-                    ):
-                        self.results_aligned[score_key][col][row] = self.results_raw[
-                            score_key
-                        ][cell_index]
+                self.align_grid_results(score_key, start_index, end_index)
             else:
                 self.results_aligned[score_key] = self.results_raw[score_key]
                 if self.interpolate_results:
@@ -784,7 +670,12 @@ class AbstractOnlineProcessing(HardwareObject):
         # Best positions are extracted
         best_positions_list = []
 
-        index_arr = (-self.results_raw["score"]).argsort()[:10]
+        scores = self.results_raw["score"]
+        if scores.size > 10:
+            index_arr = np.argpartition(-scores, 9)[:10]
+            index_arr = index_arr[(-scores[index_arr]).argsort()]
+        else:
+            index_arr = (-scores).argsort()
         if len(index_arr) > 0:
             for index in index_arr:
                 if self.results_raw["score"][index] > 0:
@@ -808,11 +699,9 @@ class AbstractOnlineProcessing(HardwareObject):
 
                     cpos = None
                     if self.grid:
-                        col, row = self.grid.get_col_row_from_image_serial(
-                            index + self.params_dict["first_image_num"]
-                        )
-                        col += 0.5
-                        row = self.params_dict["steps_y"] - row - 0.5
+                        cols, rows = self.get_grid_cells()
+                        col = int(cols[index]) + 0.5
+                        row = self.params_dict["steps_y"] - int(rows[index]) - 0.5
                         cpos = self.grid.get_motor_pos_from_col_row(col, row)
                     else:
                         col = index
@@ -829,8 +718,42 @@ class AbstractOnlineProcessing(HardwareObject):
 
         self.results_aligned["best_positions"] = best_positions_list
 
+    def align_grid_results(self, score_key, start_index, end_index):
+        """Copies results start_index to end_index in their grid cells"""
+        cols, rows = self.get_grid_cells()
+        cols = cols[start_index : end_index + 1]
+        rows = rows[start_index : end_index + 1]
+        aligned = self.results_aligned[score_key]
+        inside = (cols < aligned.shape[0]) & (rows < aligned.shape[1])
+        aligned[cols[inside], rows[inside]] = self.results_raw[score_key][
+            start_index : end_index + 1
+        ][inside]
+
+    def get_grid_cells(self):
+        """Grid cells of the images, computed once per grid
+        Returns:
+            (tuple): numpy arrays of the (col, row) of each image
+        """
+        key = (
+            self.grid,
+            self.params_dict["first_image_num"],
+            self.params_dict["images_num"],
+        )
+        if self._grid_cells is None or self._grid_cells[:3] != key:
+            first_image_num, images_num = key[1:]
+            cells = np.array(
+                [
+                    self.grid.get_col_row_from_image_serial(first_image_num + index)
+                    for index in range(images_num)
+                ],
+                dtype=int,
+            ).reshape(-1, 2)
+            self._grid_cells = key + (cells[:, 0], cells[:, 1])
+        return self._grid_cells[3:]
+
     def extract_sweeps(self):
         """Extracts sweeps from processing results"""
+        from scipy import ndimage
 
         # self.results_aligned
         logging.getLogger("HWR").info("Online processing: Extracting sweeps")
@@ -856,3 +779,193 @@ class AbstractOnlineProcessing(HardwareObject):
             json.dump(json_dict, fp)
 
         self.print_log(f"Online processing: Mesh best file {mesh_best_file} saved")
+
+
+def write_processing_files(
+    params_dict, results_aligned, results_raw, best_cell, det_pixel_size
+):
+    """Writes the online processing plot, the grid overlay and the csv file.
+    Runs in the report writer thread pool, or in a separate process, with the
+    matplotlib object oriented interface (pyplot is neither needed nor thread
+    safe). A file which cannot be written does not prevent the others from
+    being written.
+
+    Args:
+        params_dict (dict): processing parameters
+        results_aligned (dict): aligned score, spots_num and spots_resolution
+        results_raw (dict): raw score, spots_num, spots_resolution and is
+        best_cell (tuple): (col, row) of the best position, or None
+        det_pixel_size (tuple): detector pixel size
+    """
+    log = logging.getLogger("HWR")
+
+    if params_dict["lines_num"] > 1:
+        processing_grid_overlay_file = os.path.join(
+            params_dict["archive_directory"], "grid_overlay.png"
+        )
+        try:
+            # matplotlib is slow to import, and only needed here
+            from matplotlib.image import imsave
+
+            if not os.path.exists(params_dict["archive_directory"]):
+                os.makedirs(params_dict["archive_directory"])
+            imsave(
+                processing_grid_overlay_file,
+                np.transpose(results_aligned["score"]),
+                format="png",
+                cmap="hot",
+            )
+        except Exception:
+            log.exception(
+                "Online processing: Could not save grid overlay figure %s"
+                % processing_grid_overlay_file
+            )
+
+    # ---------------------------------------------------------------------
+    # Stores plot in the processing directory, for ISPyB
+    try:
+        _save_processing_plot(params_dict, results_aligned, results_raw, best_cell)
+    except Exception:
+        log.exception(
+            "Online processing: Could not save plot in %s"
+            % params_dict["cartography_path"]
+        )
+
+    # ---------------------------------------------------------------------
+    # Writes results in the csv file
+    try:
+        if det_pixel_size is None:
+            raise RuntimeError("unknown detector pixel size")
+        with open(params_dict["csv_file_path"], "w") as processing_csv_file:
+            processing_csv_file.write(
+                "%s,%d,%d,%d,%d,%d,%s,%d,%d\n"
+                % (
+                    params_dict["template"],
+                    params_dict["first_image_num"],
+                    params_dict["images_num"],
+                    params_dict["run_number"],
+                    params_dict["run_number"],
+                    params_dict["lines_num"],
+                    str(params_dict["reversing_rotation"]),
+                    det_pixel_size[0],
+                    det_pixel_size[1],
+                )
+            )
+            for index in range(params_dict["images_num"]):
+                processing_csv_file.write(
+                    "%d,%f,%d,%f\n"
+                    % (
+                        index,
+                        results_raw["score"][index],
+                        results_raw["spots_num"][index],
+                        results_raw["spots_resolution"][index],
+                    )
+                )
+    except Exception:
+        log.exception(
+            "Online processing: Unable to store raw data in %s"
+            % params_dict["csv_file_path"]
+        )
+
+
+def _save_processing_plot(params_dict, results_aligned, results_raw, best_cell):
+    """Plots the online processing results, in cartography_path"""
+    # matplotlib is slow to import, and only needed here
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+    from mpl_toolkits.axes_grid1 import make_axes_locatable
+
+    fig = Figure()
+    FigureCanvasAgg(fig)
+    if params_dict["lines_num"] > 1:
+        ax = fig.subplots(nrows=1, ncols=1)
+        current_max = max(fig.get_size_inches())
+        grid_width = params_dict["steps_x"] * params_dict["xOffset"]
+        grid_height = params_dict["steps_y"] * params_dict["yOffset"]
+
+        if grid_width > grid_height:
+            fig.set_size_inches(current_max, current_max * grid_height / grid_width)
+        else:
+            fig.set_size_inches(current_max * grid_width / grid_height, current_max)
+
+        im = ax.imshow(
+            np.transpose(results_aligned["score"]),
+            interpolation="none",
+            aspect="auto",
+            extent=[
+                0,
+                results_aligned["score"].shape[0],
+                0,
+                results_aligned["score"].shape[1],
+            ],
+        )
+        im.set_cmap("hot")
+
+        if best_cell is not None:
+            ax.axvline(x=best_cell[0], linewidth=0.5)
+            ax.axhline(y=best_cell[1], linewidth=0.5)
+
+            divider = make_axes_locatable(ax)
+            cax = divider.append_axes("right", size=0.1, pad=0.05)
+            cax.tick_params(axis="x", labelsize=8)
+            cax.tick_params(axis="y", labelsize=8)
+            fig.colorbar(im, cax=cax)
+    else:
+        ax = fig.subplots(nrows=2, ncols=1)
+        max_score = results_aligned["score"].max()
+
+        if max_score == 0:
+            max_score = 1
+        max_spots_num = results_aligned["spots_num"].max()
+        if max_spots_num == 0:
+            max_spots_num = 1
+
+        ax[0].plot(results_aligned["score"] / max_score, ",", label="Score", c="r")
+        ax[0].plot(
+            results_aligned["spots_num"] / max_spots_num,
+            ",",
+            label="Number of spots",
+            c="b",
+        )
+        ax[0].plot(results_aligned["spots_resolution"], ".", label="Resolution", c="y")
+
+        ax[0].legend(
+            loc="lower center",
+            fancybox=True,
+            numpoints=1,
+            borderaxespad=0.0,
+            ncol=3,
+            fontsize=8,
+        )
+        ax[0].set_ylim(-0.01, 1.1)
+        ax[0].set_xlim(0, params_dict["images_num"])
+
+        positions = np.linspace(0, results_aligned["spots_resolution"].max(), 5)
+        labels = ["inf"]
+        for item in positions[1:]:
+            labels.append("%.2f" % (1.0 / item))
+        ax[0].set_yticks(positions)
+        ax[0].set_yticklabels(labels)
+        ax[0].set_ylabel("Resolution")
+
+        ay1 = ax[0].twinx()
+        new_labels = np.linspace(
+            0,
+            results_aligned["spots_num"].max(),
+            len(ay1.get_yticklabels()),
+            dtype=np.int16,
+        )
+        ay1.set_yticklabels(new_labels)
+        ay1.set_ylabel("Number of spots")
+
+        ax[1].plot(results_raw["is"], ",", label="Intensity", c="g")
+        ax[1].set_ylabel("Intensity")
+
+        for ax_plot in ax:
+            ax_plot.tick_params(axis="x", labelsize=8)
+            ax_plot.tick_params(axis="y", labelsize=8)
+            ax_plot.grid(True)
+
+    if not os.path.exists(os.path.dirname(params_dict["cartography_path"])):
+        os.makedirs(os.path.dirname(params_dict["cartography_path"]))
+    fig.savefig(params_dict["cartography_path"], dpi=100, bbox_inches="tight")
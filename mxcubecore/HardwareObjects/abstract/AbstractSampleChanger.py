@@ -127,6 +127,7 @@ How to implement derived SC Classes
 import abc
 import logging
 
+import gevent.event
 from gevent import sleep, Timeout
 
 from mxcubecore.TaskUtils import task as dtask
@@ -209,6 +210,9 @@ class SampleChanger(Container, HardwareObject):
     TASK_FINISHED_EVENT = "taskFinished"
     CONTENTS_UPDATED_EVENT = "contentsUpdated"
 
+    # time to gather the channel updates of a burst in one refresh [s]
+    UPDATE_COALESCE_TIME = 0.1
+
     def __init__(self, type_, scannable, *args, **kwargs):
         super().__init__(type_, None, type_, scannable)
         if len(args) == 0:
@@ -222,26 +226,50 @@ class SampleChanger(Container, HardwareObject):
         self.task_error = None
         self._transient = False
         self._token = None
-        self._timer_update_inverval = 5  # interval in periods of 100 ms
+        self._timer_update_inverval = 1  # interval in periods of 1 s
         self._timer_update_counter = 0
         self.use_update_timer = None
+        self.update_on_change = None
+        self.update_poll_interval = 1.0
+        self.update_max_poll_interval = 30.0
+        self._update_poll_interval = None
+        self._update_event = gevent.event.Event()
+        self._update_counters = {"refreshes": 0, "polls": 0, "skipped": 0}
 
     def init(self):
         """
         HardwareObject init method
         """
         use_update_timer = self.get_property("useUpdateTimer", True)
+        update_on_change = self.get_property("update_on_change", False)
+        self.update_poll_interval = self.get_property(
+            "update_poll_interval", self.update_poll_interval
+        )
+        self.update_max_poll_interval = self.get_property(
+            "update_max_poll_interval", self.update_max_poll_interval
+        )
 
-        msg = f"SampleChanger: Using update timer is {use_update_timer}"
+        msg = (
+            f"SampleChanger: Using update timer is {use_update_timer}, "
+            f"updating on change is {update_on_change}"
+        )
         logging.getLogger("HWR").info(msg)
 
         if use_update_timer:
             task1s = self.__timer_1s_task(wait=False)
             task1s.link(self._on_timer_1s_exit)
+        if update_on_change:
+            for channel_name in self.get_channel_names_list():
+                self.get_channel_object(channel_name).connect_signal(
+                    "update", self._on_channel_update
+                )
+            self._start_update_on_change()
+        elif use_update_timer:
             updateTask = self.__update_timer_task(wait=False)
             updateTask.link(self._on_timer_update_exit)
 
         self.use_update_timer = use_update_timer
+        self.update_on_change = update_on_change
 
         self.update_info()
 
@@ -268,7 +296,7 @@ class SampleChanger(Container, HardwareObject):
             try:
                 if self.is_enabled():
                     self._timer_update_counter += 1
-                    if self._timer_update_counter >= self._timer_update_counter:
+                    if self._timer_update_counter >= self._timer_update_inverval:
                         self._on_timer_update()
                         self._timer_update_counter = 0
             except Exception:
@@ -285,6 +313,67 @@ class SampleChanger(Container, HardwareObject):
     def _on_timer_1s(self):
         pass
 
+    # ########################    UPDATE ON CHANGE    #########################
+    def _start_update_on_change(self):
+        """Start refreshing the info when channels change, instead of polling
+
+        The channels whose update signal is connected to _on_channel_update
+        trigger a refresh, with the updates of a burst gathered in one
+        refresh. Without updates, the info is still polled, at intervals
+        doubling from update_poll_interval to update_max_poll_interval as
+        long as nothing changes.
+
+        Returns:
+            (gevent.Greenlet): the update task
+        """
+        update_task = self.__update_on_change_task(wait=False)
+        update_task.link(self._on_timer_update_exit)
+        return update_task
+
+    def _on_channel_update(self, value=None):
+        """Ask for a refresh of the info. Connected to the channels update signal"""
+        if self._update_event.is_set():
+            self._update_counters["skipped"] += 1
+        else:
+            self._update_event.set()
+
+    def get_update_counters(self):
+        """Counters of the info refreshes, when updating on change
+
+        Returns:
+            (dict): refreshes triggered by channel updates, fallback polls,
+                    channel updates gathered in another refresh (skipped)
+                    and current fallback poll interval [s].
+        """
+        counters = dict(self._update_counters)
+        counters["poll_interval"] = self._update_poll_interval
+        return counters
+
+    @dtask
+    def __update_on_change_task(self, *args):
+        self._update_poll_interval = self.update_poll_interval
+        while True:
+            channel_update = self._update_event.wait(self._update_poll_interval)
+            try:
+                if channel_update:
+                    sleep(self.UPDATE_COALESCE_TIME)
+                self._update_event.clear()
+                if not self.is_enabled():
+                    continue
+                changed = self.update_info()
+                if channel_update:
+                    self._update_counters["refreshes"] += 1
+                else:
+                    self._update_counters["polls"] += 1
+                if channel_update or changed:
+                    self._update_poll_interval = self.update_poll_interval
+                else:
+                    self._update_poll_interval = min(
+                        2 * self._update_poll_interval, self.update_max_poll_interval
+                    )
+            except Exception:
+                pass
+
     # #######################    HardwareObject    #######################
 
     def connect_notify(self, signal):
@@ -457,10 +546,13 @@ class SampleChanger(Container, HardwareObject):
         Update sample changer sample information, currently loaded sample
         and emits infoChanged and loadedSampleChanged when loaded sample
         have changed
+        Returns:
+            (bool): True if the information or the loaded sample changed
         """
         former_loaded = self.get_loaded_sample()
         self._do_update_info()
-        if self._is_dirty():
+        changed = self._is_dirty()
+        if changed:
             self._trigger_info_changed_event()
 
         loaded = self.get_loaded_sample()
@@ -471,8 +563,10 @@ class SampleChanger(Container, HardwareObject):
                 or (loaded.get_address() != former_loaded.get_address())
             ):
                 self._trigger_loaded_sample_changed_event(loaded)
+                changed = True
 
         self._reset_dirty()
+        return changed
 
     def is_transient(self):
         """???"""
@@ -600,6 +694,27 @@ class SampleChanger(Container, HardwareObject):
         self.wait_ready(timeout=10)
         return self.load(sample_to_load)
 
+    def prepare_load(self, sample):
+        """
+        Prepare the load of a sample while the sample mounted is still in
+        use, for instance by picking it from the dewar, so that the load that
+        follows is shorter. Robots able to do it override this method, and
+        load then uses the prepared sample.
+
+        Args:
+            sample (tuple): sample address on the form
+                            (component1, ... ,component_N-1, component_N)
+        Returns:
+            (bool): True if the load was prepared, False if not supported
+        """
+        return False
+
+    def cancel_prepared_load(self):
+        """
+        Put back the sample prepared by prepare_load, when it is not to be
+        loaded next.
+        """
+
     def load(self, sample=None, wait=True):
         """
         Load a sample.
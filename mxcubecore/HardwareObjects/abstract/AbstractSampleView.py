@@ -60,6 +60,18 @@ class AbstractSampleView(HardwareObject):
             bw(bool): Return grayscale image.
         """
 
+    def get_frame(self, bw=True):
+        """Get the current camera image as an array, without overlay.
+        Args:
+            bw(bool): Return grayscale image. Default True.
+        Returns:
+            (numpy.ndarray): Image, None if the camera cannot provide it.
+        """
+        get_frame = getattr(self.camera, "get_frame", None)
+        if get_frame is None:
+            return None
+        return get_frame(bw=bw)
+
     def save_scene_animation(self, filename, duration=1):
         """Take snapshots and create an animation.
         Args:
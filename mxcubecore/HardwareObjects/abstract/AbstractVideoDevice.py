@@ -218,6 +218,46 @@ class AbstractVideoDevice(HardwareObject):
             return jpg_img
         return None
 
+    def get_frame(self, bw=True):
+        """Get the latest image as an array, without encoding it.
+        The mirroring and scaling of the camera are applied.
+        Args:
+            bw(bool): Return a grayscale (height, width) uint8 array,
+                      instead of a (height, width, 3) RGB array. Default True.
+        Returns:
+            (numpy.ndarray): Image, None if no image is available.
+        """
+        raw_buffer, width, height = self.get_image()
+        if raw_buffer is None:
+            return None
+
+        if bw and self.cam_encoding == "y8":
+            # already grayscale, no need to go through RGB
+            image = np.frombuffer(raw_buffer, dtype=np.uint8)
+            image = image[: width * height].reshape(height, width)
+        else:
+            if self.decoder:
+                raw_buffer = self.decoder(raw_buffer)
+            if not isinstance(raw_buffer, np.ndarray):
+                raw_buffer = np.frombuffer(raw_buffer, dtype=np.uint8)
+            image = raw_buffer.reshape(height, width, -1)
+            if bw:
+                image = np.dot(image[..., :3], [0.299, 0.587, 0.114]).astype(np.uint8)
+
+        if self.cam_mirror is not None:
+            if self.cam_mirror[0]:
+                image = image[:, ::-1]
+            if self.cam_mirror[1]:
+                image = image[::-1]
+
+        if self.scale not in (None, 1):
+            # nearest neighbour, to the dimensions of get_image_dimensions
+            rows = (np.arange(int(height * self.scale)) / self.scale).astype(int)
+            columns = (np.arange(int(width * self.scale)) / self.scale).astype(int)
+            image = image[rows][:, columns]
+
+        return image
+
     def get_cam_type(self):
         """Get the camera type
         Returns:
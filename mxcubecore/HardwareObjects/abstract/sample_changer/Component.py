@@ -124,7 +124,7 @@ class Component(object):
         """
         changed = False
         if self.id is not None:
-            self.id = None
+            self._set_id(None)
             changed = True
         if self.present:
             self.present = False
@@ -139,7 +139,7 @@ class Component(object):
     def _set_info(self, present=False, id=None, scanned=False):
         changed = False
         if self.id != id:
-            self.id = id
+            self._set_id(id)
             changed = True
         if self.id:
             present = True
@@ -154,6 +154,16 @@ class Component(object):
         if changed:
             self._set_dirty()
 
+    def _set_id(self, id):
+        """
+        Sets the ID, keeping the ID index of the containers up to date
+        """
+        former_id = self.id
+        self.id = id
+        container = self.get_container()
+        if container is not None:
+            container._component_id_changed(self, former_id)
+
     def _set_selected(self, selected):
         if selected:
             for c in self.get_siblings():
@@ -2,15 +2,32 @@ from .Component import Component
 from .Sample import Sample
 
 
+def _walk(component):
+    """Yields a component, and the components under it"""
+    yield component
+    if isinstance(component, Container):
+        for c in component.components:
+            yield from _walk(c)
+
+
 class Container(Component):
     """
     Entity class holding state of any hierarchical sample container
+
+    Components under the container (recursively) are indexed by address and
+    by ID, and the sample lists are cached: the indexes are updated as
+    components are added, removed or change ID, the caches are dropped when
+    components are added or removed, or when their info changes.
     """
 
     def __init__(self, type, container, address, scannable):
         super(Container, self).__init__(container, address, scannable)
         self.type = type
         self.components = []
+        self._address_index = {}
+        self._id_index = {}
+        self._sample_list = None
+        self._present_samples = None
 
     #########################           PUBLIC           #########################
 
@@ -44,13 +61,15 @@ class Container(Component):
         Returns the list of all Sample objects under of this container (recursively)
         :rtype: list
         """
-        samples = []
-        for c in self.get_components():
-            if isinstance(c, Sample):
-                samples.append(c)
-            else:
-                samples.extend(c.get_sample_list())
-        return samples
+        if self._sample_list is None:
+            samples = []
+            for c in self.get_components():
+                if isinstance(c, Sample):
+                    samples.append(c)
+                else:
+                    samples.extend(c.get_sample_list())
+            self._sample_list = samples
+        return list(self._sample_list)
 
     def get_basket_list(self):
         basket_list = []
@@ -64,34 +83,25 @@ class Container(Component):
         Returns the list of all Sample objects under of this container (recursively) tagged as present
         :rtype: list
         """
-        ret = []
-        for sample in self.get_sample_list():
-            if sample.is_present():
-                ret.append(sample)
+        if self._present_samples is None:
+            self._present_samples = [
+                sample for sample in self.get_sample_list() if sample.is_present()
+            ]
+        return list(self._present_samples)
 
     def is_empty(self):
         """
         Returns true if there is no sample present sample under this container
         :rtype: bool
         """
-        for s in self.get_sample_list():
-            if s.is_present():
-                return False
-        return True
+        return not self.get_present_samples()
 
     def get_component_by_address(self, address):
         """
         Returns a component through its slot address or None if address is invalid
         :rtype: Component
         """
-        for c in self.get_components():
-            if c.get_address() == address:
-                return c
-            if isinstance(c, Container):
-                aux = c.get_component_by_address(address)
-                if aux is not None:
-                    return aux
-        return None
+        return self._address_index.get(address)
 
     def has_component_address(self, address):
         """
@@ -105,14 +115,9 @@ class Container(Component):
         Returns a component through its id or None if id is invalid
         :rtype: Component
         """
-        for c in self.get_components():
-            if c.get_id() == id:
-                return c
-            if isinstance(c, Container):
-                aux = c.get_component_by_id(id)
-                if aux is not None:
-                    return aux
-        return None
+        if id is None:
+            return None
+        return self._id_index.get(id)
 
     def has_component_id(self, id):
         """
@@ -142,17 +147,76 @@ class Container(Component):
 
     def _add_component(self, c):
         self.components.append(c)
+        added = list(_walk(c))
+        for container in self._indexing_containers():
+            container._index_components(added)
+        if c._is_dirty():
+            self._set_dirty()
 
     def _remove_component(self, c):
         self.components.remove(c)
+        removed = list(_walk(c))
+        for container in self._indexing_containers():
+            container._unindex_components(removed)
 
     def _clear_components(self):
+        removed = [r for c in self.components for r in _walk(c)]
+        for container in self._indexing_containers():
+            container._unindex_components(removed)
         self.components = []
 
+    def _indexing_containers(self):
+        """
+        Yields this container, and the containers above it, as long as each
+        one is a component of the next one
+        """
+        container = self
+        while container is not None:
+            yield container
+            parent = container.get_container()
+            if (
+                parent is None
+                or parent._address_index.get(container.get_address()) is not container
+            ):
+                return
+            container = parent
+
+    def _index_components(self, components):
+        for c in components:
+            self._address_index.setdefault(c.get_address(), c)
+            if c.get_id() is not None:
+                self._id_index.setdefault(c.get_id(), c)
+        self._sample_list = None
+        self._present_samples = None
+
+    def _unindex_components(self, components):
+        for c in components:
+            if self._address_index.get(c.get_address()) is c:
+                del self._address_index[c.get_address()]
+            if c.get_id() is not None and self._id_index.get(c.get_id()) is c:
+                del self._id_index[c.get_id()]
+        self._sample_list = None
+        self._present_samples = None
+
+    def _component_id_changed(self, c, former_id):
+        if self._address_index.get(c.get_address()) is not c:
+            return
+        for container in self._indexing_containers():
+            if former_id is not None and container._id_index.get(former_id) is c:
+                del container._id_index[former_id]
+            if c.get_id() is not None:
+                container._id_index.setdefault(c.get_id(), c)
+
+    def _set_dirty(self):
+        self._present_samples = None
+        Component._set_dirty(self)
+
     def _reset_dirty(self):
         Component._reset_dirty(self)
+        # a dirty component has dirty containers: clean ones are skipped
         for c in self.get_components():
-            c._reset_dirty()
+            if c._is_dirty():
+                c._reset_dirty()
 
     def _set_selected_sample(self, sample):
         for s in self.get_sample_list():
@@ -10,6 +10,7 @@ class SampleChangerMockup(AbstractSampleChanger.SampleChanger):
     __TYPE__ = "Mockup"
     NO_OF_BASKETS = 5
     NO_OF_SAMPLES_IN_BASKET = 10
+    LOAD_TIME = 2.0
 
     def __init__(self, *args, **kwargs):
         super(SampleChangerMockup, self).__init__(self.__TYPE__, False, *args, **kwargs)
@@ -18,6 +19,7 @@ class SampleChangerMockup(AbstractSampleChanger.SampleChanger):
         self._selected_sample = -1
         self._selected_basket = -1
         self._scIsCharging = None
+        self._prepared_sample = None
 
         self.no_of_baskets = self.get_property(
             "no_of_baskets", SampleChangerMockup.NO_OF_BASKETS
@@ -38,6 +40,8 @@ class SampleChangerMockup(AbstractSampleChanger.SampleChanger):
         AbstractSampleChanger.SampleChanger.init(self)
 
         self.log_filename = self.get_property("log_filename")
+        # the first half of a load is picking the sample, done by prepare_load
+        self.load_time = self.get_property("load_time", SampleChangerMockup.LOAD_TIME)
 
     def get_log_filename(self):
         return self.log_filename
@@ -64,10 +68,15 @@ class SampleChangerMockup(AbstractSampleChanger.SampleChanger):
             "Sample changer: %s. Please wait..." % msg
         )
 
+        first_step = 0
+        if self._prepared_sample == (basket, sample):
+            first_step = 100
+        self._prepared_sample = None
+
         self.emit("progressInit", (msg, 100))
-        for step in range(2 * 100):
+        for step in range(first_step, 2 * 100):
             self.emit("progressStep", int(step / 2.0))
-            time.sleep(0.01)
+            time.sleep(self.load_time / 200.0)
 
         mounted_sample = self.get_component_by_address(
             Container.Pin.get_sample_address(basket, sample)
@@ -85,6 +94,19 @@ class SampleChangerMockup(AbstractSampleChanger.SampleChanger):
 
         return self.get_loaded_sample()
 
+    def prepare_load(self, sample):
+        if isinstance(sample, tuple):
+            basket, sample = sample
+        else:
+            basket, sample = sample.split(":")
+        self._prepared_sample = None
+        time.sleep(self.load_time / 2.0)
+        self._prepared_sample = (int(basket), int(sample))
+        return True
+
+    def cancel_prepared_load(self):
+        self._prepared_sample = None
+
     def unload(self, sample_slot=None, wait=None):
         logging.getLogger("user_level_log").info("Unloading sample")
         sample = self.get_loaded_sample()
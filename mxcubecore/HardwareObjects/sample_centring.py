@@ -1,4 +1,3 @@
-from scipy import optimize
 import numpy
 import gevent.event
 import math
@@ -7,15 +6,25 @@ import logging
 import os
 import tempfile
 
-try:
-    import lucid3 as lucid
-except ImportError:
-    try:
-        import lucid
-    except ImportError:
-        logging.warning(
-            "Could not find autocentring library, automatic centring is disabled"
-        )
+_lucid = None
+
+
+def _get_lucid():
+    """Import the autocentring library on first use (it is slow to import)"""
+    global _lucid
+    if _lucid is None:
+        try:
+            import lucid3 as lucid
+        except ImportError:
+            try:
+                import lucid
+            except ImportError:
+                logging.warning(
+                    "Could not find autocentring library, automatic centring is disabled"
+                )
+                raise
+        _lucid = lucid
+    return _lucid
 
 
 def multiPointCentre(z, phis):
@@ -25,6 +34,8 @@ def multiPointCentre(z, phis):
     def errfunc(p, x, y):
         return fitfunc(p, x) - y
 
+    from scipy import optimize
+
     # The function call returns tuples of varying length
     result = optimize.leastsq(errfunc, [1.0, 0.0, 0.0], args=(phis, z))
     return result[0]
@@ -449,6 +460,46 @@ def center(
         READY_FOR_NEXT_POINT.set()
         raise RuntimeError("Exception while centring")
 
+    return centred_position(
+        phi,
+        phiy,
+        phiz,
+        sampx,
+        sampy,
+        pixelsPerMm_Hor,
+        pixelsPerMm_Ver,
+        beam_xc,
+        beam_yc,
+        chi_angle,
+        X,
+        Y,
+        phi_positions,
+    )
+
+
+def centred_position(
+    phi,
+    phiy,
+    phiz,
+    sampx,
+    sampy,
+    pixelsPerMm_Hor,
+    pixelsPerMm_Ver,
+    beam_xc,
+    beam_yc,
+    chi_angle,
+    X,
+    Y,
+    phi_positions,
+):
+    """Fit the centred position to the loop positions
+    Args:
+        X, Y (list): loop positions in the images (mm)
+        phi_positions (list): phi positions of the images (radians, with the
+                              phi direction applied)
+    Returns:
+        (dict): centred position {motor: value}
+    """
     # logging.info("X=%s,Y=%s", X, Y)
     chi_angle = math.radians(chi_angle)
     chiRotMatrix = numpy.matrix(
@@ -511,13 +562,31 @@ def start_auto(
     n_points=3,
     msg_cb=None,
     new_point_cb=None,
+    mode="sequential",
 ):
+    """Start the automatic centring
+    Args:
+        mode (str): "sequential": rotate, then find the loop, for each point;
+                    "pipelined": find the loop in an image while rotating to
+                    the next one;
+                    "continuous": find the loop in images taken during a
+                    single rotation, see auto_center_pipelined.
+    """
     global CURRENT_CENTRING
 
     phi, phiy, phiz, sampx, sampy = prepare(centring_motors_dict)
 
+    if mode == "sequential":
+        procedure = auto_center
+        kwargs = {}
+    elif mode in ("pipelined", "continuous"):
+        procedure = auto_center_pipelined
+        kwargs = {"continuous": mode == "continuous"}
+    else:
+        raise ValueError("Unknown automatic centring mode: %s" % mode)
+
     CURRENT_CENTRING = gevent.spawn(
-        auto_center,
+        procedure,
         sample_view,
         phi,
         phiy,
@@ -532,16 +601,68 @@ def start_auto(
         n_points,
         msg_cb,
         new_point_cb,
+        **kwargs,
     )
     return CURRENT_CENTRING
 
 
-def find_loop(sample_view, pixelsPerMm_Hor, chi_angle, msg_cb, new_point_cb):
-    snapshot_filename = os.path.join(
-        tempfile.gettempdir(), "mxcube_sample_snapshot.png"
-    )
-    sample_view.save_snapshot(snapshot_filename, overlay=False, bw=True)
+class LoopFinder:
+    """Loop finder interface, see set_loop_finder"""
+
+    # True if find_loop accepts an image array, otherwise it is given
+    # the name of a PNG snapshot file
+    accepts_arrays = True
+
+    def find_loop(self, image, rotation=None):
+        """Find the loop tip in an image
+        Args:
+            image (numpy.ndarray or str): Grayscale image, or image file name
+            rotation (float): Rotation (degrees) of the image, None for 0
+        Returns:
+            (tuple): (info, x, y), x and y being non numerical if no loop
+        """
+        raise NotImplementedError
+
+
+class LucidLoopFinder(LoopFinder):
+    """Loop finder using the lucid (lucid3) library"""
+
+    def find_loop(self, image, rotation=None):
+        return _get_lucid().find_loop(
+            image, rotation=rotation, debug=False, IterationClosing=6
+        )
+
+
+LOOP_FINDER = LucidLoopFinder()
 
+
+def set_loop_finder(loop_finder):
+    """Set the LoopFinder used by the automatic centring"""
+    global LOOP_FINDER
+    LOOP_FINDER = loop_finder
+
+
+def get_image(sample_view):
+    """Image for the loop search
+    Returns:
+        (numpy.ndarray or str): Grayscale frame of the sample view camera,
+                                or name of the snapshot file
+    """
+    image = None
+    if LOOP_FINDER.accepts_arrays and hasattr(sample_view, "get_frame"):
+        # straight from the camera, without encoding the image
+        image = sample_view.get_frame(bw=True)
+    if image is None:
+        image = os.path.join(tempfile.gettempdir(), "mxcube_sample_snapshot.png")
+        sample_view.save_snapshot(image, overlay=False, bw=True)
+    return image
+
+
+def search_loop(image, chi_angle):
+    """Find the loop in an image
+    Returns:
+        (tuple): (info, x, y), x and y being None if no loop is found
+    """
     # Lucid does not accept 0 degree rotation and
     # has a reference frame that is reversed to the one used
     # in MXCuBE
@@ -550,18 +671,32 @@ def find_loop(sample_view, pixelsPerMm_Hor, chi_angle, msg_cb, new_point_cb):
     else:
         chi_angle = -chi_angle
 
-    info, x, y = lucid.find_loop(
-        snapshot_filename, rotation=chi_angle, debug=False, IterationClosing=6
-    )
-
+    info, x, y = LOOP_FINDER.find_loop(image, rotation=chi_angle)
     try:
-        x = float(x)
-        y = float(y)
+        return info, float(x), float(y)
     except Exception:
+        return info, None, None
+
+
+def find_loop(sample_view, pixelsPerMm_Hor, chi_angle, msg_cb, new_point_cb):
+    time0 = time.perf_counter()
+    image = get_image(sample_view)
+    time1 = time.perf_counter()
+    info, x, y = search_loop(image, chi_angle)
+    time2 = time.perf_counter()
+
+    timing = "image %.0f ms (%s), loop search %.0f ms" % (
+        1000 * (time1 - time0),
+        "file" if isinstance(image, str) else "array",
+        1000 * (time2 - time1),
+    )
+    if x is None:
+        if callable(msg_cb):
+            msg_cb("No loop found: %s" % timing)
         return -1, -1
 
     if callable(msg_cb):
-        msg_cb("Loop found: %s (%d, %d)" % (info, x, y))
+        msg_cb("Loop found: %s (%d, %d), %s" % (info, x, y, timing))
     if callable(new_point_cb):
         new_point_cb((x, y))
 
@@ -660,3 +795,153 @@ def auto_center(
         end(centred_pos)
 
     return centred_pos
+
+
+def _step_images(sample_view, phi, n_points, phi_step, positions):
+    """Images taken at rest, the rotation to the next position starting
+    as soon as the image is taken
+
+    Yields:
+        (tuple): (image, time of the image)
+    """
+    for i in range(n_points):
+        phi.wait_ready(10)
+        image = get_image(sample_view)
+        image_time = time.monotonic()
+        positions.append((image_time, phi.get_value()))
+        if i != n_points - 1:
+            phi.set_value_relative(phi_step)
+        yield image, image_time
+    phi.wait_ready(10)
+
+
+def _rotation_images(sample_view, phi, n_points, phi_step, positions):
+    """Images taken during a single rotation, each time phi passes one of
+    the n_points positions
+
+    Yields:
+        (tuple): (image, time of the image)
+    """
+
+    def position_changed(value):
+        positions.append((time.monotonic(), value))
+
+    start_position = phi.get_value()
+    positions.append((time.monotonic(), start_position))
+    phi.motor.connect("valueChanged", position_changed)
+    try:
+        phi.set_value_relative(phi_step * (n_points - 1))
+        for i in range(n_points):
+            target = start_position + i * phi_step
+            with gevent.Timeout(10):
+                while (target - phi.get_value()) * phi_step > 0:
+                    gevent.sleep(0.005)
+            image = get_image(sample_view)
+            yield image, time.monotonic()
+        phi.wait_ready(10)
+    finally:
+        phi.motor.disconnect("valueChanged", position_changed)
+    positions.append((time.monotonic(), phi.get_value()))
+
+
+def auto_center_pipelined(
+    sample_view,
+    phi,
+    phiy,
+    phiz,
+    sampx,
+    sampy,
+    pixelsPerMm_Hor,
+    pixelsPerMm_Ver,
+    beam_xc,
+    beam_yc,
+    chi_angle,
+    n_points,
+    msg_cb,
+    new_point_cb,
+    continuous=False,
+    phi_range=180,
+):
+    """Automatic centring, the loop search overlapping with the rotation
+
+    The loop searches run in the gevent thread pool while phi rotates to the
+    next position. With continuous, phi rotates once over phi_range, and the
+    images are taken on the way; the phi position of an image is interpolated
+    at the image time from the phi positions received (valueChanged).
+    Images in which no loop is found are left out of the fit, which needs
+    at least three of them.
+    """
+    # check if loop is there at the beginning
+    i = 0
+    while -1 in find_loop(
+        sample_view, pixelsPerMm_Hor, chi_angle, msg_cb, new_point_cb
+    ):
+        phi.set_value_relative(90)
+        i += 1
+        if i > 4:
+            if callable(msg_cb):
+                msg_cb("No loop detected, aborting")
+            return
+
+    threadpool = gevent.get_hub().threadpool
+    phi_step = phi.direction * phi_range / float(n_points - 1)
+    images = _rotation_images if continuous else _step_images
+
+    for k in range(NUM_CENTRING_ROUNDS):
+        if callable(msg_cb):
+            msg_cb("Doing automatic centring")
+
+        time0 = time.perf_counter()
+        positions = []
+        searches = []
+        try:
+            for image, image_time in images(
+                sample_view, phi, n_points, phi_step, positions
+            ):
+                searches.append(
+                    (image_time, threadpool.spawn(search_loop, image, chi_angle))
+                )
+            times, values = zip(*sorted(positions))
+            X, Y, phi_positions = [], [], []
+            for image_time, search in searches:
+                info, x, y = search.get()
+                if x is None or x < 0 or y < 0:
+                    continue
+                if callable(new_point_cb):
+                    new_point_cb((x, y))
+                X.append(x / float(pixelsPerMm_Hor))
+                Y.append(y / float(pixelsPerMm_Ver))
+                phi_value = numpy.interp(image_time, times, values)
+                phi_positions.append(phi.direction * math.radians(phi_value))
+        except Exception:
+            logging.exception("Exception while centring")
+            move_motors(SAVED_INITIAL_POSITIONS)
+            raise RuntimeError("Exception while centring")
+
+        if callable(msg_cb):
+            msg_cb(
+                "Loop found in %d of %d images in %.0f ms"
+                % (len(X), n_points, 1000 * (time.perf_counter() - time0))
+            )
+        if len(X) < 3:
+            move_motors(SAVED_INITIAL_POSITIONS)
+            raise RuntimeError("Could not centre sample automatically.")
+
+        centred_pos = centred_position(
+            phi,
+            phiy,
+            phiz,
+            sampx,
+            sampy,
+            pixelsPerMm_Hor,
+            pixelsPerMm_Ver,
+            beam_xc,
+            beam_yc,
+            chi_angle,
+            X,
+            Y,
+            phi_positions,
+        )
+        end(centred_pos)
+
+    return centred_pos
@@ -32,14 +32,19 @@ import logging
 import weakref
 import sys
 import os
+import re
 import time
 import importlib
 import traceback
 from typing import Union, TYPE_CHECKING
 from datetime import datetime
 
+import gevent
+import gevent.event
+import gevent.lock
 from ruamel.yaml import YAML
 
+from mxcubecore.utils import config_cache
 from mxcubecore.utils.conversion import string_types, make_table
 from mxcubecore.dispatcher import dispatcher
 from mxcubecore import BaseHardwareObjects
@@ -63,6 +68,10 @@ __license__ = "LGPLv3+"
 _instance = None
 TIMERS = []
 
+# Maximum number of xml hardware objects loaded at the same time
+LOAD_CONCURRENCY = 1
+_load_semaphore = gevent.lock.BoundedSemaphore(LOAD_CONCURRENCY)
+
 beamline = None
 BEAMLINE_CONFIG_FILE = "beamline_config.yml"
 
@@ -87,6 +96,8 @@ def load_from_yaml(configuration_file, role, _container=None, _table=None):
         _table = []
 
     start_time = time.time()
+    # Sum of the load times of the contained objects
+    summed_time = 0
     msg0 = ""
     result = None
     class_name = "None"
@@ -100,8 +111,7 @@ def load_from_yaml(configuration_file, role, _container=None, _table=None):
 
     if not msg0:
         # Load the configuration file
-        with open(configuration_path, "r") as fp0:
-            configuration = yaml.load(fp0)
+        configuration = config_cache.load_yaml(configuration_path, yaml)
 
         # Get actual class
         initialise_class = configuration.pop("_initialise_class", None)
@@ -179,33 +189,24 @@ def load_from_yaml(configuration_file, role, _container=None, _table=None):
                 (role, class_name, configuration_file, "%.1d" % load_time, msg1)
             )
             msg0 = "Done loading contents"
-        for role1, config_file in _objects.items():
-            fname, fext = os.path.splitext(config_file)
-            if fext in (".yaml", ".yml"):
-                load_from_yaml(
-                    config_file, role=role1, _container=result, _table=_table
-                )
-            elif fext == ".xml":
-                msg1 = ""
-                time0 = time.time()
-                try:
-                    hwobj = _instance.get_hardware_object(fname)
-                    if hwobj is None:
-                        msg1 = "No object loaded"
-                        class_name1 = "None"
-                    else:
-                        class_name1 = hwobj.__class__.__name__
-                        if hasattr(result, role1):
-                            result.replace_object(role1, hwobj)
-                        else:
-                            msg1 = "No such role: %s.%s" % (class_name, role1)
-                except Exception as ex:
-                    msg1 = "Loading error (%s)" % str(ex)
-                    class_name = ""
-                load_time = 1000 * (time.time() - time0)
-                _table.append(
-                    (role1, class_name1, config_file, "%.1d" % load_time, msg1)
+        dependencies = configuration.pop("_dependencies", {})
+        deferred_roles = configuration.pop("_deferred_roles", ())
+        for role1 in deferred_roles:
+            config_file = _objects.pop(role1, None)
+            if config_file is None:
+                logging.getLogger("HWR").error(
+                    "Deferred role %s is not in '_objects'", role1
                 )
+            elif hasattr(result, "defer_object"):
+                result.defer_object(role1, _DeferredObject(role1, config_file, result))
+                _table.append((role1, "", config_file, "", "Deferred"))
+        if LOAD_CONCURRENCY > 1 and len(_objects) > 1:
+            summed_time = _load_objects_concurrently(
+                _objects, dependencies, result, _table
+            )
+        else:
+            for role1, config_file in _objects.items():
+                summed_time += _load_object(role1, config_file, result, _table)
 
         # Set simple, miscellaneous properties.
         # NB the attribute must have been initialied in the class __init__ first.
@@ -241,10 +242,169 @@ def load_from_yaml(configuration_file, role, _container=None, _table=None):
 
     if _container is None:
         print(make_table(column_names, _table))
+        print(
+            "Wall-clock time: %.1d ms, summed object load time: %.1d ms"
+            " (concurrency %d)" % (load_time, summed_time, LOAD_CONCURRENCY)
+        )
     #
     return result
 
 
+def _load_object(role, config_file, container, table):
+    """Load one of the contained objects of a yaml-configured object
+
+    Args:
+        role (str): Role name of the object in the container
+        config_file (str): Configuration file of the object
+        container (ConfiguredObject): Container object
+        table (List): Collecting summary output
+
+    Returns:
+        (float): Load time (ms)
+    """
+    fname, fext = os.path.splitext(config_file)
+    time0 = time.time()
+    if fext in (".yaml", ".yml"):
+        load_from_yaml(config_file, role=role, _container=container, _table=table)
+    elif fext == ".xml":
+        msg1 = ""
+        class_name = container.__class__.__name__
+        class_name1 = ""
+        try:
+            with _load_semaphore:
+                hwobj = _instance.get_hardware_object(fname)
+            if hwobj is None:
+                msg1 = "No object loaded"
+                class_name1 = "None"
+            else:
+                class_name1 = hwobj.__class__.__name__
+                if hasattr(container, role):
+                    container.replace_object(role, hwobj)
+                else:
+                    msg1 = "No such role: %s.%s" % (class_name, role)
+        except Exception as ex:
+            msg1 = "Loading error (%s)" % str(ex)
+        load_time = 1000 * (time.time() - time0)
+        table.append((role, class_name1, config_file, "%.1d" % load_time, msg1))
+    return 1000 * (time.time() - time0)
+
+
+class _DeferredObject:
+    """Loader of a contained object, called on first access to its role"""
+
+    def __init__(self, role, config_file, container):
+        self.role = role
+        self.config_file = config_file
+        self.container = container
+        self._greenlet = None
+        self._done = gevent.event.Event()
+
+    def __call__(self):
+        if self._done.is_set():
+            return
+        if self._greenlet is not None:
+            if self._greenlet is not gevent.getcurrent():
+                # loading in another greenlet
+                self._done.wait()
+            # else: the role is looked up while loading it
+            return
+
+        self._greenlet = gevent.getcurrent()
+        table = []
+        try:
+            load_time = _load_object(self.role, self.config_file, self.container, table)
+        finally:
+            self._done.set()
+        for role, class_name, config_file, _, comment in table:
+            logging.getLogger("HWR").info(
+                "Deferred load of %s (%s, %s) %s",
+                role,
+                class_name,
+                config_file,
+                comment,
+            )
+        logging.getLogger("HWR").info(
+            "Deferred load of %s done in %d ms", self.role, load_time
+        )
+
+
+def _xml_references(config_file):
+    """Names of the xml files referenced (href) in an xml configuration file"""
+    path = _instance.find_in_repository(config_file)
+    if path is None:
+        return set()
+    with open(path, "r") as fp0:
+        hrefs = re.findall(r"href\s*=\s*[\"']([^\"']+)[\"']", fp0.read())
+    return set(href.lstrip("/") for href in hrefs)
+
+
+def _load_objects_concurrently(objects, dependencies, container, table):
+    """Load the contained objects on greenlets, respecting the dependencies
+
+    The dependencies are the xml references between the contained objects,
+    and the ones declared in the '_dependencies' tag: {role: [role, ...]}.
+    At most LOAD_CONCURRENCY xml objects are loaded at the same time.
+
+    Args:
+        objects (dict): role: configuration file of the contained objects
+        dependencies (dict): role: list of roles it depends on
+        container (ConfiguredObject): Container object
+        table (List): Collecting summary output
+
+    Returns:
+        (float): Sum of the load times (ms)
+    """
+    roles_by_file = {
+        os.path.splitext(config_file)[0].lstrip("/"): role
+        for role, config_file in objects.items()
+    }
+    graph = {}
+    for role, config_file in objects.items():
+        depends_on = set(dependencies.get(role, ()))
+        if config_file.endswith(".xml"):
+            depends_on.update(
+                roles_by_file[name]
+                for name in _xml_references(config_file)
+                if name in roles_by_file
+            )
+        depends_on.discard(role)
+        graph[role] = depends_on & set(objects)
+
+    # Check that the graph has no cycle
+    resolved = set()
+    remaining = dict(graph)
+    while remaining:
+        ready = [role for role, deps in remaining.items() if deps <= resolved]
+        if not ready:
+            logging.getLogger("HWR").error(
+                "Cyclic dependencies between %s, loading them in order",
+                ", ".join(remaining),
+            )
+            return sum(
+                _load_object(role, config_file, container, table)
+                for role, config_file in objects.items()
+            )
+        resolved.update(ready)
+        for role in ready:
+            del remaining[role]
+
+    done = {role: gevent.event.Event() for role in objects}
+
+    def load(role, config_file):
+        try:
+            for dependency in graph[role]:
+                done[dependency].wait()
+            return _load_object(role, config_file, container, table)
+        finally:
+            done[role].set()
+
+    tasks = [
+        gevent.spawn(load, role, config_file) for role, config_file in objects.items()
+    ]
+    gevent.joinall(tasks)
+    return sum(task.value or 0 for task in tasks)
+
+
 def add_hardware_objects_dirs(ho_dirs):
     """Adds directories with xml/yaml config files
 
@@ -268,18 +428,26 @@ def set_user_file_directory(user_file_directory):
     BaseHardwareObjects.HardwareObjectNode.set_user_file_directory(user_file_directory)
 
 
-def init_hardware_repository(configuration_path):
+def init_hardware_repository(configuration_path, load_concurrency=None):
     """Initialise hardware repository - must be run at program start
 
     Args:
         configuration_path (str): PATHSEP-separated string of directories
         giving configuration file lookup path
+        load_concurrency (int): Maximum number of hardware objects loaded
+        at the same time. Default (LOAD_CONCURRENCY = 1) loads them in order
 
     Returns:
 
     """
     global _instance
     global beamline
+    global LOAD_CONCURRENCY
+    global _load_semaphore
+
+    if load_concurrency is not None:
+        LOAD_CONCURRENCY = max(int(load_concurrency), 1)
+        _load_semaphore = gevent.lock.BoundedSemaphore(LOAD_CONCURRENCY)
 
     if _instance is not None or beamline is not None:
         raise RuntimeError(
@@ -349,6 +517,8 @@ class __HardwareRepositoryClient:
         self.hwobj_info_list = []
         self.invalid_hardware_objects = None
         self.hardware_objects = None
+        # name: (greenlet, event) of the objects being loaded
+        self._loading = {}
 
     def connect(self):
         if self.__connected:
@@ -429,7 +599,7 @@ class __HardwareRepositoryClient:
 
         if xml_data:
             try:
-                hwobj_instance = self.parse_xml(xml_data, hwobj_name)
+                hwobj_instance = self.parse_xml(xml_data, hwobj_name, file_path)
                 if isinstance(hwobj_instance, string_types):
                     # We have redirection to another file
                     # Enter in dictionaries also under original names
@@ -531,18 +701,21 @@ class __HardwareRepositoryClient:
 
         dispatcher.send("hardwareObjectDiscarded", ho_name, self)
 
-    def parse_xml(self, xml_string, ho_name):
+    def parse_xml(self, xml_string, ho_name, file_path=None):
         """Load a Hardware Object from its XML string representation
 
         Parameters :
           xml_string -- the XML string
           ho_name -- the name of the Hardware Object to load (i.e. '/motors/m0')
+          file_path -- the file the XML string was read from, if any
 
         Return :
           the Hardware Object, or None if it fails
         """
         try:
-            hardware_obj = HardwareObjectFileParser.parse_string(xml_string, ho_name)
+            hardware_obj = HardwareObjectFileParser.parse_string(
+                xml_string, ho_name, file_path
+            )
         except Exception:
             logging.getLogger("HWR").exception(
                 "Cannot parse Hardware Repository file %s", ho_name
@@ -663,8 +836,22 @@ class __HardwareRepositoryClient:
 
                 if object_name in self.hardware_objects:
                     hardware_obj = self.hardware_objects[object_name]
+                elif object_name in self._loading:
+                    greenlet, loaded = self._loading[object_name]
+                    if greenlet is gevent.getcurrent():
+                        hardware_obj = self._load_hardware_object(object_name)
+                    else:
+                        # being loaded by another greenlet
+                        loaded.wait()
+                        hardware_obj = self.hardware_objects.get(object_name)
                 else:
-                    hardware_obj = self._load_hardware_object(object_name)
+                    loaded = gevent.event.Event()
+                    self._loading[object_name] = (gevent.getcurrent(), loaded)
+                    try:
+                        hardware_obj = self._load_hardware_object(object_name)
+                    finally:
+                        del self._loading[object_name]
+                        loaded.set()
                 return hardware_obj
         except TypeError as err:
             logging.getLogger("HWR").exception(
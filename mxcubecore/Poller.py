@@ -1,24 +1,32 @@
+"""Polling of hardware values
+
+All pollers share a single scheduler: a fixed-size pool of native worker
+threads pulls the next due poller from a heap ordered by deadline, runs the
+polled call and hands the results over to the gevent hub through a single
+async watcher.
+"""
+
+import collections
+import heapq
+import itertools
 import logging
+import time
 
 from dispatcher import saferef
 import gevent
 import gevent.monkey
 from gevent import _threading
 
-from gevent.event import Event
 import numpy
 
 
-try:
-    import Queue as queue
-except ImportError:
-    import queue
-
-
 log = logging.getLogger("HWR")
 
 POLLERS = {}
 
+# number of native threads used to run the polled calls
+MAX_WORKERS = 8
+
 gevent_version = list(map(int, gevent.__version__.split(".")))
 
 
@@ -39,6 +47,59 @@ def get_poller(poller_id):
     return POLLERS.get(poller_id)
 
 
+def get_statistics():
+    """Return the scheduler counters and the statistics of every poller
+
+    Returns:
+        (dict): "workers", "pollers", "polls", "missed_deadlines" and a
+                "per_poller" dict keyed on poller id.
+    """
+    per_poller = {
+        poller_id: poller.get_statistics() for poller_id, poller in POLLERS.items()
+    }
+    return {
+        "workers": _scheduler.worker_count(),
+        "pollers": len(POLLERS),
+        "polls": sum(stats["polls"] for stats in per_poller.values()),
+        "missed_deadlines": sum(
+            stats["missed_deadlines"] for stats in per_poller.values()
+        ),
+        "per_poller": per_poller,
+    }
+
+
+def is_equal(res, old_res):
+    """Compare a polled value with the previous one
+
+    Arrays are compared in one vectorized call; arrays of different shapes,
+    or an array and a non-array value, are never equal.
+    """
+    if isinstance(res, numpy.ndarray) or isinstance(old_res, numpy.ndarray):
+        if old_res is NotInitializedValue:
+            return False
+        try:
+            return numpy.array_equal(res, old_res)
+        except Exception:
+            return False
+    return res == old_res
+
+
+def _poll_key(polled_call, polled_call_args):
+    """Key used to find an existing poller for the same call and arguments"""
+    try:
+        call_key = (id(polled_call.__self__), id(polled_call.__func__))
+    except AttributeError:
+        call_key = id(polled_call)
+
+    try:
+        hash(polled_call_args)
+    except TypeError:
+        # e.g. a list of arguments
+        polled_call_args = repr(polled_call_args)
+
+    return call_key, polled_call_args
+
+
 def poll(
     polled_call,
     polled_call_args=(),
@@ -49,15 +110,16 @@ def poll(
     start_delay=0,
     start_value=NotInitializedValue,
 ):
-    # logging.info(">>>> %s", POLLERS)
-    for poller in POLLERS.values():
-        poller_polled_call = poller.polled_call_ref()
-        # logging.info(">>>>> poller.poll_cmd=%s, poll_cmd=%s, poller.args=%s, args=%s", poller_polled_call, polled_call, poller.args, polled_call_args)
-        if poller_polled_call == polled_call and poller.args == polled_call_args:
+    key = _poll_key(polled_call, polled_call_args)
+    poller = _scheduler.index.get(key)
+
+    if poller is not None:
+        if poller.polled_call_ref() == polled_call and poller.args == polled_call_args:
             poller.set_polling_period(min(polling_period, poller.get_polling_period()))
             return poller
+        # the id of a dead object has been reused
+        poller.stop()
 
-    # logging.info(">>>>> CREATING NEW POLLER for cmd %r, args=%s, polling time=%d", polled_call, polled_call_args, polling_period)
     poller = _Poller(
         polled_call,
         polled_call_args,
@@ -67,11 +129,110 @@ def poll(
         compare,
     )
     poller.old_res = start_value
+    poller.key = key
     POLLERS[poller.get_id()] = poller
+    _scheduler.index[key] = poller
     poller.start_delayed(start_delay)
     return poller
 
 
+class _PollScheduler:
+    """Run the pollers on a fixed-size pool of native threads
+
+    The pending pollers are kept in a heap of (deadline, sequence, poller).
+    Idle workers sleep on a native lock until the earliest deadline or until
+    they are woken up because the heap changed.
+    """
+
+    def __init__(self, max_workers=MAX_WORKERS):
+        self.max_workers = max_workers
+        self.index = {}
+        self._heap = []
+        self._sequence = itertools.count()
+        self._mutex = _threading.Lock()
+        self._wakeup = _threading.Lock()
+        self._wakeup.acquire()
+        self._workers = 0
+        self._results = collections.deque()
+        self._async_watcher = None
+
+    def worker_count(self):
+        return self._workers
+
+    def schedule(self, poller, deadline):
+        """Add a poller to the heap, to be run at deadline (monotonic time)"""
+        if self._async_watcher is None:
+            # has to be created in the thread running the gevent hub
+            self._async_watcher = gevent.get_hub().loop.async_()
+            self._async_watcher.start(self._dispatch_results)
+
+        with self._mutex:
+            heapq.heappush(self._heap, (deadline, next(self._sequence), poller))
+            if self._workers < min(self.max_workers, len(POLLERS)):
+                self._workers += 1
+                _threading.start_new_thread(self._run_worker, ())
+        self._wake_up()
+
+    def post(self, poller, result):
+        """Hand over a result (or a PollingException) to the gevent hub"""
+        self._results.append((poller, result))
+        self._async_watcher.send()
+
+    def _wake_up(self):
+        try:
+            self._wakeup.release()
+        except RuntimeError:
+            # a wake up is already pending
+            pass
+
+    def _dispatch_results(self):
+        while True:
+            try:
+                poller, result = self._results.popleft()
+            except IndexError:
+                break
+            poller.new_event(result)
+
+    def _next_due(self):
+        """Pop the next due poller, or return the time to wait for it"""
+        with self._mutex:
+            while self._heap:
+                deadline, _, poller = self._heap[0]
+                if poller.is_stopped():
+                    heapq.heappop(self._heap)
+                    continue
+                wait = deadline - time.monotonic()
+                if wait > 0:
+                    return None, deadline, wait
+                heapq.heappop(self._heap)
+                return poller, deadline, 0
+        return None, None, None
+
+    def _run_worker(self):
+        while True:
+            poller, deadline, wait = self._next_due()
+            if poller is None:
+                if wait is None:
+                    self._wakeup.acquire()
+                else:
+                    self._wakeup.acquire(True, wait)
+                continue
+
+            # let another worker take care of the next deadline
+            # while this one is busy with the polled call
+            self._wake_up()
+
+            next_deadline = poller.run_once(deadline)
+            if next_deadline is not None:
+                with self._mutex:
+                    heapq.heappush(
+                        self._heap, (next_deadline, next(self._sequence), poller)
+                    )
+
+
+_scheduler = _PollScheduler()
+
+
 class _Poller:
     def __init__(
         self,
@@ -90,25 +251,28 @@ class _Poller:
         self.error_callback_ref = saferef.safe_ref(error_callback)
         self.compare = compare
         self.old_res = NotInitializedValue
-        self.queue = queue.Queue()
+        self.key = None
         self.delay = 0
-        self.stop_event = Event()
+        self._stopped = False
 
-        #if gevent_version < [1,3,0]:
-            #self.async_watcher = gevent.get_hub().loop.async()
-        #else:
-        self.async_watcher = gevent.get_hub().loop.async_()
+        self.polls = 0
+        self.missed_deadlines = 0
+        self.last_latency = 0
+        self.max_latency = 0
+        self.total_latency = 0
 
     def start_delayed(self, delay):
         self.delay = delay
-        _threading.start_new_thread(self.run, ())
+        _scheduler.schedule(self, time.monotonic() + delay / 1000.0)
 
     def stop(self):
-        self.stop_event.set()
-        del POLLERS[self.get_id()]
+        self._stopped = True
+        POLLERS.pop(self.get_id(), None)
+        if _scheduler.index.get(self.key) is self:
+            del _scheduler.index[self.key]
 
     def is_stopped(self):
-        return self.stop_event.is_set()
+        return self._stopped
 
     def get_id(self):
         return id(self)
@@ -119,6 +283,22 @@ class _Poller:
     def set_polling_period(self, polling_period):
         self.polling_period = polling_period
 
+    def get_statistics(self):
+        """Return the poller counters
+
+        Returns:
+            (dict): number of polls, number of missed deadlines and the last,
+                    mean and max latency (duration of the polled call) in s.
+        """
+        return {
+            "polling_period": self.polling_period,
+            "polls": self.polls,
+            "missed_deadlines": self.missed_deadlines,
+            "last_latency": self.last_latency,
+            "mean_latency": self.total_latency / self.polls if self.polls else 0,
+            "max_latency": self.max_latency,
+        }
+
     def restart(self, delay=0):
         self.stop()
 
@@ -137,81 +317,56 @@ class _Poller:
                 start_value=self.old_res,
             )
 
-    def new_event(self):
-        while True:
-            try:
-                res = self.queue.get_nowait()
-            except queue.Empty:
-                break
-
-            if isinstance(res, PollingException):
-                cb = self.error_callback_ref()
-                if cb is not None:
-                    gevent.spawn(cb, res.original_exception, res.poller_id)
-            else:
-                cb = self.value_changed_callback_ref()
-                if cb is not None:
-                    gevent.spawn(cb, res)
-
-    def run(self):
-        sleep = gevent.monkey._get_original("time", ["sleep"])[0]
-
-        self.async_watcher.start(self.new_event)
-
-        err_callback_args = None
-        error_cb = None
-        first_run = True
-
-        while not self.stop_event.is_set():
-            if first_run and self.delay:
-                sleep(self.delay / 1000.0)
-            first_run = False
-
-            if self.stop_event.is_set():
-                break
-
-            polled_call = self.polled_call_ref()
-            if polled_call is None:
-                break
-
-            try:
-                res = polled_call(*self.args)
-            except Exception as e:
-                if self.stop_event.is_set():
-                    break
-                error_cb = self.error_callback_ref()
-                if error_cb is not None:
-                    self.queue.put(PollingException(e, self.get_id()))
-                break
+    def new_event(self, res):
+        if isinstance(res, PollingException):
+            cb = self.error_callback_ref()
+            if cb is not None:
+                gevent.spawn(cb, res.original_exception, res.poller_id)
+        else:
+            cb = self.value_changed_callback_ref()
+            if cb is not None:
+                gevent.spawn(cb, res)
+
+    def run_once(self, deadline):
+        """Execute the polled call once, in a worker thread
+
+        Args:
+            deadline (float): monotonic time the call was scheduled for
+        Returns:
+            (float): next deadline, or None if the poller has to stop
+        """
+        if self.is_stopped():
+            return None
+
+        start = time.monotonic()
+        if start - deadline > self.polling_period / 1000.0:
+            self.missed_deadlines += 1
 
+        polled_call = self.polled_call_ref()
+        if polled_call is None:
+            self.stop()
+            return None
+
+        try:
+            res = polled_call(*self.args)
+        except Exception as e:
+            if not self.is_stopped() and self.error_callback_ref() is not None:
+                _scheduler.post(self, PollingException(e, self.get_id()))
+            return None
+        finally:
             del polled_call
+            end = time.monotonic()
+            self.polls += 1
+            self.last_latency = end - start
+            self.total_latency += self.last_latency
+            self.max_latency = max(self.max_latency, self.last_latency)
 
-            if self.stop_event.is_set():
-                break
+        if self.is_stopped():
+            return None
 
-            if isinstance(res, numpy.ndarray):  # for arrays
-                comparison = res == self.old_res
-                if isinstance(comparison, bool):
-                    is_equal = comparison
-                else:
-                    is_equal = all(comparison)
-            else:
-                is_equal = res == self.old_res
-
-            if self.compare and is_equal:
-                # do nothing: previous value is the same as "new" value
-                pass
-            else:
-                new_value = True
-                if self.compare:
-                    new_value = not is_equal
-
-                if new_value:
-                    self.old_res = res
-                    self.queue.put(res)
-                    self.async_watcher.send()
-
-            sleep(self.polling_period / 1000.0)
-
-        if error_cb is not None:
-            self.async_watcher.send()
+        if not (self.compare and is_equal(res, self.old_res)):
+            self.old_res = res
+            _scheduler.post(self, res)
+
+        # keep a fixed rate, but do not try to catch up on missed periods
+        return max(deadline + self.polling_period / 1000.0, end)
@@ -1,11 +1,32 @@
+"""Signal dispatch between hardware objects
+
+'dispatcher' keeps the connect / disconnect / send interface of pydispatch,
+with the following differences in the implementation:
+
+    - receivers are indexed per (sender, signal) pair, so that sending a signal
+      only looks up the four receiver lists that can match it;
+    - the receiver lists are immutable tuples, replaced on connect and
+      disconnect, so that sending needs neither a lock nor a copy;
+    - the arguments a receiver accepts are inspected once, on the first call,
+      instead of on every call;
+    - receivers and senders are weakly referenced, and their connections are
+      removed when they are deleted.
+
+As before, an exception raised by a receiver is displayed, but does not stop
+the other receivers from being called.
+"""
+
+import inspect
+import sys
+import types
+import weakref
+
 try:
-    from louie import dispatcher  # pyright: ignore[reportMissingImports]
     from louie import robustapply  # pyright: ignore[reportMissingImports]
     from louie import saferef  # pyright: ignore[reportMissingImports]
 
     louie = 1
 except ImportError:
-    from pydispatch import dispatcher  # pyright: ignore[reportMissingImports]
     from pydispatch import robustapply  # pyright: ignore[reportMissingImports]
     from pydispatch import saferef  # pyright: ignore[reportMissingImports]
 
@@ -13,13 +34,9 @@ except ImportError:
     robustapply.robust_apply = robustapply.robustApply
     louie = 0
 
-import sys
-
 if not hasattr(robustapply, "_robust_apply"):
-    # patch robustapply.robust_apply to display exceptions, but to ignore them
-    # this makes 'dispatcher.send' to continue on exceptions, which is
-    # the behaviour we want ; it's not because a receiver doesn't handle a
-    # signal properly that the whole chain should stop
+    # patch robustapply.robust_apply to display exceptions, but to ignore them,
+    # for code still using the pydispatch dispatcher directly
     robustapply._robust_apply = robustapply.robust_apply
 
     def __my_robust_apply(*args, **kwargs):
@@ -32,5 +49,258 @@ if not hasattr(robustapply, "_robust_apply"):
         robustapply.robust_apply = __my_robust_apply
     else:
         robustapply.robustApply = __my_robust_apply
-    del louie
     del __my_robust_apply
+del louie
+
+
+class DispatcherKeyError(KeyError):
+    """Disconnection of a receiver that is not connected"""
+
+
+class _Parameter:
+    def __repr__(self):
+        return self.__class__.__name__
+
+
+class _Any(_Parameter):
+    """Any sender, or any signal"""
+
+
+class _Anonymous(_Parameter):
+    """Sender of signals sent without sender"""
+
+
+Any = _Any()
+Anonymous = _Anonymous()
+
+
+def _arguments(receiver):
+    """Arguments accepted by receiver, as seen by pydispatch robustapply
+
+    Returns:
+        (tuple): names of the positional arguments, and whether the receiver
+                 accepts any keyword argument
+    """
+    call = getattr(receiver, "__call__", None)
+    if hasattr(call, "__func__") or hasattr(call, "__code__"):
+        receiver = call
+    if hasattr(receiver, "__func__"):
+        code = receiver.__func__.__code__
+        start = 1
+    elif hasattr(receiver, "__code__"):
+        code = receiver.__code__
+        start = 0
+    else:
+        raise ValueError("unknown receiver type %s %s" % (receiver, type(receiver)))
+    return (
+        code.co_varnames[start : code.co_argcount],
+        bool(code.co_flags & inspect.CO_VARKEYWORDS),
+    )
+
+
+class _Receiver:
+    """A connected receiver, with its arguments once known"""
+
+    __slots__ = ("key", "ref", "names", "var_keywords", "accepted", "__weakref__")
+
+    def __init__(self, receiver, weak, on_delete):
+        if isinstance(receiver, types.MethodType):
+            self.key = (id(receiver.__self__), id(receiver.__func__))
+            ref = weakref.WeakMethod
+        else:
+            self.key = id(receiver)
+            ref = weakref.ref
+        if weak:
+            self.ref = ref(receiver, on_delete)
+        else:
+            self.ref = lambda: receiver
+        self.names = None
+        self.var_keywords = False
+        # (number of arguments, keyword names): keyword names passed on
+        self.accepted = {}
+
+    def __call__(self, receiver, arguments, named):
+        call_key = (len(arguments), tuple(named))
+        accepted = self.accepted.get(call_key)
+        if accepted is None:
+            if self.names is None:
+                self.names, self.var_keywords = _arguments(receiver)
+            names = self.names
+
+            for name in names[: len(arguments)]:
+                if name in named:
+                    raise TypeError(
+                        "Argument %r specified both positionally and as a keyword"
+                        " for calling %r" % (name, receiver)
+                    )
+            if self.var_keywords:
+                accepted = tuple(named)
+            else:
+                accepted = tuple(key for key in named if key in names[len(arguments) :])
+            self.accepted[call_key] = accepted
+
+        if not accepted:
+            return receiver(*arguments)
+        return receiver(*arguments, **{key: named[key] for key in accepted})
+
+
+class SignalDispatcher:
+    """Receivers of the signals, indexed per (sender, signal)"""
+
+    Any = Any
+    Anonymous = Anonymous
+
+    def __init__(self):
+        # (id(sender), signal): tuple of _Receiver
+        self._connections = {}
+        # id(sender): signals with connections
+        self._signals = {}
+        # id(sender): weak reference to sender, to clean up on deletion
+        self._senders = {}
+
+    def connect(self, receiver, signal=Any, sender=Any, weak=True):
+        """Connect receiver to signal from sender
+
+        Args:
+            receiver (callable): called with the signal arguments, plus the
+                signal and sender keyword arguments if it accepts them.
+            signal (hashable): signal, or Any for all signals from sender.
+            sender (object): sender, or Any for signal from all senders.
+            weak (bool): keep a weak reference to receiver.
+        """
+        if signal is None:
+            raise TypeError(
+                "Signal cannot be None (receiver=%r sender=%r)" % (receiver, sender)
+            )
+        sender_key = id(sender)
+        key = (sender_key, signal)
+        entry = _Receiver(receiver, weak, lambda ref: self._remove_receiver(key, ref))
+
+        if sender_key not in self._senders and sender not in (None, Any, Anonymous):
+            try:
+                self._senders[sender_key] = weakref.ref(
+                    sender, lambda ref: self._remove_sender(sender_key)
+                )
+            except TypeError:
+                pass
+
+        receivers = self._connections.get(key, ())
+        self._connections[key] = tuple(
+            other for other in receivers if other.key != entry.key
+        ) + (entry,)
+        self._signals.setdefault(sender_key, set()).add(signal)
+
+    def disconnect(self, receiver, signal=Any, sender=Any, weak=True):
+        """Disconnect receiver from signal from sender
+
+        Raises:
+            DispatcherKeyError: if receiver is not connected.
+        """
+        if signal is None:
+            raise TypeError(
+                "Signal cannot be None (receiver=%r sender=%r)" % (receiver, sender)
+            )
+        if isinstance(receiver, types.MethodType):
+            receiver_key = (id(receiver.__self__), id(receiver.__func__))
+        else:
+            receiver_key = id(receiver)
+
+        key = (id(sender), signal)
+        receivers = self._connections.get(key, ())
+        remaining = tuple(entry for entry in receivers if entry.key != receiver_key)
+        if len(remaining) == len(receivers):
+            raise DispatcherKeyError(
+                "No connection to receiver %s for signal %s from sender %s"
+                % (receiver, signal, sender)
+            )
+        self._set_receivers(key, remaining)
+
+    def send(self, signal=Any, sender=Anonymous, *arguments, **named):
+        """Send signal from sender to the connected receivers
+
+        The receivers connected to signal or to Any signal, from sender or from
+        Any sender, are each called once. An exception raised by a receiver is
+        displayed and the other receivers are still called.
+
+        Returns:
+            (list): (receiver, response) for each receiver called.
+        """
+        connections = self._connections
+        sender_key = id(sender)
+        any_key = id(Any)
+        found = [
+            receivers
+            for receivers in (
+                connections.get((sender_key, signal)),
+                connections.get((sender_key, Any)),
+                connections.get((any_key, signal)),
+                connections.get((any_key, Any)),
+            )
+            if receivers
+        ]
+        if not found:
+            return []
+
+        if len(found) == 1:
+            entries = found[0]
+        else:
+            # a receiver connected several times is called once
+            entries = []
+            seen = set()
+            for receivers in found:
+                for entry in receivers:
+                    if entry.key not in seen:
+                        seen.add(entry.key)
+                        entries.append(entry)
+
+        named["signal"] = signal
+        named["sender"] = sender
+        responses = []
+        for entry in entries:
+            receiver = entry.ref()
+            if receiver is None:
+                continue
+            try:
+                response = entry(receiver, arguments, named)
+            except Exception:
+                sys.excepthook(*sys.exc_info())
+                response = None
+            responses.append((receiver, response))
+        return responses
+
+    def get_receivers(self, sender=Any, signal=Any):
+        """Live receivers connected exactly to signal from sender"""
+        receivers = (
+            entry.ref() for entry in self._connections.get((id(sender), signal), ())
+        )
+        return [receiver for receiver in receivers if receiver is not None]
+
+    def _set_receivers(self, key, receivers):
+        if receivers:
+            self._connections[key] = receivers
+            return
+        self._connections.pop(key, None)
+        sender_key, signal = key
+        signals = self._signals.get(sender_key)
+        if signals is not None:
+            signals.discard(signal)
+            if not signals:
+                del self._signals[sender_key]
+                self._senders.pop(sender_key, None)
+
+    def _remove_receiver(self, key, ref):
+        """Weak reference callback of a deleted receiver"""
+        receivers = self._connections.get(key)
+        if receivers:
+            self._set_receivers(
+                key, tuple(entry for entry in receivers if entry.ref is not ref)
+            )
+
+    def _remove_sender(self, sender_key):
+        """Weak reference callback of a deleted sender"""
+        self._senders.pop(sender_key, None)
+        for signal in self._signals.pop(sender_key, ()):
+            self._connections.pop((sender_key, signal), None)
+
+
+dispatcher = SignalDispatcher()
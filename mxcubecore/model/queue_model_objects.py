@@ -26,6 +26,7 @@ the QueueModel.
 import copy
 import os
 import logging
+import weakref
 
 from mxcubecore.model import queue_model_enumerables
 
@@ -63,6 +64,22 @@ class TaskNode(object):
     the QueueModel object.
     """
 
+    # Observers (see add_observer), told when a node is enabled, disabled
+    # or executed
+    _observers = weakref.WeakSet()
+
+    @staticmethod
+    def add_observer(observer):
+        """
+        Tells observer.node_changed(node) when the state of a node changes
+        (set_enabled, set_executed). The observer is referenced weakly.
+        """
+        TaskNode._observers.add(observer)
+
+    def _state_changed(self):
+        for observer in list(TaskNode._observers):
+            observer.node_changed(self)
+
     def __init__(self, task_data=None):
         self._children = []
         self._name = str()
@@ -96,6 +113,7 @@ class TaskNode(object):
         :type state: bool
         """
         self._enabled = state
+        self._state_changed()
 
     def get_children(self):
         """
@@ -217,6 +235,7 @@ class TaskNode(object):
 
     def set_executed(self, executed):
         self._executed = executed
+        self._state_changed()
 
     def is_running(self):
         # IK maybe replace is_executed and is_running with state?
@@ -1465,6 +1484,30 @@ class Acquisition(object):
 
 
 class PathTemplate(object):
+    # Attributes defining the files written. Observers (see add_observer) are
+    # told when one of them changes
+    FILE_ATTRIBUTES = frozenset(
+        (
+            "directory",
+            "base_prefix",
+            "mad_prefix",
+            "reference_image_prefix",
+            "wedge_prefix",
+            "run_number",
+            "start_num",
+            "num_files",
+        )
+    )
+    _observers = weakref.WeakSet()
+
+    @staticmethod
+    def add_observer(observer):
+        """
+        Tells observer.path_template_changed(path_template) when the files
+        of a path template change. The observer is referenced weakly.
+        """
+        PathTemplate._observers.add(observer)
+
     @staticmethod
     def set_data_base_path(base_directory):
         # os.path.abspath returns path without trailing slash, if any
@@ -1522,6 +1565,12 @@ class PathTemplate(object):
         if not hasattr(self, "precision"):
             self.precision = str()
 
+    def __setattr__(self, name, value):
+        object.__setattr__(self, name, value)
+        if name in PathTemplate.FILE_ATTRIBUTES:
+            for observer in list(PathTemplate._observers):
+                observer.path_template_changed(self)
+
     def as_dict(self):
         return {
             "directory": self.directory,
@@ -677,6 +677,7 @@ class SampleQueueEntry(BaseQueueEntry):
                             self._data_model,
                             self.centring_done,
                             self.sample_centring_result,
+                            self.get_queue_controller(),
                         )
                     except Exception as e:
                         self._view.setText(1, "Error loading")
@@ -764,7 +765,9 @@ class BasketQueueEntry(BaseQueueEntry):
         BaseQueueEntry.__init__(self, view, data_model)
 
 
-def mount_sample(view, data_model, centring_done_cb, async_result):
+def mount_sample(
+    view, data_model, centring_done_cb, async_result, queue_controller=None
+):
     view.setText(1, "Loading sample")
     HWR.beamline.sample_view.clear_all()
     log = logging.getLogger("queue_exec")
@@ -817,7 +820,13 @@ def mount_sample(view, data_model, centring_done_cb, async_result):
         robot_action_dict["message"] = "Sample was not loaded"
         robot_action_dict["status"] = "ERROR"
 
-    HWR.beamline.lims.store_robot_action(robot_action_dict)
+    if queue_controller is not None:
+        # in the background if the queue execution is pipelined
+        queue_controller.run_deferred(
+            HWR.beamline.lims.store_robot_action, robot_action_dict
+        )
+    else:
+        HWR.beamline.lims.store_robot_action(robot_action_dict)
 
     if not sample_mount_device.has_loaded_sample():
         # Disables all related collections
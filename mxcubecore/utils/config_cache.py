@@ -0,0 +1,301 @@
+"""
+On-disk cache of parsed configuration files.
+
+XML files are cached as the list of SAX events (start element, characters,
+end element) they produce, which is replayed into the HardwareObjectHandler.
+YAML files are cached as the loaded data.
+Each entry is stored in its own pickle file, named after the configuration
+file path, together with the file mtime, size and content hash.
+An entry is used if the file mtime and size are unchanged, or if its content
+hash is unchanged; it is parsed again and replaced otherwise.
+
+The cache is enabled by setting the MXCUBECORE_CONFIG_CACHE environment
+variable to the cache directory, or by calling set_cache_directory().
+
+Command line usage:
+    python -m mxcubecore.utils.config_cache {warm,inspect,clear} [directory ...]
+"""
+
+import argparse
+import hashlib
+import logging
+import os
+import pickle
+import sys
+import xml.sax
+from xml.sax.handler import ContentHandler
+
+CACHE_FORMAT_VERSION = 1
+
+_cache_directory = os.environ.get("MXCUBECORE_CONFIG_CACHE") or None
+
+_statistics = {"hits": 0, "misses": 0}
+
+
+def set_cache_directory(directory):
+    """
+    set the cache directory, None disables the cache
+    """
+    global _cache_directory
+    _cache_directory = directory
+
+
+def get_cache_directory():
+    return _cache_directory
+
+
+def get_statistics():
+    """
+    number of cache hits and misses since start
+    """
+    return dict(_statistics)
+
+
+def _entry_path(file_path):
+    key = hashlib.sha1(os.path.abspath(file_path).encode()).hexdigest()
+    return os.path.join(_cache_directory, key + ".pickle")
+
+
+def _content_hash(content):
+    if isinstance(content, str):
+        content = content.encode()
+    return hashlib.sha1(content).hexdigest()
+
+
+def _read_entry(file_path):
+    try:
+        with open(_entry_path(file_path), "rb") as entry_file:
+            entry = pickle.load(entry_file)
+    except Exception:
+        return None
+    if entry.get("version") != CACHE_FORMAT_VERSION:
+        return None
+    return entry
+
+
+def _write_entry(file_path, kind, stat, content_hash, data):
+    entry = {
+        "version": CACHE_FORMAT_VERSION,
+        "path": os.path.abspath(file_path),
+        "kind": kind,
+        "mtime_ns": stat.st_mtime_ns,
+        "size": stat.st_size,
+        "hash": content_hash,
+        "data": data,
+    }
+    entry_path = _entry_path(file_path)
+    tmp_path = "%s.%d.tmp" % (entry_path, os.getpid())
+    try:
+        os.makedirs(_cache_directory, exist_ok=True)
+        with open(tmp_path, "wb") as entry_file:
+            pickle.dump(entry, entry_file, protocol=pickle.HIGHEST_PROTOCOL)
+        # atomic, concurrent readers never see a partial entry
+        os.replace(tmp_path, entry_path)
+    except OSError:
+        logging.getLogger("HWR").warning(
+            "Cannot write configuration cache entry for %s", file_path
+        )
+
+
+def _cached(file_path, kind, parse, content=None):
+    """
+    return the cached data for file_path, or the result of parse(content)
+    """
+    if _cache_directory is None:
+        if content is None:
+            with open(file_path, "rb") as config_file:
+                content = config_file.read()
+        return parse(content)
+
+    stat = os.stat(file_path)
+    entry = _read_entry(file_path)
+    if entry is not None and entry["kind"] == kind:
+        if entry["mtime_ns"] == stat.st_mtime_ns and entry["size"] == stat.st_size:
+            _statistics["hits"] += 1
+            return entry["data"]
+
+    if content is None:
+        with open(file_path, "rb") as config_file:
+            content = config_file.read()
+    content_hash = _content_hash(content)
+
+    if entry is not None and entry["kind"] == kind and entry["hash"] == content_hash:
+        # file touched but not modified
+        _statistics["hits"] += 1
+        _write_entry(file_path, kind, stat, content_hash, entry["data"])
+        return entry["data"]
+
+    _statistics["misses"] += 1
+    data = parse(content)
+    _write_entry(file_path, kind, stat, content_hash, data)
+    return data
+
+
+class SaxEventRecorder(ContentHandler):
+    """
+    record the SAX events of a document, to be replayed later
+    """
+
+    def __init__(self):
+        ContentHandler.__init__(self)
+        self.events = []
+
+    def startElement(self, name, attrs):
+        self.events.append(("s", str(name), {str(k): attrs[k] for k in attrs.keys()}))
+
+    def characters(self, content):
+        if self.events and self.events[-1][0] == "c":
+            self.events[-1] = ("c", self.events[-1][1] + content)
+        else:
+            self.events.append(("c", content))
+
+    def endElement(self, name):
+        self.events.append(("e", str(name)))
+
+
+def parse_xml_events(xml_string):
+    """
+    parse an XML string into a list of SAX events
+    """
+    if isinstance(xml_string, str):
+        xml_string = xml_string.encode()
+    recorder = SaxEventRecorder()
+    xml.sax.parseString(xml_string, recorder)
+    return recorder.events
+
+
+def replay_xml_events(events, handler):
+    """
+    feed recorded SAX events to a ContentHandler
+    """
+    for event in events:
+        if event[0] == "s":
+            handler.startElement(event[1], event[2])
+        elif event[0] == "c":
+            handler.characters(event[1])
+        else:
+            handler.endElement(event[1])
+
+
+def load_xml_events(file_path, xml_string=None):
+    """
+    return the SAX events of an XML file, from the cache if up to date
+    """
+    return _cached(file_path, "xml", parse_xml_events, xml_string)
+
+
+def load_yaml(file_path, yaml):
+    """
+    return the content of a YAML file, from the cache if up to date
+
+    yaml is the ruamel YAML instance used to load the file on a cache miss
+    """
+    return _cached(file_path, "yaml", yaml.load)
+
+
+def _config_files(directories):
+    for directory in directories:
+        for root, _, file_names in os.walk(directory):
+            for file_name in sorted(file_names):
+                if file_name.endswith((".xml", ".yml", ".yaml")):
+                    yield os.path.join(root, file_name)
+
+
+def warm(directories):
+    """
+    parse all configuration files in directories into the cache
+
+    returns the number of files cached
+    """
+    from mxcubecore.HardwareRepository import yaml
+
+    count = 0
+    for file_path in _config_files(directories):
+        try:
+            if file_path.endswith(".xml"):
+                load_xml_events(file_path)
+            else:
+                load_yaml(file_path, yaml)
+        except Exception as ex:
+            print("%s: not cached (%s)" % (file_path, ex))
+        else:
+            count += 1
+    return count
+
+
+def inspect():
+    """
+    return the list of cache entries, as (path, kind, size in cache, state)
+    """
+    result = []
+    if _cache_directory is None or not os.path.isdir(_cache_directory):
+        return result
+    for entry_name in sorted(os.listdir(_cache_directory)):
+        if not entry_name.endswith(".pickle"):
+            continue
+        entry_path = os.path.join(_cache_directory, entry_name)
+        try:
+            with open(entry_path, "rb") as entry_file:
+                entry = pickle.load(entry_file)
+        except Exception:
+            result.append((entry_path, "?", os.path.getsize(entry_path), "corrupt"))
+            continue
+        path = entry["path"]
+        try:
+            stat = os.stat(path)
+        except OSError:
+            state = "missing"
+        else:
+            if entry["mtime_ns"] == stat.st_mtime_ns and entry["size"] == stat.st_size:
+                state = "valid"
+            else:
+                with open(path, "rb") as config_file:
+                    same = _content_hash(config_file.read()) == entry["hash"]
+                state = "valid (touched)" if same else "stale"
+        result.append((path, entry["kind"], os.path.getsize(entry_path), state))
+    return result
+
+
+def clear():
+    """
+    remove all cache entries
+    """
+    if _cache_directory is None or not os.path.isdir(_cache_directory):
+        return
+    for entry_name in os.listdir(_cache_directory):
+        if entry_name.endswith(".pickle"):
+            os.remove(os.path.join(_cache_directory, entry_name))
+
+
+def main(argv=None):
+    opt_parser = argparse.ArgumentParser(
+        description="Warm, inspect or clear the mxcubecore configuration cache"
+    )
+    opt_parser.add_argument("command", choices=("warm", "inspect", "clear"))
+    opt_parser.add_argument(
+        "directories", nargs="*", help="configuration directories to warm"
+    )
+    opt_parser.add_argument(
+        "--cache-dir",
+        default=_cache_directory,
+        help="cache directory (default: $MXCUBECORE_CONFIG_CACHE)",
+    )
+    args = opt_parser.parse_args(argv)
+
+    if not args.cache_dir:
+        opt_parser.error("no cache directory given")
+    set_cache_directory(args.cache_dir)
+
+    if args.command == "warm":
+        count = warm(args.directories)
+        print("%d files cached in %s" % (count, args.cache_dir))
+    elif args.command == "inspect":
+        for path, kind, size, state in inspect():
+            print("%-6s %-16s %8d  %s" % (kind, state, size, path))
+    else:
+        clear()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -25,8 +25,6 @@ from __future__ import print_function, unicode_literals
 
 import re
 
-from scipy.constants import h, c, e
-
 __date__ = "19/06/17"
 __credits__ = ["MXCuBE collaboration"]
 
@@ -43,6 +41,13 @@ except Exception:
     text_type = str
     binary_type = bytes
 
+# Exact values of the 2019 SI definitions (the same as scipy.constants),
+# so that scipy is not imported just for these.
+# Planck constant (J s), speed of light (m/s) and elementary charge (C)
+h = 6.62607015e-34
+c = 299792458.0
+e = 1.602176634e-19
+
 # Conversion from kEv to A, wavelength = HC_OVER_E/energy
 HC_OVER_E = h * c / e * 10e6
 
@@ -153,7 +158,7 @@ def make_table(column_names, rows):
     lines.append(ruler)
 
     for row in rows:
-        lines.append("| %s" % row_format.format(*str(row)))
+        lines.append("| %s" % row_format.format(*(str(item) for item in row)))
     lines.append(ruler)
     #
     return "\n".join(lines)
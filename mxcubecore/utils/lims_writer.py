@@ -0,0 +1,414 @@
+"""
+Write-behind queue of LIMS records.
+
+LIMS writes (store_data_collection, update_data_collection, update_bl_sample,
+...) are submitted to a LimsWriteQueue, and made by a greenlet, so that a
+slow LIMS does not hold the data collection. A write that fails is retried,
+with a delay doubling at each attempt.
+
+Writes are submitted with a key, for instance a data collection: writes with
+the same key are made in the order they are submitted, and a write waits
+until the writes before it are made. The collection id returned by
+store_data_collection is set in the writes after it with the same key
+(as dataCollectionId for store_image); as the LIMS client returns an id of 0
+when the call fails, a write returning no id is retried. The callbacks
+linked to a write (LimsWrite.link) are called once it is made.
+A coalescing write, for instance update_data_collection, which sends all the
+parameters each time, replaces the write of the same method waiting last
+for its key.
+
+With a spool directory, each write waiting is also in a file, removed once
+it is made, so that the writes not made when MXCuBE stops are made by the
+next session (see recover). The arguments of the writes are therefore plain
+data: None, bool, numbers, str and bytes, in lists, tuples and dicts with
+str keys.
+"""
+
+import copy
+import logging
+import numbers
+import os
+import pickle
+import time
+
+import gevent
+import gevent.event
+
+__copyright__ = """ Copyright © 2010-2023 by the MXCuBE collaboration """
+__license__ = "LGPLv3+"
+
+
+# parameter set from the result of the methods, in the writes after them
+_ID_METHODS = {"store_data_collection": "collection_id"}
+
+# name of the parameter in the arguments of the methods naming it otherwise
+_ID_PARAMETERS = {"store_image": {"collection_id": "dataCollectionId"}}
+
+_PLAIN_TYPES = (type(None), bool, numbers.Number, str, bytes)
+
+
+def _id_parameter(method, parameter):
+    return _ID_PARAMETERS.get(method, {}).get(parameter, parameter)
+
+
+def _check_plain_data(value, path):
+    """Raises TypeError if value is not plain data (see the module doc)"""
+    if isinstance(value, _PLAIN_TYPES):
+        return
+    if isinstance(value, (list, tuple)):
+        for index, item in enumerate(value):
+            _check_plain_data(item, "%s[%d]" % (path, index))
+    elif isinstance(value, dict):
+        for key, item in value.items():
+            if not isinstance(key, str):
+                raise TypeError("%s: key %r is not a str" % (path, key))
+            _check_plain_data(item, "%s[%r]" % (path, key))
+    else:
+        raise TypeError("%s: %s is not plain data" % (path, type(value).__name__))
+
+
+class LimsWrite:
+    """A LIMS method call, and its result"""
+
+    PENDING = "pending"
+    DONE = "done"
+    FAILED = "failed"
+
+    def __init__(self, sequence, method, args, kwargs, key, coalesce):
+        self.sequence = sequence
+        self.method = method
+        self.args = args
+        self.kwargs = kwargs
+        self.key = key
+        self.coalesce = coalesce
+        self.state = self.PENDING
+        self.attempts = 0
+        self.next_attempt_time = 0
+        self.coalesced = 0
+        self.result = None
+        self.error = None
+        self._done = gevent.event.Event()
+        self._callbacks = []
+
+    def __repr__(self):
+        return "<LimsWrite %d %s (%s): %s, %d attempts>" % (
+            self.sequence,
+            self.method,
+            self.key,
+            self.state,
+            self.attempts,
+        )
+
+    def wait(self, timeout=None):
+        """Wait until the write is made, or failed
+
+        Returns:
+            (bool): True if the write is made
+        """
+        self._done.wait(timeout)
+        return self.state == self.DONE
+
+    def link(self, callback):
+        """Call callback(write) once the write is made, at once if it is"""
+        if self.state == self.DONE:
+            callback(self)
+        else:
+            self._callbacks.append(callback)
+
+    def _record(self):
+        return {
+            "sequence": self.sequence,
+            "method": self.method,
+            "args": self.args,
+            "kwargs": self.kwargs,
+            "key": self.key,
+            "coalesce": self.coalesce,
+        }
+
+
+class LimsWriteQueue:
+    """Makes LIMS writes in a greenlet, in order by key, and retries them"""
+
+    def __init__(
+        self,
+        lims,
+        spool_directory=None,
+        max_attempts=8,
+        retry_delay=1.0,
+        max_retry_delay=60.0,
+    ):
+        """
+        Args:
+            lims (HardwareObject): the LIMS client, ISPyBClient for instance.
+            spool_directory (str): directory of the writes waiting, None to
+                                   keep them in memory only.
+            max_attempts (int): attempts before a write is failed.
+            retry_delay (float): delay before the first retry, in s.
+            max_retry_delay (float): maximum delay between retries, in s.
+        """
+        self.lims = lims
+        self.spool_directory = spool_directory
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self._writes = []
+        self._sequence = 0
+        self._worker = None
+        self._current = None
+        self._wakeup = gevent.event.Event()
+        self._idle = gevent.event.Event()
+        self._idle.set()
+        self.coalesced_num = 0
+
+    @property
+    def pending_writes(self):
+        return [write for write in self._writes if write.state == LimsWrite.PENDING]
+
+    @property
+    def failed_writes(self):
+        return [write for write in self._writes if write.state == LimsWrite.FAILED]
+
+    def submit(self, method, *args, key=None, coalesce=False, **kwargs):
+        """Submit a LIMS write
+
+        The arguments are copied: the write is made with their values at the
+        time it is submitted. They must be plain data (see the module doc),
+        to be spooled and recovered.
+
+        Args:
+            method (str): name of the method of the LIMS client.
+            args (tuple): arguments of the method.
+            key (str): writes with the same key are made in order.
+            coalesce (bool): replace the write of the same method waiting
+                             last for the key, if any.
+            kwargs (dict): keyword arguments of the method.
+        Returns:
+            (LimsWrite): the write, to wait for its result
+        Raises:
+            TypeError: if the arguments are not plain data
+        """
+        _check_plain_data(args, method)
+        _check_plain_data(kwargs, method)
+        args = copy.deepcopy(args)
+        kwargs = copy.deepcopy(kwargs)
+        if coalesce and key is not None:
+            last_write = next(
+                (write for write in reversed(self._writes) if write.key == key), None
+            )
+            if (
+                last_write is not None
+                and last_write.method == method
+                and last_write.coalesce
+                and last_write.state == LimsWrite.PENDING
+                and last_write is not self._current
+            ):
+                # the collection id may only be known by the last write
+                self._set_id(method, args, last_write.args)
+                last_write.args = args
+                last_write.kwargs = kwargs
+                last_write.coalesced += 1
+                self.coalesced_num += 1
+                self._spool(last_write)
+                return last_write
+
+        self._sequence += 1
+        write = LimsWrite(self._sequence, method, args, kwargs, key, coalesce)
+        self._add(write)
+        return write
+
+    def recover(self):
+        """Resubmit the writes left in the spool directory by a previous
+        session
+
+        Returns:
+            (int): number of writes resubmitted
+        """
+        if not self.spool_directory or not os.path.isdir(self.spool_directory):
+            return 0
+        writes = []
+        for filename in sorted(os.listdir(self.spool_directory)):
+            if not filename.endswith(".write"):
+                continue
+            path = os.path.join(self.spool_directory, filename)
+            try:
+                with open(path, "rb") as spool_file:
+                    record = pickle.load(spool_file)
+            except Exception:
+                logging.getLogger("HWR").exception(
+                    "LIMS writes: cannot read %s, ignored", path
+                )
+                continue
+            writes.append(LimsWrite(**record))
+        for write in writes:
+            self._sequence = max(self._sequence, write.sequence)
+            self._add(write, spool=False)
+        if writes:
+            logging.getLogger("HWR").info(
+                "LIMS writes: %d writes of a previous session resubmitted",
+                len(writes),
+            )
+        return len(writes)
+
+    def retry(self, write=None):
+        """Retry a failed write, or all the failed writes"""
+        writes = [write] if write is not None else self.failed_writes
+        for failed_write in writes:
+            failed_write.state = LimsWrite.PENDING
+            failed_write.attempts = 0
+            failed_write.next_attempt_time = 0
+            failed_write.error = None
+            failed_write._done.clear()
+        self._start()
+
+    def flush(self, timeout=None):
+        """Wait until the writes are made, for instance at the end of a
+        session. Failed writes, and the writes waiting for them, are left.
+
+        Returns:
+            (bool): True if all the writes are made
+        """
+        self._idle.wait(timeout)
+        return not self._writes
+
+    def _add(self, write, spool=True):
+        self._writes.append(write)
+        if spool:
+            self._spool(write)
+        self._start()
+
+    def _start(self):
+        self._idle.clear()
+        self._wakeup.set()
+        if self._worker is None or self._worker.dead:
+            self._worker = gevent.spawn(self._run_writes)
+
+    def _is_blocked(self, write):
+        """True if a write with the same key is to be made before"""
+        if write.key is None:
+            return False
+        for other_write in self._writes:
+            if other_write is write:
+                return False
+            if other_write.key == write.key:
+                return True
+        return False
+
+    def _next_write(self):
+        writes = [
+            write
+            for write in self._writes
+            if write.state == LimsWrite.PENDING and not self._is_blocked(write)
+        ]
+        return min(writes, key=lambda write: write.next_attempt_time, default=None)
+
+    def _run_writes(self):
+        while True:
+            self._wakeup.clear()
+            write = self._next_write()
+            if write is None:
+                self._worker = None
+                self._idle.set()
+                return
+            delay = write.next_attempt_time - time.time()
+            if delay > 0:
+                # woken up by a new write, which may be ready before
+                self._wakeup.wait(delay)
+                continue
+            self._current = write
+            try:
+                self._run(write)
+            finally:
+                self._current = None
+
+    def _run(self, write):
+        write.attempts += 1
+        parameter = _ID_METHODS.get(write.method)
+        try:
+            write.result = getattr(self.lims, write.method)(*write.args, **write.kwargs)
+            if parameter and not (write.result and write.result[0]):
+                # the LIMS client logs the error, and returns an id of 0
+                raise RuntimeError("no %s returned" % parameter)
+        except Exception as ex:
+            write.error = ex
+            if write.attempts >= self.max_attempts:
+                write.state = LimsWrite.FAILED
+                write._done.set()
+                logging.getLogger("HWR").exception(
+                    "LIMS writes: %s failed after %d attempts, it is kept until"
+                    " retried",
+                    write.method,
+                    write.attempts,
+                )
+            else:
+                delay = min(
+                    self.retry_delay * 2 ** (write.attempts - 1), self.max_retry_delay
+                )
+                write.next_attempt_time = time.time() + delay
+                logging.getLogger("HWR").warning(
+                    "LIMS writes: %s failed (%s), retried in %.1f s",
+                    write.method,
+                    ex,
+                    delay,
+                )
+            return
+
+        write.state = LimsWrite.DONE
+        self._writes.remove(write)
+        self._unspool(write)
+        if parameter and write.key is not None:
+            for other_write in self._writes:
+                if other_write.key == write.key and other_write.args:
+                    other_args = other_write.args[0]
+                    name = _id_parameter(other_write.method, parameter)
+                    if isinstance(other_args, dict) and not other_args.get(name):
+                        other_args[name] = write.result[0]
+                        self._spool(other_write)
+        write._done.set()
+        for callback in write._callbacks:
+            try:
+                callback(write)
+            except Exception:
+                logging.getLogger("HWR").exception(
+                    "LIMS writes: callback of %s failed", write.method
+                )
+
+    @staticmethod
+    def _set_id(method, args, previous_args):
+        for parameter in _ID_METHODS.values():
+            parameter = _id_parameter(method, parameter)
+            if (
+                args
+                and previous_args
+                and isinstance(args[0], dict)
+                and isinstance(previous_args[0], dict)
+                and not args[0].get(parameter)
+                and previous_args[0].get(parameter)
+            ):
+                args[0][parameter] = previous_args[0][parameter]
+
+    def _spool_path(self, write):
+        return os.path.join(self.spool_directory, "%012d.write" % write.sequence)
+
+    def _spool(self, write):
+        if not self.spool_directory:
+            return
+        try:
+            os.makedirs(self.spool_directory, exist_ok=True)
+            path = self._spool_path(write)
+            with open(path + ".tmp", "wb") as spool_file:
+                pickle.dump(write._record(), spool_file, pickle.HIGHEST_PROTOCOL)
+                spool_file.flush()
+                os.fsync(spool_file.fileno())
+            os.replace(path + ".tmp", path)
+        except Exception:
+            logging.getLogger("HWR").exception(
+                "LIMS writes: cannot spool %s, it is kept in memory only", write.method
+            )
+
+    def _unspool(self, write):
+        if not self.spool_directory:
+            return
+        try:
+            os.remove(self._spool_path(write))
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,398 @@
+"""
+Incremental persistence of the queue: a journal of the tasks added, removed
+or modified, and snapshots of the whole queue.
+
+Each change is appended to the journal as a record keyed by node id, so
+that an edit writes only the node changed. The changes of the enabled and
+executed state of the tasks are recorded as they are made; the edits of
+their parameters are recorded when reported with QueueModel.node_changed.
+Every compact_every records, the journal is compacted: a snapshot of the
+queue is written, and the journal is emptied. Restoring loads the
+snapshot, and replays the records written after it.
+
+Only the tasks, under the samples, are stored: samples come from LIMS or
+from the sample changer, and tasks are restored under the sample at the
+same location. Records and snapshots are pickled, snapshots compressed
+too. Nodes are stored without their parent and children, which are
+restored from the add records.
+
+Backends store the records and the snapshot: FileJournalBackend in two
+files, RedisJournalBackend in a redis list and key.
+"""
+
+import logging
+import os
+import pickle
+import struct
+import zlib
+
+from mxcubecore.model import queue_model_objects
+
+__copyright__ = """ Copyright © 2010-2023 by the MXCuBE collaboration """
+__license__ = "LGPLv3+"
+
+
+ADD = "add"
+REMOVE = "remove"
+MODIFY = "modify"
+
+# node attributes not stored: the tree is rebuilt from the add records
+_TREE_ATTRIBUTES = ("_parent", "_children")
+
+
+def _node_state(node):
+    state = dict(node.__dict__)
+    for name in _TREE_ATTRIBUTES:
+        state.pop(name, None)
+    return node.__class__, state
+
+
+def _walk(node):
+    yield node
+    for child in node.get_children():
+        yield from _walk(child)
+
+
+def _new_node(node_class, state):
+    node = node_class.__new__(node_class)
+    node.__dict__.update(state)
+    node._parent = None
+    node._children = []
+    return node
+
+
+class FileJournalBackend:
+    """Snapshot and journal in files of a directory
+
+    Records are appended with their length and checksum, so that a record
+    partly written when MXCuBE stopped is detected, and ignored with the
+    records after it. A snapshot is written to a temporary file first.
+    """
+
+    SNAPSHOT_FILENAME = "queue_snapshot.bin"
+    JOURNAL_FILENAME = "queue_journal.bin"
+    _HEADER = struct.Struct("<II")
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.snapshot_path = os.path.join(directory, self.SNAPSHOT_FILENAME)
+        self.journal_path = os.path.join(directory, self.JOURNAL_FILENAME)
+        self._journal_file = None
+
+    def append(self, record):
+        if self._journal_file is None:
+            os.makedirs(self.directory, exist_ok=True)
+            self._journal_file = open(self.journal_path, "ab")
+        self._journal_file.write(
+            self._HEADER.pack(len(record), zlib.crc32(record)) + record
+        )
+        self._journal_file.flush()
+
+    def write_snapshot(self, snapshot):
+        os.makedirs(self.directory, exist_ok=True)
+        temporary_path = self.snapshot_path + ".tmp"
+        with open(temporary_path, "wb") as snapshot_file:
+            snapshot_file.write(snapshot)
+            snapshot_file.flush()
+            os.fsync(snapshot_file.fileno())
+        os.replace(temporary_path, self.snapshot_path)
+        # records older than the snapshot are skipped if this is not done
+        if self._journal_file is not None:
+            self._journal_file.close()
+        self._journal_file = open(self.journal_path, "wb")
+
+    def read(self):
+        """
+        Returns:
+            (tuple): snapshot, None if there is none, and records list
+        """
+        snapshot = None
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, "rb") as snapshot_file:
+                snapshot = snapshot_file.read()
+
+        records = []
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, "rb") as journal_file:
+                data = journal_file.read()
+            position = 0
+            while position + self._HEADER.size <= len(data):
+                length, checksum = self._HEADER.unpack_from(data, position)
+                position += self._HEADER.size
+                record = data[position : position + length]
+                if len(record) < length or zlib.crc32(record) != checksum:
+                    logging.getLogger("HWR").warning(
+                        "Queue journal: ignoring incomplete record in %s",
+                        self.journal_path,
+                    )
+                    break
+                records.append(record)
+                position += length
+        return snapshot, records
+
+    def close(self):
+        if self._journal_file is not None:
+            self._journal_file.close()
+            self._journal_file = None
+
+
+class RedisJournalBackend:
+    """Snapshot in a redis key, and journal in a redis list"""
+
+    def __init__(self, redis_client, key):
+        """
+        Args:
+            redis_client (redis.StrictRedis): client of the database.
+            key (str): key of the snapshot, also prefix of the journal key.
+        """
+        self.redis_client = redis_client
+        self.snapshot_key = key + ":snapshot"
+        self.journal_key = key + ":journal"
+
+    def append(self, record):
+        self.redis_client.rpush(self.journal_key, record)
+
+    def write_snapshot(self, snapshot):
+        pipeline = self.redis_client.pipeline(transaction=True)
+        pipeline.set(self.snapshot_key, snapshot)
+        pipeline.delete(self.journal_key)
+        pipeline.execute()
+
+    def read(self):
+        return (
+            self.redis_client.get(self.snapshot_key),
+            self.redis_client.lrange(self.journal_key, 0, -1),
+        )
+
+    def close(self):
+        pass
+
+
+class QueueJournal:
+    """Journal of the tasks of the selected model of a QueueModel"""
+
+    def __init__(self, queue_model, backend, compact_every=500):
+        """
+        Args:
+            queue_model (QueueModel): the queue model journaled.
+            backend (FileJournalBackend, RedisJournalBackend): storage.
+            compact_every (int): number of records before a snapshot.
+        """
+        self.queue_model = queue_model
+        self.backend = backend
+        self.compact_every = compact_every
+        self._sequence = 0
+        self._records_num = 0
+        self._paused = False
+        # False until the journal is restored or compacted: what is stored is
+        # from an other session, replaced by a snapshot on the first change
+        self._synced = False
+
+    def node_added(self, node):
+        """Records the node, and the nodes under it, if under a sample"""
+        if self._paused or self._get_sample(node) is None:
+            return
+        if not self._synced:
+            self.compact()
+            return
+        for node_id, parent_ref, node_state in self._subtree_entries(node):
+            self._append(ADD, node_id, parent_ref, node_state)
+
+    def node_removed(self, node):
+        if self._paused or self._get_sample(node) is None:
+            return
+        if not self._synced:
+            self.compact()
+            return
+        self._append(REMOVE, node._node_id)
+
+    def node_modified(self, node):
+        if self._paused or self._get_sample(node) is None:
+            return
+        if not self._synced:
+            self.compact()
+            return
+        self._append(MODIFY, node._node_id, None, _node_state(node))
+
+    def compact(self):
+        """Writes a snapshot of the queue, and empties the journal"""
+        entries = []
+        for sample in self._get_samples():
+            for child in sample.get_children():
+                entries.extend(self._subtree_entries(child))
+        try:
+            snapshot = zlib.compress(
+                pickle.dumps(
+                    (
+                        self.queue_model.get_selected_model_name(),
+                        self._sequence,
+                        entries,
+                    ),
+                    pickle.HIGHEST_PROTOCOL,
+                )
+            )
+            self.backend.write_snapshot(snapshot)
+        except Exception:
+            # the queue is not to be broken by its persistence
+            logging.getLogger("HWR").exception("Queue journal: unable to compact")
+            return
+        self._records_num = 0
+        self._synced = True
+
+    def save(self):
+        """Makes sure the queue is saved: the changes are recorded as they
+        are made, so the journal is only compacted if it still holds the
+        queue of an other session"""
+        if not self._synced and not self._paused:
+            self.compact()
+
+    def model_selected(self):
+        """Replaces the journal by a snapshot of the model selected"""
+        if not self._paused:
+            self.compact()
+
+    def restore(self, snapshot=None):
+        """
+        Selects the model the queue was saved from, restores the tasks of
+        the snapshot and of the journal tail under its samples, and compacts
+        the journal, the nodes being given new ids.
+
+        Args:
+            snapshot: image set as snapshot of the tasks restored.
+        Returns:
+            (str): name of the model the queue was saved from, None if
+                   nothing was saved.
+        """
+        stored_snapshot, records = self.backend.read()
+        model_name, sequence, entries = None, 0, []
+        if stored_snapshot is not None:
+            model_name, sequence, entries = pickle.loads(
+                zlib.decompress(stored_snapshot)
+            )
+
+        nodes = {}
+        self._paused = True
+        try:
+            if model_name not in (None, self.queue_model.get_selected_model_name()):
+                self.queue_model.select_model(model_name)
+            samples = dict((sample.location, sample) for sample in self._get_samples())
+            for node_id, parent_ref, node_state in entries:
+                self._restore_node(samples, nodes, node_id, parent_ref, node_state)
+            for record in records:
+                (
+                    record_sequence,
+                    operation,
+                    node_id,
+                    parent_ref,
+                    node_state,
+                ) = pickle.loads(record)
+                if record_sequence <= sequence:
+                    continue
+                sequence = record_sequence
+                if operation == ADD:
+                    self._restore_node(samples, nodes, node_id, parent_ref, node_state)
+                elif operation == MODIFY and node_id in nodes:
+                    node = nodes[node_id]
+                    for name, value in node_state[1].items():
+                        if name not in ("_node_id",) + _TREE_ATTRIBUTES:
+                            setattr(node, name, value)
+                elif operation == REMOVE and node_id in nodes:
+                    node = nodes[node_id]
+                    self.queue_model.del_child(node.get_parent(), node)
+                    removed = set(id(child) for child in _walk(node))
+                    for removed_id in list(nodes):
+                        if id(nodes[removed_id]) in removed:
+                            del nodes[removed_id]
+        finally:
+            self._paused = False
+
+        if snapshot is not None:
+            for node in nodes.values():
+                if hasattr(node, "set_snapshot"):
+                    node.set_snapshot(snapshot)
+
+        self._sequence = sequence
+        self.compact()
+        logging.getLogger("HWR").info(
+            "Queue journal: %d tasks restored from a snapshot and %d records",
+            len(nodes),
+            len(records),
+        )
+        return model_name
+
+    def close(self):
+        self.backend.close()
+
+    def _get_samples(self):
+        samples = []
+        nodes = list(self.queue_model.get_model_root().get_children())
+        while nodes:
+            node = nodes.pop(0)
+            if self._is_sample(node):
+                samples.append(node)
+            else:
+                nodes.extend(node.get_children())
+        return samples
+
+    @staticmethod
+    def _is_sample(node):
+        return isinstance(node, queue_model_objects.Sample)
+
+    def _get_sample(self, node):
+        """Returns the sample the node is under, if in the selected model"""
+        sample = None
+        # a node being created or unpickled may have no parent yet
+        while getattr(node, "_parent", None) is not None:
+            node = node.get_parent()
+            if sample is None and self._is_sample(node):
+                sample = node
+        if node is not self.queue_model.get_model_root():
+            return None
+        return sample
+
+    def _parent_ref(self, node):
+        parent = node.get_parent()
+        if self._is_sample(parent):
+            return ("sample", parent.location)
+        return ("node", parent._node_id)
+
+    def _subtree_entries(self, node):
+        return [
+            (child._node_id, self._parent_ref(child), _node_state(child))
+            for child in _walk(node)
+        ]
+
+    def _append(self, operation, node_id, parent_ref=None, node_state=None):
+        self._sequence += 1
+        try:
+            record = pickle.dumps(
+                (self._sequence, operation, node_id, parent_ref, node_state),
+                pickle.HIGHEST_PROTOCOL,
+            )
+            self.backend.append(record)
+        except Exception:
+            logging.getLogger("HWR").exception(
+                "Queue journal: unable to record %s of node %s", operation, node_id
+            )
+            return
+        self._records_num += 1
+        if self._records_num >= self.compact_every:
+            self.compact()
+
+    def _restore_node(self, samples, nodes, node_id, parent_ref, node_state):
+        parent_type, parent_key = parent_ref
+        if parent_type == "sample":
+            parent = samples.get(parent_key)
+        else:
+            parent = nodes.get(parent_key)
+        if parent is None:
+            logging.getLogger("HWR").warning(
+                "Queue journal: no %s %s to restore node %s under",
+                parent_type,
+                parent_key,
+                node_id,
+            )
+            return
+        node = _new_node(*node_state)
+        self.queue_model.add_child(parent, node)
+        nodes[node_id] = node
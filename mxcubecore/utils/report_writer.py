@@ -0,0 +1,203 @@
+"""
+Background writer of reports: plots, result files and LIMS records.
+
+A report is a ReportJob, made of stages run in order. A stage is a function
+with its arguments, run either in the writer greenlet (for instance LIMS
+calls, or anything using hardware objects), or in a separate process (for
+instance matplotlib figures), so that neither blocks the caller.
+Jobs are run one at a time, in the order they are submitted, from a queue of
+bounded size: submitting a job waits while the queue is full.
+
+A failed job keeps the stage that failed, and is listed in failed_jobs until
+it is retried, starting again from that stage.
+"""
+
+import logging
+import multiprocessing
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+
+import gevent
+import gevent.event
+import gevent.queue
+
+__copyright__ = """ Copyright © 2010-2023 by the MXCuBE collaboration """
+__license__ = "LGPLv3+"
+
+
+class ReportJob:
+    """Report stages, and their progress"""
+
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+    def __init__(self, name, stages):
+        """
+        Args:
+            name (str): name of the report, for the log.
+            stages (list): (function, args, in_process) tuples. Functions
+                           run in a process must be picklable (module level)
+                           and so must be their arguments.
+        """
+        self.name = name
+        self.stages = list(stages)
+        self.state = self.PENDING
+        self.next_stage = 0
+        self.attempts = 0
+        self.error = None
+        self.results = []
+        self._done = gevent.event.Event()
+
+    def __repr__(self):
+        return "<ReportJob %s: %s, stage %d/%d>" % (
+            self.name,
+            self.state,
+            self.next_stage,
+            len(self.stages),
+        )
+
+    def wait(self, timeout=None):
+        """Wait until the job is done or failed
+
+        Returns:
+            (bool): True if the job is done
+        """
+        self._done.wait(timeout)
+        return self.state == self.DONE
+
+
+class ReportWriter:
+    """Runs ReportJobs in a greenlet, and their process stages in a pool"""
+
+    def __init__(self, max_pending=8, processes=0):
+        """
+        Args:
+            max_pending (int): maximum number of jobs waiting to be run.
+            processes (int): number of processes for the process stages,
+                             0 to run them in the gevent thread pool.
+        """
+        self.processes = processes
+        self._queue = gevent.queue.Queue(max_pending)
+        self._pending = []
+        self._failed = []
+        self._current = None
+        self._executor = None
+        self._worker = None
+        self._idle = gevent.event.Event()
+        self._idle.set()
+
+    @property
+    def pending_jobs(self):
+        """Jobs waiting to be run, and the job running"""
+        return ([self._current] if self._current else []) + list(self._pending)
+
+    @property
+    def failed_jobs(self):
+        return list(self._failed)
+
+    def submit(self, name, *stages):
+        """Submit a report, waiting while the queue is full
+
+        Args:
+            name (str): name of the report.
+            stages (tuple): (function, args, in_process) of each stage.
+        Returns:
+            (ReportJob): the submitted job
+        """
+        job = ReportJob(name, stages)
+        self._put(job)
+        return job
+
+    def retry(self, job=None):
+        """Retry a failed job, or all failed jobs, from the stage that failed"""
+        jobs = [job] if job is not None else list(self._failed)
+        for failed_job in jobs:
+            self._failed.remove(failed_job)
+            failed_job.state = ReportJob.PENDING
+            failed_job.error = None
+            failed_job._done.clear()
+            self._put(failed_job)
+
+    def wait(self, timeout=None):
+        """Wait until all the jobs submitted are run
+
+        Returns:
+            (bool): True if no job is left to run
+        """
+        return self._idle.wait(timeout)
+
+    def shutdown(self):
+        """Stop the process pool (the jobs already submitted are run)"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def _put(self, job):
+        self._idle.clear()
+        self._pending.append(job)
+        if self._worker is None or self._worker.dead:
+            self._worker = gevent.spawn(self._run_jobs)
+        try:
+            self._queue.put(job)
+        except BaseException:
+            self._pending.remove(job)
+            raise
+
+    def _run_jobs(self):
+        while True:
+            try:
+                job = self._queue.get(timeout=1)
+            except gevent.queue.Empty:
+                if self._queue.empty() and self._current is None:
+                    self._worker = None
+                    return
+                continue
+            self._pending.remove(job)
+            self._current = job
+            try:
+                self._run(job)
+            finally:
+                self._current = None
+                if not self._pending:
+                    self._idle.set()
+
+    def _run(self, job):
+        job.state = ReportJob.RUNNING
+        job.attempts += 1
+        try:
+            while job.next_stage < len(job.stages):
+                function, args, in_process = job.stages[job.next_stage]
+                if in_process:
+                    result = self._run_in_process(function, args)
+                else:
+                    result = function(*args)
+                job.results.append(result)
+                job.next_stage += 1
+        except Exception:
+            job.state = ReportJob.FAILED
+            job.error = traceback.format_exc()
+            self._failed.append(job)
+            logging.getLogger("HWR").exception(
+                "Report %s failed at stage %d (attempt %d)",
+                job.name,
+                job.next_stage,
+                job.attempts,
+            )
+        else:
+            job.state = ReportJob.DONE
+        finally:
+            job._done.set()
+
+    def _run_in_process(self, function, args):
+        threadpool = gevent.get_hub().threadpool
+        if not self.processes:
+            return threadpool.apply(function, args)
+        if self._executor is None:
+            # spawn, not fork: the parent process runs gevent and threads
+            self._executor = ProcessPoolExecutor(
+                self.processes, mp_context=multiprocessing.get_context("spawn")
+            )
+        future = self._executor.submit(function, *args)
+        return threadpool.apply(future.result)
@@ -0,0 +1,247 @@
+"""
+Process-wide registry of suds SOAP clients.
+
+Creating a suds Client downloads and parses the WSDL, and the XML schemas it
+imports, which takes seconds with the ISPyB web services. The registry
+creates one client per WSDL url and credentials, and keeps it for the
+process. The parsed WSDL is also cached on disk, so that a new process does
+not download and parse it again.
+
+Clients with the same credentials and proxy share an HTTP session, whose
+connections are kept alive and reused by all of them. The time taken by the
+calls is recorded by web service and operation (see get_latency_metrics).
+Value objects are created from a prototype built once per type.
+"""
+
+import copy
+import io
+import logging
+import os
+import re
+import time
+import urllib.request
+
+import requests
+from suds.cache import NoCache, ObjectCache
+from suds.client import Client
+from suds.transport import Reply, Transport, TransportError
+
+__copyright__ = """ Copyright © 2010-2023 by the MXCuBE collaboration """
+__license__ = "LGPLv3+"
+
+
+# name of the first element of the SOAP body: the operation called
+_OPERATION_RE = re.compile(rb"<(?:[\w.-]+:)?Body[^>]*>\s*<(?:[\w.-]+:)?([\w.-]+)")
+
+
+def default_cache_directory():
+    """
+    Returns:
+        (str): directory of the WSDL cache, in the user cache directory
+    """
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.join(
+        os.path.expanduser("~"), ".cache"
+    )
+    return os.path.join(cache_home, "mxcube", "wsdl")
+
+
+class SessionTransport(Transport):
+    """suds transport sending the requests through a requests.Session"""
+
+    def __init__(self, session, timeout, metrics):
+        """
+        Args:
+            session (requests.Session): session, with its authentication and
+                                        proxies, shared by the clients.
+            timeout (float): timeout of the requests, in s.
+            metrics (dict): latencies, by (service, operation).
+        """
+        Transport.__init__(self)
+        self.session = session
+        self.options.timeout = timeout
+        self.metrics = metrics
+
+    def open(self, request):
+        if not request.url.startswith(("http://", "https://")):
+            # local WSDL and schemas
+            return urllib.request.urlopen(request.url)
+        response = self.session.get(
+            request.url, headers=request.headers, timeout=self.options.timeout
+        )
+        if response.status_code >= 400:
+            raise TransportError(
+                response.reason, response.status_code, io.BytesIO(response.content)
+            )
+        return io.BytesIO(response.content)
+
+    def send(self, request):
+        match = _OPERATION_RE.search(request.message or b"")
+        key = (
+            request.url.split("?")[0].rstrip("/").rsplit("/", 1)[-1],
+            match.group(1).decode() if match else "",
+        )
+        start = time.perf_counter()
+        try:
+            response = self.session.post(
+                request.url,
+                data=request.message,
+                headers=request.headers,
+                timeout=self.options.timeout,
+            )
+        except Exception:
+            self._record(key, time.perf_counter() - start, True)
+            raise
+        self._record(key, time.perf_counter() - start, response.status_code >= 400)
+        if response.status_code in (202, 204) or response.status_code >= 400:
+            raise TransportError(
+                response.reason, response.status_code, io.BytesIO(response.content)
+            )
+        return Reply(response.status_code, response.headers, response.content)
+
+    def _record(self, key, elapsed, error):
+        metrics = self.metrics.setdefault(
+            key, {"calls": 0, "errors": 0, "total_time": 0.0, "max_time": 0.0}
+        )
+        metrics["calls"] += 1
+        metrics["errors"] += int(error)
+        metrics["total_time"] += elapsed
+        metrics["max_time"] = max(metrics["max_time"], elapsed)
+
+
+class SoapClientRegistry:
+    """suds clients, HTTP sessions and value object prototypes"""
+
+    def __init__(self, cache_directory=None, cache_days=1):
+        """
+        Args:
+            cache_directory (str): directory of the WSDL cache, None for the
+                                   user cache directory, "" for no disk cache.
+            cache_days (float): days the WSDL are kept in the cache.
+        """
+        self._clients = {}
+        self._sessions = {}
+        self._prototypes = {}
+        self._metrics = {}
+        self._cache = None
+        self.set_cache_directory(cache_directory, cache_days)
+
+    def set_cache_directory(self, cache_directory=None, cache_days=1):
+        """Set the WSDL cache of the clients created from now on
+
+        Args:
+            cache_directory (str): directory of the WSDL cache, None for the
+                                   user cache directory, "" for no disk cache.
+            cache_days (float): days the WSDL are kept in the cache.
+        """
+        if cache_directory is None:
+            cache_directory = default_cache_directory()
+        self.cache_directory = cache_directory
+        self.cache_days = cache_days
+        self._cache = None
+
+    def get_client(self, url, username=None, password=None, proxy=None, timeout=3):
+        """Get the client of a web service, created on the first call
+
+        Args:
+            url (str): url of the WSDL.
+            username (str): user name, for HTTP basic authentication.
+            password (str): password, for HTTP basic authentication.
+            proxy (dict): proxy url by protocol.
+            timeout (float): timeout of the requests, in s.
+        Returns:
+            (suds.client.Client): the client
+        """
+        proxy = proxy or {}
+        session_key = (username, password, tuple(sorted(proxy.items())))
+        key = (url,) + session_key
+        client = self._clients.get(key)
+        if client is None:
+            session = self._sessions.get(session_key)
+            if session is None:
+                session = requests.Session()
+                if username is not None:
+                    session.auth = (username, password)
+                session.proxies.update(proxy)
+                self._sessions[session_key] = session
+            start = time.perf_counter()
+            client = Client(
+                url,
+                transport=SessionTransport(session, timeout, self._metrics),
+                cache=self._get_cache(),
+            )
+            logging.getLogger("HWR").debug(
+                "SOAP client for %s created in %.3f s", url, time.perf_counter() - start
+            )
+            self._clients[key] = client
+        return client
+
+    def create_object(self, url, type_name):
+        """Create a value object of a web service
+
+        The client of the web service already created is used, if any, and
+        a client without authentication otherwise.
+
+        Args:
+            url (str): url of the WSDL.
+            type_name (str): name of the type in the WSDL.
+        Returns:
+            (suds.sudsobject.Object): new value object
+        """
+        prototype = self._prototypes.get((url, type_name))
+        if prototype is None:
+            client = next(
+                (client for key, client in self._clients.items() if key[0] == url),
+                None,
+            ) or self.get_client(url)
+            prototype = client.factory.create(type_name)
+            self._prototypes[(url, type_name)] = prototype
+        return copy.deepcopy(prototype)
+
+    def get_latency_metrics(self):
+        """Latencies of the calls, since the start or the last reset
+
+        Returns:
+            (dict): {"service.operation": {"calls", "errors", "mean_time",
+                    "max_time"}}, times in s
+        """
+        return dict(
+            (
+                "%s.%s" % key,
+                {
+                    "calls": metrics["calls"],
+                    "errors": metrics["errors"],
+                    "mean_time": metrics["total_time"] / metrics["calls"],
+                    "max_time": metrics["max_time"],
+                },
+            )
+            for key, metrics in self._metrics.items()
+        )
+
+    def reset_latency_metrics(self):
+        self._metrics.clear()
+
+    def clear(self):
+        """Forget the clients and value object prototypes, and close the
+        sessions (the disk cache is kept)"""
+        for session in self._sessions.values():
+            session.close()
+        self._clients.clear()
+        self._sessions.clear()
+        self._prototypes.clear()
+
+    def _get_cache(self):
+        if self._cache is None and self.cache_directory:
+            try:
+                os.makedirs(self.cache_directory, exist_ok=True)
+                self._cache = ObjectCache(self.cache_directory, days=self.cache_days)
+            except OSError:
+                logging.getLogger("HWR").warning(
+                    "Cannot use %s as WSDL cache, WSDL are not cached on disk",
+                    self.cache_directory,
+                )
+                self.cache_directory = ""
+        return self._cache or NoCache()
+
+
+# registry of the process
+REGISTRY = SoapClientRegistry()
@@ -0,0 +1,111 @@
+"""Automatic centring time, sequential, pipelined and continuous
+
+Centres a synthetic loop with the mockup diffractometer motors. The loop
+search takes about 50 ms, outside of the gevent hub as an image analysis
+library would, and finds the loop from the phi position encoded in the frame.
+
+Usage, from the repository root: python -m test.benchmarks.auto_centring
+"""
+
+import math
+import os
+import time
+
+from gevent import monkey
+
+monkey.patch_all(thread=False)
+
+import numpy  # noqa: E402
+
+from mxcubecore import HardwareRepository as HWR  # noqa: E402
+from mxcubecore.HardwareObjects import sample_centring  # noqa: E402
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+CONFIG_DIR = os.path.join(ROOT_DIR, "mxcubecore", "configuration")
+
+# time.sleep, not blocking the thread pool thread on the gevent hub
+sleep = monkey.get_original("time", "sleep")
+
+SEARCH_TIME = 0.05
+PHI_VELOCITY = 360.0
+
+
+class Camera:
+    def get_width(self):
+        return 800
+
+    def get_height(self):
+        return 600
+
+
+class SampleView:
+    """Frames recording the phi position they are taken at"""
+
+    def __init__(self, phi):
+        self.phi = phi
+        self.camera = Camera()
+
+    def get_frame(self, bw=True):
+        return numpy.array([self.phi.get_value()])
+
+    def save_snapshot(self, filename, overlay=True, bw=False):
+        raise NotImplementedError
+
+
+class LoopFinder(sample_centring.LoopFinder):
+    """Loop 0.1 mm off the rotation axis"""
+
+    def find_loop(self, image, rotation=None):
+        sleep(SEARCH_TIME)
+        return "Coord", 400, 300 + 100 * math.sin(math.radians(image[0]))
+
+
+def centring_motors():
+    HWR.init_hardware_repository(
+        os.path.pathsep.join(
+            (
+                os.path.join(CONFIG_DIR, "mockup"),
+                os.path.join(CONFIG_DIR, "mockup", "test"),
+            )
+        )
+    )
+    motors = HWR.beamline.diffractometer.motor_hwobj_dict
+    motors["phi"].set_velocity(PHI_VELOCITY)
+    return {
+        "phi": sample_centring.CentringMotor(motors["phi"], direction=-1),
+        "phiy": sample_centring.CentringMotor(motors["phiy"], direction=-1),
+        "phiz": sample_centring.CentringMotor(motors["phiz"]),
+        "sampx": sample_centring.CentringMotor(motors["sampx"]),
+        "sampy": sample_centring.CentringMotor(motors["sampy"]),
+    }
+
+
+def main():
+    motors = centring_motors()
+    sample_view = SampleView(motors["phi"])
+    sample_centring.set_loop_finder(LoopFinder())
+
+    print("phi at %.0f deg/s, loop search %.0f ms" % (PHI_VELOCITY, 1000 * SEARCH_TIME))
+    for n_points in (3, 6, 12):
+        results = []
+        for mode in ("sequential", "pipelined", "continuous"):
+            start = time.perf_counter()
+            sample_centring.start_auto(
+                sample_view,
+                motors,
+                1000.0,
+                1000.0,
+                400,
+                300,
+                n_points=n_points,
+                mode=mode,
+            ).get()
+            results.append((mode, time.perf_counter() - start))
+        print(
+            "%2d points: " % n_points
+            + ", ".join("%s %6.0f ms" % (mode, 1000 * t) for mode, t in results)
+        )
+
+
+if __name__ == "__main__":
+    main()
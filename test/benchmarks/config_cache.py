@@ -0,0 +1,76 @@
+"""Startup benchmark of the configuration cache
+
+Parses all the configuration files of the mockup and test trees, without
+cache, filling the cache and from the cache, then times a full mockup
+beamline startup with and without the cache.
+
+Usage, from the repository root: python -m test.benchmarks.config_cache
+"""
+
+import os
+import tempfile
+import time
+
+from gevent import monkey
+
+monkey.patch_all(thread=False)
+
+from mxcubecore import HardwareRepository as HWR  # noqa: E402
+from mxcubecore.utils import config_cache  # noqa: E402
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+CONFIG_DIR = os.path.join(ROOT_DIR, "mxcubecore", "configuration")
+TREES = [os.path.join(CONFIG_DIR, "mockup"), os.path.join(CONFIG_DIR, "test")]
+
+
+def parse_all():
+    count = 0
+    start = time.perf_counter()
+    for file_path in config_cache._config_files(TREES):
+        if file_path.endswith(".xml"):
+            with open(file_path) as xml_file:
+                config_cache.load_xml_events(file_path, xml_file.read())
+        else:
+            config_cache.load_yaml(file_path, HWR.yaml)
+        count += 1
+    return count, time.perf_counter() - start
+
+
+def startup():
+    HWR.uninit_hardware_repository()
+    start = time.perf_counter()
+    HWR.init_hardware_repository(
+        os.path.pathsep.join(
+            (
+                os.path.join(CONFIG_DIR, "mockup"),
+                os.path.join(CONFIG_DIR, "mockup", "test"),
+            )
+        )
+    )
+    return time.perf_counter() - start
+
+
+def main():
+    with tempfile.TemporaryDirectory() as cache_dir:
+        results = []
+        config_cache.set_cache_directory(None)
+        results.append(("no cache",) + parse_all())
+        config_cache.set_cache_directory(cache_dir)
+        results.append(("cold cache",) + parse_all())
+        results.append(("warm cache",) + parse_all())
+
+        config_cache.set_cache_directory(None)
+        startup()  # import all modules once
+        no_cache = startup()
+        config_cache.set_cache_directory(cache_dir)
+        startup()
+        cached = startup()
+
+    for name, count, elapsed in results:
+        print("parse %d files, %-10s: %7.1f ms" % (count, name, 1000 * elapsed))
+    print("mockup startup, no cache  : %7.1f ms" % (1000 * no_cache))
+    print("mockup startup, warm cache: %7.1f ms" % (1000 * cached))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Compare the Exporter STX/ETX frame parser with the former byte-by-byte one
+
+Usage, from the repository root: python -m test.benchmarks.exporter_framing
+"""
+
+import timeit
+
+from mxcubecore.Command.exporter.StandardClient import (
+    ETX,
+    MAX_SIZE_STREAM_MSG,
+    STX,
+    StreamFramer,
+)
+
+
+def legacy_parse(chunks):
+    """Parser of StandardClient.recv_thread before StreamFramer"""
+    frames = []
+    buffer = b""
+    received_stx = False
+    for ret in chunks:
+        for b in ret:
+            if b == STX:
+                buffer = b""
+                received_stx = True
+            elif b == ETX:
+                if received_stx:
+                    frames.append(buffer)
+                    received_stx = False
+                    buffer = b""
+            elif received_stx:
+                buffer += bytes([b])
+        if len(buffer) > MAX_SIZE_STREAM_MSG:
+            received_stx = False
+            buffer = b""
+    return frames
+
+
+def framer_parse(chunks):
+    framer = StreamFramer()
+    frames = []
+    for ret in chunks:
+        frames.extend(framer.feed(ret))
+    return frames
+
+
+def make_chunks(message_size, messages, chunk_size=4096):
+    payload = b"EVT:MotorPositions:" + b"x" * message_size
+    data = (bytes([STX]) + payload + bytes([ETX])) * messages
+    return [data[i : i + chunk_size] for i in range(0, len(data), chunk_size)]
+
+
+def main():
+    for message_size, messages in ((100, 1000), (10000, 20), (200000, 2)):
+        chunks = make_chunks(message_size, messages)
+        assert legacy_parse(chunks) == framer_parse(chunks)
+        legacy = min(timeit.repeat(lambda: legacy_parse(chunks), number=1, repeat=3))
+        framer = min(timeit.repeat(lambda: framer_parse(chunks), number=1, repeat=3))
+        print(
+            "%7d bytes x %4d messages: legacy %8.4f s, framer %8.4f s (x%.0f)"
+            % (message_size, messages, legacy, framer, legacy / framer)
+        )
+
+
+if __name__ == "__main__":
+    main()
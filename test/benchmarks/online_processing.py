@@ -0,0 +1,135 @@
+"""Alignment of online processing results on large meshes
+
+Results arrive by batches of 100 images, as from Dozor, and each batch is
+aligned on the mesh: former alignment, one cell at a time, against
+align_grid_results. align_processing_results adds the center of mass and
+the best positions to the alignment.
+
+Usage, from the repository root: python -m test.benchmarks.online_processing
+"""
+
+import time
+
+import numpy
+
+from mxcubecore.HardwareObjects.abstract.AbstractOnlineProcessing import (
+    AbstractOnlineProcessing,
+)
+
+BATCH_SIZE = 100
+
+
+class MeshGrid:
+    """Zig-zag mesh, with the geometry computations of a graphics grid"""
+
+    def __init__(self, num_cols, num_rows, first_image_num=1):
+        self.num_cols = num_cols
+        self.num_rows = num_rows
+        self.first_image_num = first_image_num
+
+    def get_line_image_num(self, image_serial):
+        line, image = divmod(image_serial - self.first_image_num, self.num_cols)
+        if line % 2:
+            image = self.num_cols - 1 - image
+        return line, image
+
+    def get_col_row_from_image_serial(self, image_serial):
+        line, image = self.get_line_image_num(image_serial)
+        return int(float(image)), int(float(line))
+
+    def get_motor_pos_from_col_row(self, col, row):
+        return {"sampx": 0.01 * col, "phiy": 0.01 * row}
+
+    def set_score(self, score):
+        pass
+
+
+def online_processing(grid):
+    processing = AbstractOnlineProcessing("online_processing")
+    processing.grid = grid
+    images_num = grid.num_cols * grid.num_rows
+    processing.params_dict = {
+        "images_num": images_num,
+        "first_image_num": grid.first_image_num,
+        "steps_y": grid.num_rows,
+        "template": "/data/mesh_%d_%05d.cbf",
+        "run_number": 1,
+    }
+    processing.results_raw = {}
+    processing.results_aligned = {}
+    for key in ("score", "spots_num", "spots_resolution", "is"):
+        processing.results_raw[key] = numpy.zeros(images_num)
+        processing.results_aligned[key] = numpy.zeros((grid.num_cols, grid.num_rows))
+    return processing
+
+
+def align_per_cell(processing, start_index, end_index):
+    """Former alignment, one cell at a time"""
+    for score_key in processing.results_raw:
+        for cell_index in range(start_index, end_index + 1):
+            col, row = processing.grid.get_col_row_from_image_serial(
+                cell_index + processing.params_dict["first_image_num"]
+            )
+            if (
+                col < processing.results_aligned[score_key].shape[0]
+                and row < processing.results_aligned[score_key].shape[1]
+            ):
+                processing.results_aligned[score_key][col][
+                    row
+                ] = processing.results_raw[score_key][cell_index]
+
+
+def run(processing, align):
+    """Time the alignment of all the batches"""
+    images_num = processing.params_dict["images_num"]
+    rng = numpy.random.default_rng(0)
+    elapsed = 0
+    for start_index in range(0, images_num, BATCH_SIZE):
+        end_index = min(start_index + BATCH_SIZE, images_num) - 1
+        for key in processing.results_raw:
+            processing.results_raw[key][start_index : end_index + 1] = rng.uniform(
+                0, 100, end_index + 1 - start_index
+            )
+        start = time.perf_counter()
+        align(processing, start_index, end_index)
+        elapsed += time.perf_counter() - start
+    return elapsed
+
+
+def align_grid_results(processing, start_index, end_index):
+    for score_key in processing.results_raw:
+        processing.align_grid_results(score_key, start_index, end_index)
+
+
+def align_processing_results(processing, start_index, end_index):
+    processing.align_processing_results(start_index, end_index)
+
+
+def main():
+    # import scipy before timing
+    run(online_processing(MeshGrid(10, 10)), align_processing_results)
+    for num_cols, num_rows in ((50, 50), (100, 100), (200, 200)):
+        results = [
+            run(online_processing(MeshGrid(num_cols, num_rows)), align)
+            for align in (
+                align_per_cell,
+                align_grid_results,
+                align_processing_results,
+            )
+        ]
+        print(
+            "%3dx%-3d mesh: per cell %7.1f ms, align_grid_results %6.1f ms (x%.0f),"
+            " align_processing_results %6.1f ms"
+            % (
+                num_cols,
+                num_rows,
+                1000 * results[0],
+                1000 * results[1],
+                results[0] / results[1],
+                1000 * results[2],
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
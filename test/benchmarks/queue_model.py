@@ -0,0 +1,107 @@
+"""Building a large queue: run numbers, path collisions and node lookups
+
+Each task is a copy of a data collection, given the next run number of its
+prefix, checked for path collisions, added to the queue and looked up by
+node id, as done when creating tasks for many samples. The former queue
+model searched the whole task tree for each of these.
+
+Usage, from the repository root: python -m test.benchmarks.queue_model
+"""
+
+import time
+
+from mxcubecore.HardwareObjects.QueueModel import QueueModel
+from mxcubecore.model import queue_model_objects as qmo
+
+TASKS_PER_SAMPLE = 20
+PREFIXES_PER_SAMPLE = 4
+
+
+class FormerQueueModel(QueueModel):
+    """Queue model searching the task tree"""
+
+    def get_node(self, _id, parent=None):
+        if parent is None:
+            parent = self._selected_model
+
+        for node in parent._children:
+            if node._node_id == _id:
+                return node
+            else:
+                result = self.get_node(_id, node)
+
+                if result:
+                    return result
+
+    def get_next_run_number(self, new_path_template, exclude_current=True):
+        conflicting_path_templates = [0]
+        for pt in self.get_path_templates():
+            if exclude_current and pt[1] is new_path_template:
+                continue
+            if pt[1] == new_path_template:
+                conflicting_path_templates.append(pt[1].run_number)
+        return max(conflicting_path_templates) + 1
+
+    def check_for_path_collisions(self, new_path_template):
+        result = False
+        for pt in self.get_path_templates():
+            if pt[1] is not new_path_template:
+                if new_path_template.intersection(pt[1]):
+                    result = True
+        return result
+
+
+def data_collection(prefix):
+    data_collection = qmo.DataCollection()
+    path_template = data_collection.get_path_template()
+    path_template.directory = "/data/visitor/mx0000/20230101/RAW_DATA"
+    path_template.base_prefix = prefix
+    path_template.run_number = 1
+    path_template.start_num = 1
+    path_template.num_files = 100
+    return data_collection
+
+
+def build_queue(queue_model, tasks_num):
+    """Time the creation of tasks_num tasks"""
+    root = queue_model.get_model_root()
+    templates = {}
+    elapsed = 0
+    for sample_index in range(tasks_num // TASKS_PER_SAMPLE):
+        sample = qmo.Sample()
+        queue_model.add_child(root, sample)
+        group = qmo.TaskGroup()
+        queue_model.add_child(sample, group)
+        for task_index in range(TASKS_PER_SAMPLE):
+            prefix = "sample%d-%d" % (sample_index, task_index % PREFIXES_PER_SAMPLE)
+            template = templates.setdefault(prefix, data_collection(prefix))
+            start = time.perf_counter()
+            task = queue_model.copy_node(template)
+            assert not queue_model.check_for_path_collisions(task.get_path_template())
+            queue_model.add_child(group, task)
+            assert queue_model.get_node(task._node_id) is task
+            elapsed += time.perf_counter() - start
+    return elapsed
+
+
+def main():
+    for tasks_num in (1000, 2500, 10000):
+        results = []
+        for queue_model_class in (FormerQueueModel, QueueModel):
+            if queue_model_class is FormerQueueModel and tasks_num > 2500:
+                results.append(None)
+                continue
+            results.append(build_queue(queue_model_class("queue_model"), tasks_num))
+        if results[0] is None:
+            print(
+                "%5d tasks: former (skipped), indexed %6.2f s" % (tasks_num, results[1])
+            )
+        else:
+            print(
+                "%5d tasks: former %6.2f s, indexed %6.2f s (x%.0f)"
+                % (tasks_num, results[0], results[1], results[0] / results[1])
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""Compare the signal dispatcher with the former pydispatch based one
+
+A motor-like sender emits valueChanged, with receivers connected to it,
+to Any signal and from Any sender, as in a loaded beamline.
+
+Usage, from the repository root: python -m test.benchmarks.signal_dispatch
+"""
+
+import timeit
+
+from pydispatch import dispatcher as pydispatcher
+
+from mxcubecore.dispatcher import SignalDispatcher, robustapply
+
+
+class Sender:
+    pass
+
+
+class Receiver:
+    def __init__(self):
+        self.count = 0
+
+    def value_changed(self, value):
+        self.count += 1
+
+    def value_changed_with_sender(self, value, sender=None):
+        self.count += 1
+
+
+def setup(bus, any_value, receivers=10, other_senders=200):
+    """Connect receivers, and other senders to fill the connection tables"""
+    sender = Sender()
+    keep = [sender]
+    for index in range(receivers):
+        receiver = Receiver()
+        keep.append(receiver)
+        if index % 2:
+            slot = receiver.value_changed
+        else:
+            slot = receiver.value_changed_with_sender
+        bus.connect(slot, "valueChanged", sender)
+    receiver = Receiver()
+    keep.append(receiver)
+    bus.connect(receiver.value_changed, "stateChanged", any_value)
+    for _ in range(other_senders):
+        other = Sender()
+        keep.append(other)
+        bus.connect(receiver.value_changed, "valueChanged", other)
+    return sender, keep
+
+
+def main():
+    # the robustapply patch installed by mxcubecore.dispatcher is in place
+    assert robustapply.robustApply.__name__ != "robustApply"
+    number = 20000
+    for receivers in (1, 10, 50):
+        results = []
+        for bus, any_value in (
+            (pydispatcher, pydispatcher.Any),
+            (SignalDispatcher(), SignalDispatcher.Any),
+        ):
+            sender, keep = setup(bus, any_value, receivers)
+            elapsed = min(
+                timeit.repeat(
+                    lambda: bus.send("valueChanged", sender, 1.0),
+                    number=number,
+                    repeat=3,
+                )
+            )
+            assert all(receiver.count >= number for receiver in keep[1 : receivers + 1])
+            results.append(number / elapsed)
+        print(
+            "%3d receivers: pydispatch %8.0f signals/s, dispatcher %8.0f signals/s"
+            " (x%.1f)" % (receivers, results[0], results[1], results[1] / results[0])
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+import time
+
+import gevent
+import gevent.event
+import pytest
+
+from mxcubecore.HardwareObjects.abstract.AbstractCollect import (
+    AbstractCollect,
+    PrepareStep,
+)
+
+
+@pytest.fixture
+def collect():
+    collect = AbstractCollect("collect")
+    collect.prepare_timeout = 5
+    collect.current_dc_parameters = {}
+    return collect
+
+
+def test_prepare_hardware(collect):
+    events = []
+    transmission_started = gevent.event.Event()
+
+    def move(name, duration):
+        events.append(("start", name))
+        if name == "transmission":
+            transmission_started.set()
+        gevent.sleep(duration)
+        events.append(("end", name))
+
+    def centre():
+        events.append(("start", "centring"))
+        # done along with the moves depending on the energy
+        transmission_started.wait(1)
+        events.append(("end", "centring"))
+
+    steps = [
+        PrepareStep("energy", "energy", move, ("energy", 0.05), ()),
+        PrepareStep(
+            "transmission", "transmission", move, ("transmission", 0.05), ("energy",)
+        ),
+        PrepareStep(
+            "resolution", "resolution", move, ("resolution", 0.05), ("energy",)
+        ),
+        PrepareStep("centring", "centring", centre, (), ()),
+    ]
+    collect.prepare_hardware(steps)
+
+    def index(event, name):
+        return events.index((event, name))
+
+    # energy, then transmission and resolution, along with the centring
+    assert index("start", "centring") < index("end", "energy")
+    assert index("end", "energy") < index("start", "transmission")
+    assert index("end", "energy") < index("start", "resolution")
+    assert index("start", "transmission") < index("end", "resolution")
+    assert index("start", "resolution") < index("end", "transmission")
+    assert index("start", "transmission") < index("end", "centring")
+    durations = collect.current_dc_parameters["prepare_durations"]
+    assert set(durations) == {
+        "energy",
+        "transmission",
+        "resolution",
+        "centring",
+        "total",
+    }
+    assert all(duration <= durations["total"] for duration in durations.values())
+
+
+def test_prepare_hardware_failure(collect):
+    def fail():
+        gevent.sleep(0.05)
+        raise ValueError("energy out of range")
+
+    moves = []
+    steps = [
+        PrepareStep("energy", "energy", fail, (), ()),
+        PrepareStep(
+            "resolution", "resolution", moves.append, ("resolution",), ("energy",)
+        ),
+        PrepareStep("centring", "centring", gevent.sleep, (10,), ()),
+    ]
+    start_time = time.time()
+    with pytest.raises(ValueError):
+        collect.prepare_hardware(steps)
+    assert time.time() - start_time < 1
+    assert not moves
+
+    steps = [PrepareStep("centring", "centring", gevent.sleep, (10,), ())]
+    with pytest.raises(RuntimeError):
+        collect.prepare_hardware(steps, timeout=0.1)
@@ -0,0 +1,79 @@
+import os
+import time
+
+import pytest
+
+from mxcubecore import HardwareObjectFileParser
+from mxcubecore import HardwareRepository as HWR
+from mxcubecore.utils import config_cache
+
+XML = """<object>
+  <username>Test object</username>
+  <channel type="tango" name="chan" polling="1000">Attr</channel>
+</object>
+"""
+
+YAML = """
+_initialise_class:
+  class: mxcubecore.HardwareObjects.Beamline.Beamline
+run_number: 1
+"""
+
+
+@pytest.fixture
+def cache_dir(tmp_path):
+    directory = str(tmp_path / "cache")
+    config_cache.set_cache_directory(directory)
+    yield directory
+    config_cache.set_cache_directory(None)
+
+
+def write(path, content):
+    with open(path, "w") as config_file:
+        config_file.write(content)
+    return str(path)
+
+
+def test_xml_events_replay(tmp_path, cache_dir):
+    xml_path = write(tmp_path / "object.xml", XML)
+    cached = HardwareObjectFileParser.parse_string(XML, "/object", xml_path)
+    config_cache.set_cache_directory(None)
+    direct = HardwareObjectFileParser.parse_string(XML, "/object")
+    assert cached.get_property("username") == direct.get_property("username")
+    assert cached.name() == direct.name()
+
+
+def test_yaml_hit_and_invalidation(tmp_path, cache_dir):
+    yaml_path = write(tmp_path / "config.yml", YAML)
+    hits = config_cache.get_statistics()["hits"]
+
+    first = config_cache.load_yaml(yaml_path, HWR.yaml)
+    assert first["run_number"] == 1
+    # the caller may modify the returned data
+    first.pop("_initialise_class")
+
+    second = config_cache.load_yaml(yaml_path, HWR.yaml)
+    assert "_initialise_class" in second
+    assert config_cache.get_statistics()["hits"] == hits + 1
+    assert [entry[3] for entry in config_cache.inspect()] == ["valid"]
+
+    # modified file: the entry is stale and parsed again
+    time.sleep(0.01)
+    write(yaml_path, YAML.replace("run_number: 1", "run_number: 2"))
+    assert [entry[3] for entry in config_cache.inspect()] == ["stale"]
+    assert config_cache.load_yaml(yaml_path, HWR.yaml)["run_number"] == 2
+
+    # touched file with the same content: still a hit
+    os.utime(yaml_path, (time.time() + 10, time.time() + 10))
+    hits = config_cache.get_statistics()["hits"]
+    assert config_cache.load_yaml(yaml_path, HWR.yaml)["run_number"] == 2
+    assert config_cache.get_statistics()["hits"] == hits + 1
+
+
+def test_warm_and_clear(tmp_path, cache_dir):
+    write(tmp_path / "object.xml", XML)
+    write(tmp_path / "config.yml", YAML)
+    assert config_cache.main(["warm", str(tmp_path), "--cache-dir", cache_dir]) == 0
+    assert sorted(entry[1] for entry in config_cache.inspect()) == ["xml", "yaml"]
+    config_cache.clear()
+    assert config_cache.inspect() == []
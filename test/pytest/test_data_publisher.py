@@ -0,0 +1,153 @@
+import json
+import math
+
+from mxcubecore.HardwareObjects.DataPublisher import (
+    DataBuffer,
+    DataPublisher,
+    FrameType,
+    PlotDim,
+)
+
+
+class FakeRedis:
+    """Strings and lists of a redis database, counting the round trips"""
+
+    def __init__(self):
+        self.values = {}
+        self.round_trips = 0
+        self.failing = False
+
+    def get(self, key):
+        self.round_trips += 1
+        return self.values.get(key)
+
+    def set(self, key, value):
+        self.round_trips += 1
+        self.values[key] = value
+
+    def delete(self, key):
+        self.round_trips += 1
+        self.values.pop(key, None)
+
+    def rpush(self, key, *values):
+        self.values.setdefault(key, []).extend(str(value) for value in values)
+
+    def ltrim(self, key, start, end):
+        values = self.values[key]
+        start = max(len(values) + start, 0) if start < 0 else start
+        self.values[key] = values[start : None if end == -1 else end + 1]
+
+    def lrange(self, key, start, end):
+        self.round_trips += 1
+        return self.values.get(key, [])[start : None if end == -1 else end + 1]
+
+    def pipeline(self, transaction=True):
+        pipeline = FakePipeline(self)
+        pipeline.failing = self.failing
+        return pipeline
+
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.commands = []
+        self.failing = False
+
+    def __getattr__(self, name):
+        return lambda *args: self.commands.append((name, args))
+
+    def execute(self):
+        self.redis.round_trips += 1
+        if self.failing:
+            raise ConnectionError("redis down")
+        for name, args in self.commands:
+            getattr(self.redis, name)(*args)
+
+
+def message(_id, frame_type, data=None):
+    return {
+        "channel": "HWR_DP_NEW_DATA_POINT_%s" % _id,
+        "data": json.dumps({"type": frame_type.value, "data": data or {}}),
+    }
+
+
+def test_data_buffer():
+    buffer = DataBuffer(4)
+    assert buffer.get() == {"x": [], "y": []}
+    for index in range(6):
+        buffer.append({"x": index, "y": 10 * index})
+
+    # the 4 last points are kept
+    assert len(buffer) == 4
+    assert buffer.get() == {"x": [2, 3, 4, 5], "y": [20, 30, 40, 50]}
+    assert buffer.get(1, 3) == {"x": [3, 4], "y": [30, 40]}
+    assert buffer.get(-1) == {"x": [5], "y": [50]}
+
+    buffer = DataBuffer(4, PlotDim.TWO_D.value)
+    buffer.append({"x": 1, "y": 2})
+    assert math.isnan(buffer.get()["z"][0])
+
+
+def test_data_publisher():
+    publisher = DataPublisher("data_publisher")
+    publisher._r = FakeRedis()
+    publisher._buffer_size = 50
+    publisher._flush_size = 10
+    publisher._flush_interval = 60
+    publisher.register("scan", "SCAN", "diode")
+    events = []
+    publisher.connect("end", lambda desc: events.append(desc))
+
+    active_source_desc = {}
+    publisher._handle_message(message("scan", FrameType.START), active_source_desc)
+    round_trips = publisher._r.round_trips
+    for index in range(75):
+        publisher._handle_message(
+            message("scan", FrameType.DATA, {"x": index, "y": 2 * index}),
+            active_source_desc,
+        )
+    # one pipeline per flush_size points
+    assert publisher._r.round_trips - round_trips == 7
+    publisher._handle_message(message("scan", FrameType.STOP), active_source_desc)
+
+    expected = {"x": list(range(25, 75)), "y": list(range(50, 150, 2))}
+    assert publisher.get_data("scan") == expected
+    assert events[0]["values"] == expected
+    assert publisher.get_data("scan", 10, 12) == {"x": [35, 36], "y": [70, 72]}
+
+    # without the local buffer, from redis
+    publisher._buffers.clear()
+    assert publisher.get_data("scan") == expected
+    assert publisher.get_data("scan", 10, 12) == {"x": [35, 36], "y": [70, 72]}
+    assert publisher.get_data("scan", -2) == {"x": [73, 74], "y": [146, 148]}
+
+
+def test_data_publisher_redis_error(caplog):
+    publisher = DataPublisher("data_publisher")
+    publisher._r = FakeRedis()
+    publisher._buffer_size = 50
+    publisher._flush_size = 10
+    publisher._flush_interval = 60
+    publisher.register("scan", "SCAN", "diode")
+
+    active_source_desc = {}
+    publisher._handle_message(message("scan", FrameType.START), active_source_desc)
+    publisher._r.failing = True
+    for index in range(30):
+        publisher._handle_message(
+            message("scan", FrameType.DATA, {"x": index, "y": 2 * index}),
+            active_source_desc,
+        )
+    # the error is logged once, the points are kept
+    assert caplog.text.count("Could not write data to redis") == 1
+    assert len(publisher._pending["scan"]) == 30
+
+    publisher._r.failing = False
+    publisher._handle_message(message("scan", FrameType.STOP), active_source_desc)
+    assert publisher._flush_task is None and not publisher._pending
+    publisher._buffers.clear()
+    assert publisher.get_data("scan") == {
+        "x": list(range(30)),
+        "y": list(range(0, 60, 2)),
+    }
+    assert "after 21 failed attempts" in caplog.text
@@ -0,0 +1,101 @@
+import gc
+
+from mxcubecore.dispatcher import DispatcherKeyError, SignalDispatcher
+
+
+class Sender:
+    pass
+
+
+class Receiver:
+    def __init__(self):
+        self.received = []
+
+    def slot(self, value):
+        self.received.append(value)
+
+    def slot_with_sender(self, value, sender=None):
+        self.received.append((value, sender))
+
+    def slot_with_keywords(self, *args, **kwargs):
+        self.received.append((args, kwargs["signal"]))
+
+    def failing_slot(self, value):
+        raise RuntimeError("receiver error")
+
+
+def test_send_arguments():
+    bus = SignalDispatcher()
+    sender = Sender()
+    receiver = Receiver()
+    bus.connect(receiver.slot, "valueChanged", sender)
+    bus.connect(receiver.slot_with_sender, "valueChanged", sender)
+    bus.connect(receiver.slot_with_keywords, "valueChanged", sender)
+    # connecting again moves the receiver to the end, but does not call twice
+    bus.connect(receiver.slot, "valueChanged", sender)
+
+    bus.send("valueChanged", sender, 1)
+    bus.send("stateChanged", sender, 2)
+    assert receiver.received == [(1, sender), ((1,), "valueChanged"), 1]
+
+
+def test_any_sender_and_signal():
+    bus = SignalDispatcher()
+    sender = Sender()
+    receiver = Receiver()
+    bus.connect(receiver.slot, "valueChanged", bus.Any)
+    bus.connect(receiver.slot_with_sender, bus.Any, sender)
+
+    bus.send("valueChanged", sender, 1)
+    bus.send("valueChanged", Sender(), 2)
+    bus.send("stateChanged", sender, 3)
+    assert receiver.received == [(1, sender), 1, 2, (3, sender)]
+
+
+def test_exceptions_do_not_stop_the_chain(monkeypatch):
+    errors = []
+    monkeypatch.setattr("sys.excepthook", lambda *exc_info: errors.append(exc_info))
+    bus = SignalDispatcher()
+    sender = Sender()
+    receiver = Receiver()
+    bus.connect(receiver.failing_slot, "valueChanged", sender)
+    bus.connect(receiver.slot, "valueChanged", sender)
+
+    responses = bus.send("valueChanged", sender, 1)
+    assert receiver.received == [1]
+    assert len(responses) == 2
+    assert errors[0][0] is RuntimeError
+
+
+def test_disconnect():
+    bus = SignalDispatcher()
+    sender = Sender()
+    receiver = Receiver()
+    bus.connect(receiver.slot, "valueChanged", sender)
+    bus.disconnect(receiver.slot, "valueChanged", sender)
+    bus.send("valueChanged", sender, 1)
+    assert receiver.received == []
+    try:
+        bus.disconnect(receiver.slot, "valueChanged", sender)
+    except DispatcherKeyError:
+        pass
+    else:
+        assert False, "disconnecting twice must fail"
+
+
+def test_weak_references():
+    bus = SignalDispatcher()
+    sender = Sender()
+    receiver = Receiver()
+    other = Receiver()
+    bus.connect(receiver.slot, "valueChanged", sender)
+    bus.connect(other.slot, "valueChanged", sender)
+
+    del receiver
+    gc.collect()
+    assert bus.get_receivers(sender, "valueChanged") == [other.slot]
+
+    del sender
+    gc.collect()
+    assert not bus._connections
+    assert not bus._senders
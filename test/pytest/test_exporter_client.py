@@ -0,0 +1,156 @@
+import gevent
+import gevent.server
+import pytest
+
+from mxcubecore.Command import Exporter
+from mxcubecore.Command.exporter.ExporterClient import ExporterClient
+from mxcubecore.Command.exporter.StandardClient import (
+    PROTOCOL,
+    StreamFramer,
+    TimeoutError,
+)
+
+
+def frame(msg):
+    return b"\x02" + msg + b"\x03"
+
+
+class FakeExporterServer:
+    """Exporter server replying to READ requests after a delay.
+
+    Tagged requests get tagged replies, out of order, if tagged is True.
+    """
+
+    def __init__(self, tagged, lost_probes=0):
+        self.tagged = tagged
+        # number of pipelined requests probes left without reply
+        self.lost_probes = lost_probes
+        self.properties = {"A": "1", "B": "2", "C": "3", "Slow": "4"}
+        self.server = gevent.server.StreamServer(("127.0.0.1", 0), self.handle)
+        self.server.start()
+        self.port = self.server.server_port
+
+    def reply(self, sock, tag, request):
+        cmd, _, name = request.partition(" ")
+        if cmd == "READ":
+            gevent.sleep(1 if name == "Slow" else 0.1)
+            msg = "RET:" + self.properties[name]
+        else:
+            msg = "RET:fake"
+        if tag is not None:
+            msg = tag + " " + msg
+        sock.sendall(frame(msg.encode()))
+
+    def handle(self, sock, _):
+        framer = StreamFramer()
+        while True:
+            data = sock.recv(4096)
+            if not data:
+                break
+            for request in framer.feed(data):
+                request = request.decode()
+                tag = None
+                if request[:4].isdigit() and request[4:5] == " ":
+                    tag, request = request[:4], request[5:]
+                    if request == "NAME" and self.lost_probes:
+                        self.lost_probes -= 1
+                        continue
+                    if not self.tagged:
+                        # the server does not know about tags
+                        sock.sendall(frame(b"ERR:unknown command"))
+                        continue
+                if self.tagged:
+                    gevent.spawn(self.reply, sock, tag, request)
+                else:
+                    self.reply(sock, tag, request)
+
+    def stop(self):
+        self.server.stop()
+
+
+@pytest.mark.parametrize("tagged", [True, False])
+def test_read_properties(tagged):
+    server = FakeExporterServer(tagged)
+    client = ExporterClient("127.0.0.1", server.port, PROTOCOL.STREAM, 3, 1, True)
+    try:
+        start = gevent.time.time()
+        assert client.read_properties(["A", "B", "C"]) == ["1", "2", "3"]
+        elapsed = gevent.time.time() - start
+        assert client.is_pipelined() == tagged
+        if tagged:
+            assert elapsed < 0.25
+        else:
+            assert elapsed >= 0.3
+    finally:
+        client.disconnect()
+        server.stop()
+
+
+def test_read_properties_error():
+    server = FakeExporterServer(True)
+    client = ExporterClient("127.0.0.1", server.port, PROTOCOL.STREAM, 3, 1, True)
+    try:
+        assert client.check_pipeline_support()
+        # the error is raised, not returned as a None reply
+        with pytest.raises(TimeoutError):
+            client.read_properties(["A", "Slow"], 0.3)
+    finally:
+        client.disconnect()
+        server.stop()
+
+
+def test_pipelined_timeout():
+    server = FakeExporterServer(True)
+    client = ExporterClient("127.0.0.1", server.port, PROTOCOL.STREAM, 3, 1, True)
+    try:
+        slow = gevent.spawn(client.read_property, "Slow", 0.3)
+        # other requests are not blocked by the slow one
+        assert client.read_property("A") == "1"
+        slow.join()
+        assert isinstance(slow.exception, TimeoutError)
+    finally:
+        client.disconnect()
+        server.stop()
+
+
+def test_pipeline_probe_retried():
+    server = FakeExporterServer(True, lost_probes=1)
+    client = ExporterClient("127.0.0.1", server.port, PROTOCOL.STREAM, 0.3, 1, True)
+    try:
+        # no reply to the probe: serialized request, probed again next time
+        assert client.read_property("A") == "1"
+        assert not client.is_pipelined()
+        assert client.read_property("B") == "2"
+        assert client.is_pipelined()
+    finally:
+        client.disconnect()
+        server.stop()
+
+
+def test_pipeline_probe_attempts():
+    server = FakeExporterServer(True, lost_probes=100)
+    client = ExporterClient("127.0.0.1", server.port, PROTOCOL.STREAM, 0.3, 1, True)
+    client.PIPELINE_PROBE_ATTEMPTS = 2
+    try:
+        assert client.read_property("A") == "1"
+        assert client.read_property("B") == "2"
+        assert server.lost_probes == 98
+        # serialized for good, no more probes
+        assert client.read_property("C") == "3"
+        assert server.lost_probes == 98
+        assert not client.is_pipelined()
+        assert client.check_pipeline_support() is False
+    finally:
+        client.disconnect()
+        server.stop()
+
+
+def test_start_exporter_pipelined_conflict(monkeypatch, caplog):
+    monkeypatch.setattr(Exporter, "EXPORTER_CLIENTS", {})
+    client = Exporter.start_exporter("127.0.0.1", 9001, pipelined=True)
+    assert Exporter.start_exporter("127.0.0.1", 9001, pipelined=True) is client
+    assert not caplog.records
+
+    assert Exporter.start_exporter("127.0.0.1", 9001) is client
+    assert client.pipelined
+    assert "pipelined=False ignored" in caplog.text
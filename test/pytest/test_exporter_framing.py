@@ -0,0 +1,39 @@
+from mxcubecore.Command.exporter.StandardClient import StreamFramer
+
+
+def frame(msg):
+    return b"\x02" + msg + b"\x03"
+
+
+def test_single_and_multiple_frames():
+    framer = StreamFramer()
+    assert framer.feed(frame(b"RET:1")) == [b"RET:1"]
+    assert framer.feed(frame(b"a") + frame(b"b") + frame(b"")) == [b"a", b"b", b""]
+
+
+def test_frame_split_over_chunks():
+    framer = StreamFramer()
+    data = frame(b"EVT:MotorPositions:" + b"1.0," * 5000)
+    frames = []
+    for i in range(0, len(data), 4096):
+        frames.extend(framer.feed(data[i : i + 4096]))
+    assert frames == [data[1:-1]]
+
+
+def test_garbage_and_restarted_frames():
+    framer = StreamFramer()
+    # bytes outside frames and unmatched ETX are ignored
+    assert framer.feed(b"xx\x03yy" + frame(b"ok") + b"zz") == [b"ok"]
+    # a STX inside a frame restarts it
+    assert framer.feed(b"\x02lost\x02kept\x03") == [b"kept"]
+    assert framer.feed(b"\x02lo") == []
+    assert framer.feed(b"st\x02ke") == []
+    assert framer.feed(b"pt\x03") == [b"kept"]
+
+
+def test_max_size():
+    framer = StreamFramer(max_size=10)
+    assert framer.feed(b"\x02" + b"x" * 20) == []
+    assert not framer.receiving
+    # the end of the dropped frame is ignored
+    assert framer.feed(b"xx\x03" + frame(b"ok")) == [b"ok"]
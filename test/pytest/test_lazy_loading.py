@@ -0,0 +1,87 @@
+"""Tests of the deferred loading of modules and contained objects"""
+
+import os
+import subprocess
+import sys
+
+from mxcubecore import HardwareRepository as HWR
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+
+# Budget for a cold import of mxcubecore.HardwareRepository (microseconds).
+# The import takes about 0.2 s; this leaves room for slow machines.
+IMPORT_TIME_BUDGET = 1500000
+
+# Modules that must only be imported when a configured object needs them
+HEAVY_MODULES = ("scipy", "matplotlib", "tango", "PyTango", "lucid3", "cv2")
+
+BEAMLINE_CONFIG = """\
+_initialise_class:
+  class: mxcubecore.HardwareObjects.Beamline.Beamline
+_objects:
+  !!omap
+  - transmission: transmission-mockup.xml
+  - xrf_spectrum: xrf-spectrum-mockup.xml
+  - mock_procedure: procedure-mockup.yml
+_deferred_roles:
+  - xrf_spectrum
+  - mock_procedure
+"""
+
+
+def test_cold_import_time():
+    output = subprocess.run(
+        [
+            sys.executable,
+            "-X",
+            "importtime",
+            "-c",
+            "import mxcubecore.HardwareRepository",
+        ],
+        cwd=ROOT_DIR,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stderr
+
+    imported = {}
+    for line in output.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            _, cumulative, name = line.split("|")
+            if cumulative.strip().isdigit():
+                imported[name.strip()] = int(cumulative)
+
+    top_level = set(name.split(".")[0] for name in imported)
+    assert not top_level.intersection(HEAVY_MODULES)
+    assert imported["mxcubecore.HardwareRepository"] < IMPORT_TIME_BUDGET
+
+
+def test_deferred_roles(tmp_path):
+    with open(tmp_path / "beamline_config.yml", "w") as fp0:
+        fp0.write(BEAMLINE_CONFIG)
+    hwr_path = ":".join(
+        (
+            str(tmp_path),
+            os.path.join(ROOT_DIR, "mxcubecore/configuration/mockup/test"),
+            os.path.join(ROOT_DIR, "mxcubecore/configuration/mockup"),
+        )
+    )
+    HWR._instance = HWR.beamline = None
+    HWR.init_hardware_repository(hwr_path)
+    HWR.get_hardware_repository().connect()
+    beamline = HWR.beamline
+
+    assert beamline.transmission is not None
+    assert set(beamline.deferred_roles) == {"xrf_spectrum", "mock_procedure"}
+    assert beamline.all_objects_by_role["xrf_spectrum"] is None
+    assert "xrf-spectrum-mockup" not in HWR.get_hardware_repository().hardware_objects
+
+    # loaded on first access, and only once
+    xrf_spectrum = beamline.xrf_spectrum
+    assert xrf_spectrum is not None
+    assert beamline.xrf_spectrum is xrf_spectrum
+    assert beamline.get_id(xrf_spectrum) == "xrf_spectrum"
+    assert beamline.deferred_roles == ("mock_procedure",)
+
+    assert beamline.mock_procedure is not None
+    assert beamline.deferred_roles == ()
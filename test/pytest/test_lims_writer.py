@@ -0,0 +1,253 @@
+import os
+import time
+
+import gevent
+import pytest
+
+from mxcubecore.HardwareObjects.abstract.AbstractCollect import AbstractCollect
+from mxcubecore.HardwareObjects.mockup.ISPyBClientMockup import ISPyBClientMockup
+from mxcubecore.utils.lims_writer import LimsWriteQueue
+
+
+class FlakyLims(ISPyBClientMockup):
+    """LIMS mockup, slow, and failing the first calls"""
+
+    def __init__(self, latency=0.0, failures=0):
+        super().__init__("lims")
+        self.latency = latency
+        self.failures = failures
+        self.calls = []
+        self.collection_ids = 0
+
+    def _call(self, method, *args):
+        gevent.sleep(self.latency)
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("LIMS unavailable")
+        self.calls.append((method,) + args)
+
+    def store_data_collection(self, mx_collection, bl_config=None):
+        self._call("store_data_collection", dict(mx_collection))
+        self.collection_ids += 1
+        return self.collection_ids, None
+
+    def update_data_collection(self, mx_collection, wait=False):
+        self._call("update_data_collection", dict(mx_collection))
+
+    def update_bl_sample(self, bl_sample):
+        self._call("update_bl_sample", dict(bl_sample))
+
+    def store_image(self, image_dict):
+        self._call("store_image", dict(image_dict))
+        return 10
+
+
+def test_write_behind_order_and_coalescing():
+    lims = FlakyLims(latency=0.05)
+    writer = LimsWriteQueue(lims)
+    params = {"status": "Running"}
+
+    store = writer.submit("store_data_collection", params, key="dc1")
+    # submitted at once, made later
+    assert lims.calls == []
+    params["status"] = "Collecting"
+    writer.submit("update_data_collection", params, key="dc1", coalesce=True)
+    writer.submit("update_bl_sample", {"code": "A1"}, key="dc1")
+    params["status"] = "Data collection successful"
+    first_update = writer.submit(
+        "update_data_collection", params, key="dc1", coalesce=True
+    )
+    params["images"] = 100
+    last_update = writer.submit(
+        "update_data_collection", params, key="dc1", coalesce=True
+    )
+    assert last_update is first_update
+    assert writer.coalesced_num == 1
+
+    assert store.wait(1) and store.result == (1, None)
+    assert writer.flush(1)
+    assert [call[0] for call in lims.calls] == [
+        "store_data_collection",
+        "update_data_collection",
+        "update_bl_sample",
+        "update_data_collection",
+    ]
+    # values at submission, and the collection id once stored
+    assert lims.calls[0][1] == {"status": "Running"}
+    assert lims.calls[1][1] == {"status": "Collecting", "collection_id": 1}
+    assert lims.calls[3][1] == {
+        "status": "Data collection successful",
+        "images": 100,
+        "collection_id": 1,
+    }
+
+
+def test_write_behind_retry_and_spool(tmp_path):
+    spool_directory = str(tmp_path / "spool")
+    lims = FlakyLims(failures=2)
+    writer = LimsWriteQueue(lims, spool_directory, retry_delay=0.05)
+    store = writer.submit("store_data_collection", {"status": "Running"}, key="dc1")
+    writer.submit("update_bl_sample", {"code": "A1"}, key="sample")
+    # writes of other keys are not held by the failing writes
+    writer.submit("update_bl_sample", {"code": "B1"}, key="other")
+
+    assert store.wait(1)
+    assert store.attempts == 2
+    assert writer.flush(1)
+    assert len(lims.calls) == 3
+    assert lims.calls[0] == ("update_bl_sample", {"code": "B1"})
+    assert os.listdir(spool_directory) == []
+
+    # LIMS down: the writes are kept, the session ends
+    lims = FlakyLims(failures=100)
+    writer = LimsWriteQueue(lims, spool_directory, max_attempts=2, retry_delay=0.01)
+    store = writer.submit("store_data_collection", {"status": "Running"}, key="dc2")
+    writer.submit("update_data_collection", {"status": "Done"}, key="dc2")
+    assert not writer.flush(1)
+    assert writer.failed_writes == [store]
+    assert len(writer.pending_writes) == 1
+    assert len(os.listdir(spool_directory)) == 2
+
+    # the next session makes them
+    lims = FlakyLims()
+    writer = LimsWriteQueue(lims, spool_directory)
+    assert writer.recover() == 2
+    assert writer.flush(1)
+    assert lims.calls == [
+        ("store_data_collection", {"status": "Running"}),
+        ("update_data_collection", {"status": "Done", "collection_id": 1}),
+    ]
+    assert os.listdir(spool_directory) == []
+
+
+def test_collect_write_behind(beamline, monkeypatch, tmp_path):
+    lims = FlakyLims(latency=0.2)
+    monkeypatch.setitem(beamline._objects, "lims", lims)
+    collect = AbstractCollect("collect")
+    collect.lims_writer = LimsWriteQueue(lims, str(tmp_path))
+    collect.lims_store_timeout = 0.05
+    collect.get_machine_fill_mode = lambda: "Uniform"
+    collect.current_dc_parameters = {"in_interleave": False}
+    collect.current_lims_sample = {"code": "A1"}
+
+    # the LIMS is slower than lims_store_timeout: collecting goes on
+    start_time = time.time()
+    collect.store_data_collection_in_lims()
+    collect.store_sample_info_in_lims()
+    assert time.time() - start_time < 0.15
+    assert collect.collection_id is None
+
+    assert collect.flush_lims_writes(1)
+    assert [call[0] for call in lims.calls] == [
+        "store_data_collection",
+        "update_bl_sample",
+    ]
+    assert lims.calls[0][1]["synchrotronMode"] == "Uniform"
+    # the collection id is set once the data collection is stored
+    assert collect.collection_id == 1
+    assert collect.current_dc_parameters["collection_id"] == 1
+
+
+class FakeMotor:
+    def getMotorMnemonic(self):
+        return "phi"
+
+
+def test_collect_write_behind_slow_store(beamline, monkeypatch, tmp_path):
+    lims = FlakyLims(latency=0.2)
+    monkeypatch.setitem(beamline._objects, "lims", lims)
+    collect = AbstractCollect("collect")
+    collect.lims_writer = LimsWriteQueue(lims, str(tmp_path))
+    collect.lims_store_timeout = 0.05
+    collect.get_machine_fill_mode = lambda: "Uniform"
+    collect.get_machine_current = lambda: 200.0
+    collect.get_machine_message = lambda: "Beam"
+    collect.current_dc_parameters = {
+        "in_interleave": False,
+        "motors": {FakeMotor(): 10.0, "kappa": 0.0},
+        "fileinfo": {
+            "directory": "/data",
+            "template": "lyso_1_%05d.cbf",
+            "archive_directory": None,
+        },
+    }
+
+    # made before the data collection is stored: sent with its id
+    collect.store_data_collection_in_lims()
+    assert collect.store_image_in_lims(1) is None
+    collect.update_lims_with_workflow(5, None)
+    assert collect.collection_id is None
+    assert collect.flush_lims_writes(1)
+    assert [call[0] for call in lims.calls] == [
+        "store_data_collection",
+        "store_image",
+        "update_data_collection",
+    ]
+    assert lims.calls[0][1]["motors"] == {"phi": 10.0, "kappa": 0.0}
+    assert lims.calls[1][1]["dataCollectionId"] == 1
+    assert lims.calls[2][1]["collection_id"] == 1
+    assert lims.calls[2][1]["workflow_id"] == 5
+
+    # made after: sent at once, with the collection id
+    assert collect.collection_id == 1
+    assert collect.store_image_in_lims(2) == 10
+    assert lims.calls[-1][1]["dataCollectionId"] == 1
+
+
+def test_write_behind_plain_data():
+    writer = LimsWriteQueue(FlakyLims())
+    with pytest.raises(TypeError):
+        writer.submit("update_data_collection", {"motors": {FakeMotor(): 10.0}})
+    with pytest.raises(TypeError):
+        writer.submit("update_bl_sample", {"code": "A1", "motor": FakeMotor()})
+    assert writer.pending_writes == []
+
+
+class SwallowingLims(FlakyLims):
+    """LIMS mockup with the contract of ISPyBClient.store_data_collection"""
+
+    def store_data_collection(self, mx_collection, bl_config=None):
+        try:
+            return super().store_data_collection(mx_collection, bl_config)
+        except Exception:
+            # the error is logged, and no collection id returned
+            return (0, 0, 0)
+
+
+def test_write_behind_error_swallowed(beamline, monkeypatch, tmp_path):
+    lims = SwallowingLims(failures=1)
+    monkeypatch.setitem(beamline._objects, "lims", lims)
+    collect = AbstractCollect("collect")
+    collect.lims_writer = LimsWriteQueue(lims, str(tmp_path), retry_delay=0.05)
+    collect.lims_store_timeout = 1
+    collect.get_machine_fill_mode = lambda: "Uniform"
+    collect.current_dc_parameters = {"in_interleave": False}
+    collect.current_lims_sample = {"code": "A1"}
+
+    # the first store returns (0, 0, 0): retried, the id 0 is not used
+    collect.store_data_collection_in_lims()
+    collect.store_sample_info_in_lims()
+    assert collect.collection_id == 1
+    assert collect.flush_lims_writes(1)
+    assert [call[0] for call in lims.calls] == [
+        "store_data_collection",
+        "update_bl_sample",
+    ]
+    assert collect.lims_writer.failed_writes == []
+
+    # the LIMS is down: the write fails, the writes after it wait
+    lims.failures = 100
+    collect.lims_writer.max_attempts = 2
+    collect.current_dc_parameters = {"in_interleave": False}
+    collect.collection_id = None
+    collect.store_data_collection_in_lims()
+    collect.lims_writer.submit(
+        "update_data_collection",
+        {"status": "Done"},
+        key=collect.current_dc_parameters["lims_write_key"],
+    )
+    assert not collect.flush_lims_writes(1)
+    assert collect.collection_id is None
+    assert len(collect.lims_writer.failed_writes) == 1
+    assert len(collect.lims_writer.pending_writes) == 1
+    assert len(lims.calls) == 2
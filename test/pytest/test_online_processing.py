@@ -0,0 +1,158 @@
+import numpy
+
+from mxcubecore.HardwareObjects.abstract.AbstractOnlineProcessing import (
+    AbstractOnlineProcessing,
+    write_processing_files,
+)
+
+
+class MeshGrid:
+    """Zig-zag mesh, the lines along the columns"""
+
+    def __init__(self, num_cols, num_rows, first_image_num=1):
+        self.num_cols = num_cols
+        self.num_rows = num_rows
+        self.first_image_num = first_image_num
+        self.score = None
+
+    def get_col_row_from_image_serial(self, image_serial):
+        line, image = divmod(image_serial - self.first_image_num, self.num_cols)
+        if line % 2:
+            image = self.num_cols - 1 - image
+        return image, line
+
+    def get_motor_pos_from_col_row(self, col, row):
+        return {"col": col, "row": row}
+
+    def set_score(self, score):
+        self.score = score
+
+
+def online_processing(grid):
+    processing = AbstractOnlineProcessing("online_processing")
+    processing.grid = grid
+    images_num = grid.num_cols * grid.num_rows
+    processing.params_dict = {
+        "images_num": images_num,
+        "first_image_num": grid.first_image_num,
+        "steps_y": grid.num_rows,
+        "template": "/data/mesh_%d_%05d.cbf",
+        "run_number": 1,
+    }
+    processing.results_raw = {}
+    processing.results_aligned = {}
+    for key in ("score", "spots_num", "spots_resolution"):
+        processing.results_raw[key] = numpy.zeros(images_num)
+        processing.results_aligned[key] = numpy.zeros((grid.num_cols, grid.num_rows))
+    return processing
+
+
+def test_align_processing_results():
+    grid = MeshGrid(7, 5, first_image_num=3)
+    processing = online_processing(grid)
+    score = numpy.random.default_rng(0).uniform(0, 1, grid.num_cols * grid.num_rows)
+
+    # results arriving by batches
+    for start_index, end_index in ((0, 9), (10, 10), (11, 34)):
+        for key in processing.results_raw:
+            processing.results_raw[key][start_index : end_index + 1] = score[
+                start_index : end_index + 1
+            ]
+        processing.align_processing_results(start_index, end_index)
+        expected = numpy.zeros((grid.num_cols, grid.num_rows))
+        for index in range(end_index + 1):
+            col, row = grid.get_col_row_from_image_serial(index + 3)
+            expected[col, row] = score[index]
+        assert (processing.results_aligned["score"] == expected).all()
+
+    best_positions = processing.results_aligned["best_positions"]
+    assert [position["index"] for position in best_positions] == list(
+        numpy.argsort(-score)[:10]
+    )
+    for position in best_positions:
+        col, row = grid.get_col_row_from_image_serial(position["index_serial"])
+        assert position["col"] == col + 0.5
+        assert position["row"] == grid.num_rows - row - 0.5
+        assert position["cpos"] == {"col": position["col"], "row": position["row"]}
+        assert position["filename"] == "mesh_1_%05d.cbf" % position["index_serial"]
+
+
+def test_write_processing_files(tmp_path):
+    grid = MeshGrid(7, 5)
+    processing = online_processing(grid)
+    processing.results_raw["is"] = numpy.zeros(35)
+    processing.results_aligned["is"] = numpy.zeros((7, 5))
+    processing.results_raw["score"][:] = numpy.arange(35)
+    processing.align_processing_results(0, 34)
+    params_dict = dict(
+        processing.params_dict,
+        archive_directory=str(tmp_path),
+        cartography_path=str(tmp_path / "plot" / "online_processing_plot.png"),
+        csv_file_path=str(tmp_path / "online_processing_results.csv"),
+        lines_num=5,
+        steps_x=7,
+        xOffset=0.01,
+        yOffset=0.01,
+        reversing_rotation=True,
+    )
+    best_position = processing.results_aligned["best_positions"][0]
+    results_aligned = {
+        key: processing.results_aligned[key] for key in processing.results_raw
+    }
+
+    write_processing_files(
+        params_dict,
+        results_aligned,
+        processing.results_raw,
+        (best_position["col"], best_position["row"]),
+        (75, 75),
+    )
+    assert (tmp_path / "grid_overlay.png").stat().st_size > 0
+    assert (tmp_path / "plot" / "online_processing_plot.png").stat().st_size > 0
+    lines = (tmp_path / "online_processing_results.csv").read_text().splitlines()
+    assert lines[0] == "/data/mesh_%d_%05d.cbf,1,35,1,1,5,True,75,75"
+    assert lines[35] == "34,34.000000,0,0.000000"
+
+    # line scan
+    params_dict["lines_num"] = 1
+    params_dict["cartography_path"] = str(tmp_path / "line.png")
+    write_processing_files(
+        params_dict, processing.results_raw, processing.results_raw, None, (75, 75)
+    )
+    assert (tmp_path / "line.png").stat().st_size > 0
+
+
+def test_write_processing_files_failures(tmp_path):
+    grid = MeshGrid(7, 5)
+    processing = online_processing(grid)
+    processing.results_raw["is"] = numpy.zeros(35)
+    processing.results_aligned["is"] = numpy.zeros((7, 5))
+    processing.align_processing_results(0, 34)
+    (tmp_path / "not_a_directory").write_text("")
+    params_dict = dict(
+        processing.params_dict,
+        archive_directory=str(tmp_path),
+        cartography_path=str(tmp_path / "not_a_directory" / "plot.png"),
+        csv_file_path=str(tmp_path / "online_processing_results.csv"),
+        lines_num=5,
+        steps_x=7,
+        xOffset=0.01,
+        yOffset=0.01,
+        reversing_rotation=True,
+    )
+
+    # the plot cannot be saved: the overlay and the csv file are written
+    write_processing_files(
+        params_dict, processing.results_aligned, processing.results_raw, None, (75, 75)
+    )
+    assert (tmp_path / "grid_overlay.png").stat().st_size > 0
+    assert (tmp_path / "online_processing_results.csv").stat().st_size > 0
+
+    # unknown detector pixel size: the plot is written
+    params_dict["cartography_path"] = str(tmp_path / "plot.png")
+    params_dict["csv_file_path"] = str(tmp_path / "no_pixel_size.csv")
+    write_processing_files(
+        params_dict, processing.results_aligned, processing.results_raw, None, None
+    )
+    assert (tmp_path / "plot.png").stat().st_size > 0
+    assert not (tmp_path / "no_pixel_size.csv").exists()
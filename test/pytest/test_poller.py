@@ -0,0 +1,112 @@
+import gevent
+import numpy
+
+from mxcubecore import Poller
+
+
+class Source:
+    """Polled object, counting the calls and returning a settable value"""
+
+    def __init__(self, value=0):
+        self.value = value
+        self.calls = 0
+        self.values = []
+        self.errors = []
+
+    def read(self):
+        self.calls += 1
+        return self.value
+
+    def fail(self):
+        raise RuntimeError("cannot read")
+
+    def value_changed(self, value):
+        self.values.append(value)
+
+    def error(self, exception, poller_id):
+        self.errors.append((exception, poller_id))
+
+
+def wait_for(condition, timeout=3):
+    with gevent.Timeout(timeout):
+        while not condition():
+            gevent.sleep(0.01)
+
+
+def test_poll_deduplicates():
+    source = Source()
+    poller = Poller.poll(source.read, (), 200, source.value_changed, source.error)
+    try:
+        same = Poller.poll(source.read, (), 50, source.value_changed, source.error)
+        assert same is poller
+        assert poller.get_polling_period() == 50
+        assert Poller.get_poller(poller.get_id()) is poller
+    finally:
+        poller.stop()
+    assert Poller.get_poller(poller.get_id()) is None
+
+
+def test_value_changed_callback():
+    source = Source(1)
+    poller = Poller.poll(source.read, (), 10, source.value_changed, source.error)
+    try:
+        wait_for(lambda: source.values == [1])
+        source.value = 2
+        wait_for(lambda: source.values == [1, 2])
+        # value did not change: no new callback
+        calls = source.calls
+        wait_for(lambda: source.calls > calls + 2)
+        assert source.values == [1, 2]
+    finally:
+        poller.stop()
+
+
+def test_error_callback_and_restart():
+    source = Source()
+    poller = Poller.poll(source.fail, (), 10, source.value_changed, source.error)
+    wait_for(lambda: source.errors)
+    exception, poller_id = source.errors[0]
+    assert isinstance(exception, RuntimeError)
+    assert poller_id == poller.get_id()
+
+    new_poller = poller.restart(10)
+    try:
+        assert new_poller is not poller
+        assert poller.is_stopped()
+        assert Poller.get_poller(poller.get_id()) is None
+        wait_for(lambda: len(source.errors) == 2)
+    finally:
+        new_poller.stop()
+
+
+def test_shared_workers_and_statistics():
+    sources = [Source(i) for i in range(3 * Poller.MAX_WORKERS)]
+    pollers = [
+        Poller.poll(source.read, (), 10, source.value_changed, source.error)
+        for source in sources
+    ]
+    try:
+        wait_for(lambda: all(source.calls > 2 for source in sources))
+        stats = Poller.get_statistics()
+        assert stats["workers"] <= Poller.MAX_WORKERS
+        assert stats["polls"] >= 2 * len(sources)
+        poller_stats = pollers[0].get_statistics()
+        assert poller_stats["polls"] > 2
+        assert poller_stats["max_latency"] >= poller_stats["last_latency"]
+    finally:
+        for poller in pollers:
+            poller.stop()
+
+
+def test_is_equal_arrays():
+    array = numpy.arange(6)
+    assert Poller.is_equal(array, numpy.arange(6))
+    assert not Poller.is_equal(array, numpy.arange(1, 7))
+    # shape changes are simply a new value
+    assert not Poller.is_equal(array, array.reshape(2, 3))
+    assert not Poller.is_equal(array, numpy.arange(3))
+    assert not Poller.is_equal(array, Poller.NotInitializedValue)
+    assert not Poller.is_equal(Poller.NotInitializedValue, array)
+    assert Poller.is_equal(array, array.tolist())
+    assert Poller.is_equal(1.5, 1.5)
+    assert not Poller.is_equal(1.5, Poller.NotInitializedValue)
@@ -0,0 +1,200 @@
+import types
+
+import pytest
+
+from mxcubecore import HardwareRepository as HWR
+from mxcubecore.HardwareObjects.QueueModel import QueueModel
+from mxcubecore.model import queue_model_objects as qmo
+from mxcubecore.utils.queue_journal import (
+    FileJournalBackend,
+    QueueJournal,
+    RedisJournalBackend,
+)
+
+
+class FakeRedis:
+    """The redis commands used by RedisJournalBackend"""
+
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value):
+        self.data[key] = value
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+    def rpush(self, key, value):
+        self.data.setdefault(key, []).append(value)
+
+    def lrange(self, key, start, end):
+        return list(self.data.get(key, []))
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    def __init__(self, redis_client):
+        self.redis_client = redis_client
+        self.commands = []
+
+    def set(self, *args):
+        self.commands.append((self.redis_client.set, args))
+
+    def delete(self, *args):
+        self.commands.append((self.redis_client.delete, args))
+
+    def execute(self):
+        for function, args in self.commands:
+            function(*args)
+
+
+def queue_model_with_sample(location=(1, 1)):
+    queue_model = QueueModel("queue_model")
+    sample = qmo.Sample()
+    sample.location = location
+    queue_model.add_child(queue_model.get_model_root(), sample)
+    return queue_model, sample
+
+
+def add_data_collection(queue_model, parent, prefix):
+    data_collection = qmo.DataCollection()
+    data_collection.get_path_template().base_prefix = prefix
+    queue_model.add_child(parent, data_collection)
+    return data_collection
+
+
+def get_prefixes(sample):
+    return [
+        [task.get_path_template().base_prefix for task in group.get_children()]
+        for group in sample.get_children()
+    ]
+
+
+@pytest.fixture(params=["file", "redis"])
+def make_backend(request, tmp_path):
+    redis_client = FakeRedis()
+
+    def make_backend():
+        if request.param == "file":
+            return FileJournalBackend(str(tmp_path))
+        return RedisJournalBackend(redis_client, "mxcube:queue_journal")
+
+    return make_backend
+
+
+def test_journal_restore(make_backend):
+    queue_model, sample = queue_model_with_sample()
+    queue_model.set_journal(QueueJournal(queue_model, make_backend(), 3))
+    first_group = qmo.TaskGroup()
+    queue_model.add_child(sample, first_group)
+    add_data_collection(queue_model, first_group, "lyso")
+    second = add_data_collection(queue_model, first_group, "thau")
+    second_group = qmo.TaskGroup()
+    queue_model.add_child(sample, second_group)
+    removed = add_data_collection(queue_model, second_group, "insulin")
+    add_data_collection(queue_model, second_group, "trypsin")
+    queue_model.del_child(second_group, removed)
+    second.get_path_template().base_prefix = "thaumatin"
+    queue_model.node_changed(second)
+    queue_model.get_journal().close()
+
+    # the sample comes from LIMS or from the sample changer again
+    restored_model, restored_sample = queue_model_with_sample()
+    journal = QueueJournal(restored_model, make_backend())
+    restored_model.set_journal(journal)
+    assert restored_model.restore_queue() == "ispyb"
+    assert get_prefixes(restored_sample) == [["lyso", "thaumatin"], ["trypsin"]]
+
+    # the journal goes on from the restored queue
+    task = restored_sample.get_children()[1].get_children()[0]
+    restored_model.del_child(task.get_parent(), task)
+    journal.close()
+    queue_model, sample = queue_model_with_sample()
+    queue_model.set_journal(QueueJournal(queue_model, make_backend()))
+    queue_model.restore_queue()
+    assert get_prefixes(sample) == [["lyso", "thaumatin"], []]
+
+
+def test_file_journal_incomplete_record(tmp_path):
+    queue_model, sample = queue_model_with_sample()
+    backend = FileJournalBackend(str(tmp_path))
+    queue_model.set_journal(QueueJournal(queue_model, backend))
+    group = qmo.TaskGroup()
+    queue_model.add_child(sample, group)
+    add_data_collection(queue_model, group, "lyso")
+    add_data_collection(queue_model, group, "thau")
+    backend.close()
+    # MXCuBE stopped while writing the last record
+    with open(backend.journal_path, "r+b") as journal_file:
+        journal_file.truncate(journal_file.seek(0, 2) - 5)
+
+    restored_model, restored_sample = queue_model_with_sample()
+    restored_model.set_journal(QueueJournal(restored_model, backend))
+    restored_model.restore_queue()
+    assert get_prefixes(restored_sample) == [["lyso"]]
+
+
+def test_journal_other_session(tmp_path):
+    backend = FileJournalBackend(str(tmp_path))
+    queue_model, sample = queue_model_with_sample()
+    queue_model.set_journal(QueueJournal(queue_model, backend))
+    queue_model.add_child(sample, qmo.TaskGroup())
+    backend.close()
+
+    # a new queue, not restored, replaces what was stored
+    queue_model, sample = queue_model_with_sample((2, 2))
+    queue_model.set_journal(QueueJournal(queue_model, backend))
+    group = qmo.TaskGroup()
+    queue_model.add_child(sample, group)
+    add_data_collection(queue_model, group, "lyso")
+    backend.close()
+
+    restored_model, restored_sample = queue_model_with_sample((2, 2))
+    restored_model.set_journal(QueueJournal(restored_model, backend))
+    restored_model.restore_queue()
+    assert get_prefixes(restored_sample) == [["lyso"]]
+
+
+def test_journal_state_changes(tmp_path, monkeypatch):
+    backend = FileJournalBackend(str(tmp_path))
+    snapshots = []
+    write_snapshot = backend.write_snapshot
+
+    def count_snapshot(snapshot):
+        snapshots.append(snapshot)
+        write_snapshot(snapshot)
+
+    backend.write_snapshot = count_snapshot
+    queue_model, sample = queue_model_with_sample()
+    queue_model.set_journal(QueueJournal(queue_model, backend))
+    group = qmo.TaskGroup()
+    queue_model.add_child(sample, group)
+    data_collection = add_data_collection(queue_model, group, "lyso")
+    add_data_collection(queue_model, group, "thau")
+    assert len(snapshots) == 1
+
+    # recorded without node_changed
+    data_collection.set_enabled(False)
+    data_collection.set_executed(True)
+    # already saved: no snapshot written, the queue file is still written
+    queue_file = tmp_path / "queue_active.dat"
+    queue_manager = types.SimpleNamespace(get_queue_entry_list=list)
+    monkeypatch.setattr(
+        HWR, "beamline", types.SimpleNamespace(queue_manager=queue_manager)
+    )
+    queue_model.save_queue(str(queue_file))
+    assert len(snapshots) == 1
+    assert queue_file.exists()
+    backend.close()
+
+    restored_model, restored_sample = queue_model_with_sample()
+    restored_model.set_journal(QueueJournal(restored_model, backend))
+    restored_model.restore_queue()
+    lyso, thau = restored_sample.get_children()[0].get_children()
+    assert not lyso.is_enabled() and lyso.is_executed()
+    assert thau.is_enabled() and not thau.is_executed()
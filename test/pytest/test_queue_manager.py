@@ -0,0 +1,116 @@
+import pytest
+
+from mxcubecore.HardwareObjects.QueueManager import QueueManager
+from mxcubecore.model import queue_model_objects as qmo
+from mxcubecore.queue_entry import base_queue_entry
+
+LOAD_TIME = 0.2
+DELAY = 0.3
+
+
+class FakeView:
+    def setText(self, column, text):
+        pass
+
+    def setOn(self, state):
+        pass
+
+    def set_background_color(self, color):
+        pass
+
+    def set_queue_entry(self, entry):
+        pass
+
+
+class SampleQueueEntry(base_queue_entry.SampleQueueEntry):
+    """Without the grouped processing started after the collections"""
+
+    def post_execute(self):
+        base_queue_entry.BaseQueueEntry.post_execute(self)
+
+
+class DelayQueueEntry(base_queue_entry.DelayQueueEntry):
+    def __init__(self, executed, data_model):
+        super().__init__(FakeView(), data_model)
+        self.executed = executed
+
+    def execute(self):
+        super().execute()
+        self.executed.append(self)
+
+
+def sample_entry(queue_manager, basket, position, executed):
+    sample = qmo.Sample()
+    sample.location = (basket, position)
+    delay = qmo.DelayTask(DELAY)
+    delay._parent = sample
+    sample._children.append(delay)
+    entry = SampleQueueEntry(FakeView(), sample)
+    entry.set_enabled(True)
+    queue_manager.enqueue(entry)
+    delay_entry = DelayQueueEntry(executed, delay)
+    delay_entry.set_enabled(True)
+    entry.enqueue(delay_entry)
+    return entry
+
+
+@pytest.fixture
+def queue_manager(beamline):
+    beamline.sample_changer.load_time = LOAD_TIME
+    if beamline.sample_changer.has_loaded_sample():
+        beamline.sample_changer.unload()
+    queue_manager = QueueManager("queue_manager")
+    queue_manager.init()
+    yield queue_manager
+    queue_manager.stop()
+
+
+@pytest.mark.parametrize("pipelined", [False, True])
+def test_pipelined_sample_exchange(beamline, queue_manager, monkeypatch, pipelined):
+    queue_manager.set_pipelined(pipelined)
+    executed = []
+    entries = [
+        sample_entry(queue_manager, 3, position, executed) for position in (1, 2, 3)
+    ]
+    # the third sample is skipped: the load of the second one is prepared
+    entries[2].set_enabled(False)
+    robot_actions = []
+    monkeypatch.setattr(
+        beamline.lims, "store_robot_action", lambda action: robot_actions.append(action)
+    )
+
+    queue_manager.execute()
+    queue_manager._root_task.get()
+
+    assert beamline.sample_changer.is_mounted_sample((3, 2))
+    assert len(executed) == 2
+    assert [action["sampleId"] for action in robot_actions] == [-1, -1]
+    exchange_times = queue_manager.get_sample_exchange_times()
+    if not pipelined:
+        assert exchange_times == []
+    else:
+        assert [times["location"] for times in exchange_times] == [(3, 2)]
+        # picking the sample is half of the load, done during the collection
+        assert exchange_times[0]["saved_time"] == pytest.approx(LOAD_TIME / 2, abs=0.05)
+
+
+def test_pipelined_sample_exchange_disabled_sample(beamline, queue_manager):
+    queue_manager.set_pipelined(True)
+    executed = []
+    entries = [
+        sample_entry(queue_manager, 4, position, executed) for position in (1, 2, 3)
+    ]
+
+    def disable_second_sample(entry, status):
+        # disabled once its load is prepared: the prepared sample is put back
+        if entry is entries[0].get_queue_entry_list()[0]:
+            entries[1].set_enabled(False)
+
+    queue_manager.connect("queue_entry_execute_finished", disable_second_sample)
+
+    queue_manager.execute()
+    queue_manager._root_task.get()
+
+    assert beamline.sample_changer.is_mounted_sample((4, 3))
+    assert len(executed) == 2
+    assert queue_manager.get_sample_exchange_times() == []
@@ -0,0 +1,92 @@
+import pytest
+
+from mxcubecore.HardwareObjects.QueueModel import QueueModel
+from mxcubecore.model import queue_model_objects as qmo
+
+
+@pytest.fixture
+def queue_model():
+    return QueueModel("queue_model")
+
+
+def add_data_collection(queue_model, parent, prefix, run_number, start=1, num=10):
+    data_collection = qmo.DataCollection()
+    path_template = data_collection.get_path_template()
+    path_template.directory = "/data/test"
+    path_template.base_prefix = prefix
+    path_template.run_number = run_number
+    path_template.start_num = start
+    path_template.num_files = num
+    queue_model.add_child(parent, data_collection)
+    return data_collection
+
+
+def test_get_node(queue_model):
+    sample = qmo.Sample()
+    queue_model.add_child(queue_model.get_model_root(), sample)
+    group = qmo.TaskGroup()
+    queue_model.add_child(sample, group)
+    data_collection = add_data_collection(queue_model, group, "lyso", 1)
+
+    assert queue_model.get_node(sample._node_id) is sample
+    assert queue_model.get_node(data_collection._node_id) is data_collection
+    assert queue_model.get_node(data_collection._node_id, group) is data_collection
+
+    queue_model.del_child(sample, group)
+    assert queue_model.get_node(group._node_id) is None
+    assert queue_model.get_node(data_collection._node_id) is None
+
+    # nodes added to a group outside of the model are indexed with it
+    other_group = qmo.TaskGroup()
+    other_collection = add_data_collection(queue_model, other_group, "lyso", 1)
+    assert queue_model.get_node(other_collection._node_id) is None
+    queue_model.add_child(sample, other_group)
+    assert queue_model.get_node(other_collection._node_id) is other_collection
+
+
+def test_run_numbers_and_collisions(queue_model):
+    sample = qmo.Sample()
+    queue_model.add_child(queue_model.get_model_root(), sample)
+    group = qmo.TaskGroup()
+    queue_model.add_child(sample, group)
+    first = add_data_collection(queue_model, group, "lyso", 1)
+    second = add_data_collection(queue_model, group, "lyso", 3)
+    add_data_collection(queue_model, group, "thau", 7)
+
+    new_path_template = first.get_path_template().copy()
+    assert queue_model.get_next_run_number(new_path_template) == 4
+    assert queue_model.get_next_run_number(second.get_path_template()) == 2
+    assert (
+        queue_model.get_next_run_number(
+            second.get_path_template(), exclude_current=False
+        )
+        == 4
+    )
+
+    assert queue_model.check_for_path_collisions(new_path_template)
+    assert not queue_model.check_for_path_collisions(first.get_path_template())
+    new_path_template.start_num = 11
+    assert not queue_model.check_for_path_collisions(new_path_template)
+
+    # path templates changed in the model are moved in the index
+    second.get_path_template().base_prefix = "thau"
+    assert queue_model.get_next_run_number(new_path_template) == 2
+    second.get_path_template().run_number = 9
+    new_path_template.base_prefix = "thau"
+    assert queue_model.get_next_run_number(new_path_template) == 10
+
+    queue_model.del_child(group, second)
+    assert queue_model.get_next_run_number(new_path_template) == 8
+
+
+def test_copy_node(queue_model):
+    sample = qmo.Sample()
+    queue_model.add_child(queue_model.get_model_root(), sample)
+    group = qmo.TaskGroup()
+    queue_model.add_child(sample, group)
+    data_collection = add_data_collection(queue_model, group, "lyso", 1)
+
+    for run_number in range(2, 5):
+        copy = queue_model.copy_node(data_collection)
+        assert copy.get_path_template().run_number == run_number
+        queue_model.add_child(group, copy)
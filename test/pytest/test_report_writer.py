@@ -0,0 +1,98 @@
+import math
+import os
+
+import gevent
+
+from mxcubecore.utils.report_writer import ReportJob, ReportWriter
+
+
+def test_jobs_run_in_order():
+    writer = ReportWriter(processes=0)
+    calls = []
+    jobs = [
+        writer.submit("report %d" % index, (calls.append, (index,), False))
+        for index in range(3)
+    ]
+    # submitting does not wait for the jobs
+    assert not calls
+    assert writer.pending_jobs == jobs
+
+    assert writer.wait(5)
+    assert calls == [0, 1, 2]
+    assert all(job.state == ReportJob.DONE for job in jobs)
+    assert not writer.pending_jobs
+
+
+def test_failed_job_retry():
+    writer = ReportWriter(processes=0)
+    calls = []
+
+    def store(value):
+        if calls.count("failed") < 2:
+            calls.append("failed")
+            raise RuntimeError("LIMS not available")
+        calls.append(value)
+
+    job = writer.submit(
+        "report", (calls.append, ("plot",), False), (store, ("lims",), False)
+    )
+    assert not job.wait(5)
+    assert job.state == ReportJob.FAILED
+    assert job.next_stage == 1
+    assert "LIMS not available" in job.error
+    assert writer.failed_jobs == [job]
+
+    writer.retry(job)
+    assert not job.wait(5)
+    writer.retry()
+    assert job.wait(5)
+    # the stages done are not run again
+    assert calls == ["plot", "failed", "failed", "lims"]
+    assert job.attempts == 3
+    assert not writer.failed_jobs
+
+
+def test_bounded_queue():
+    writer = ReportWriter(max_pending=1, processes=0)
+    running = gevent.event.Event()
+    release = gevent.event.Event()
+
+    def blocking_stage():
+        running.set()
+        release.wait()
+
+    writer.submit("first", (blocking_stage, (), False))
+    running.wait(5)
+    writer.submit("second", (int, (), False))
+    # the queue is full: the third submission waits
+    third = gevent.spawn(writer.submit, "third", (int, (), False))
+    gevent.sleep(0.05)
+    assert not third.ready()
+    assert [job.name for job in writer.pending_jobs] == ["first", "second", "third"]
+
+    release.set()
+    assert third.get(timeout=5).wait(5)
+    assert writer.wait(5)
+
+
+def test_process_stages():
+    writer = ReportWriter(processes=1)
+    try:
+        job = writer.submit(
+            "report",
+            (os.getpid, (), True),
+            (math.factorial, (5,), True),
+            (os.getpid, (), False),
+        )
+        assert job.wait(30), job.error
+        child_pid, factorial, pid = job.results
+        assert factorial == 120
+        assert pid == os.getpid() != child_pid
+    finally:
+        writer.shutdown()
+
+    # in the thread pool
+    writer = ReportWriter(processes=0)
+    job = writer.submit("report", (math.factorial, (5,), True))
+    assert job.wait(5)
+    assert job.results == [120]
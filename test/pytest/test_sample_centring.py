@@ -0,0 +1,242 @@
+import math
+import os
+import time
+
+import gevent
+import numpy
+import pytest
+
+from mxcubecore.HardwareObjects import sample_centring
+from mxcubecore.HardwareObjects.abstract.AbstractVideoDevice import (
+    AbstractVideoDevice,
+)
+
+
+class FakeVideo(AbstractVideoDevice):
+    """Camera returning a fixed RGB image"""
+
+    def __init__(self, name, image):
+        super().__init__(name)
+        self.image = image
+        self.scale = 1
+        self.cam_mirror = [False, False]
+
+    def get_image(self):
+        height, width = self.image.shape[:2]
+        return self.image.tobytes(), width, height
+
+
+class FakeSampleView:
+    def __init__(self, frame=None):
+        self.frame = frame
+        self.snapshots = []
+
+    def get_frame(self, bw=True):
+        return self.frame
+
+    def save_snapshot(self, filename, overlay=True, bw=False):
+        self.snapshots.append(filename)
+
+
+class FakeLoopFinder(sample_centring.LoopFinder):
+    def __init__(self, result):
+        self.result = result
+        self.images = []
+
+    def find_loop(self, image, rotation=None):
+        self.images.append(image)
+        return self.result
+
+
+def test_video_frame():
+    rgb = numpy.zeros((4, 6, 3), dtype=numpy.uint8)
+    rgb[0, 0] = (255, 255, 255)
+    video = FakeVideo("camera", rgb)
+
+    frame = video.get_frame()
+    assert frame.shape == (4, 6)
+    assert frame.dtype == numpy.uint8
+    assert frame[0, 0] == 255 and frame[3, 5] == 0
+    assert video.get_frame(bw=False).shape == (4, 6, 3)
+
+    video.cam_mirror = [True, True]
+    assert video.get_frame()[3, 5] == 255
+
+    video.scale = 0.5
+    assert video.get_frame().shape == (2, 3)
+
+
+def test_find_loop_from_frame(monkeypatch):
+    finder = FakeLoopFinder(("Coord", 10, 20))
+    monkeypatch.setattr(sample_centring, "LOOP_FINDER", finder)
+    frame = numpy.zeros((4, 6), dtype=numpy.uint8)
+    sample_view = FakeSampleView(frame)
+    messages = []
+    points = []
+
+    assert sample_centring.find_loop(
+        sample_view, 1.0, 0, messages.append, points.append
+    ) == (10, 20)
+    assert finder.images[0] is frame
+    assert not sample_view.snapshots
+    assert points == [(10, 20)]
+    assert messages[0].startswith("Loop found: Coord (10, 20), image")
+    assert "(array)" in messages[0]
+
+
+def test_find_loop_from_snapshot(monkeypatch):
+    finder = FakeLoopFinder(("No loop detected", None, None))
+    monkeypatch.setattr(sample_centring, "LOOP_FINDER", finder)
+    # no frame source: falls back on a snapshot file
+    sample_view = FakeSampleView(None)
+    messages = []
+
+    assert sample_centring.find_loop(sample_view, 1.0, 0, messages.append, None) == (
+        -1,
+        -1,
+    )
+    assert finder.images == sample_view.snapshots
+    assert os.path.basename(finder.images[0]) == "mxcube_sample_snapshot.png"
+    assert messages[0].startswith("No loop found: image")
+
+
+class FakeMotor:
+    """Motor moving at constant velocity, emitting valueChanged on the way"""
+
+    def __init__(self, value=0.0, velocity=900.0):
+        self.value = value
+        self.velocity = velocity
+        self.receivers = []
+        self.task = None
+        self.move = None
+
+    def get_value(self):
+        if self.move is None:
+            return self.value
+        start, target, start_time = self.move
+        distance = self.velocity * (time.monotonic() - start_time)
+        if distance >= abs(target - start):
+            return target
+        return start + math.copysign(distance, target - start)
+
+    def is_ready(self):
+        return self.task is None or self.task.ready()
+
+    def wait_ready(self, timeout=None):
+        if self.task is not None:
+            self.task.join(timeout)
+
+    def set_value(self, value, timeout=0):
+        self.move = (self.value, value, time.monotonic())
+        self.task = gevent.spawn(self._move, value)
+        if timeout != 0:
+            self.wait_ready(timeout)
+
+    def set_value_relative(self, value, timeout=0):
+        self.set_value(self.value + value, timeout)
+
+    def connect(self, signal, receiver):
+        self.receivers.append(receiver)
+
+    def disconnect(self, signal, receiver):
+        self.receivers.remove(receiver)
+
+    def _move(self, value):
+        while self.get_value() != value:
+            gevent.sleep(0.005)
+            for receiver in self.receivers:
+                receiver(self.get_value())
+        self.value = value
+        self.move = None
+
+
+class PhiSampleView(FakeSampleView):
+    """Frames recording the phi position they are taken at"""
+
+    def __init__(self, phi):
+        super().__init__()
+        self.phi = phi
+
+    def get_frame(self, bw=True):
+        return numpy.array([self.phi.get_value()])
+
+
+class OffCentreLoopFinder(sample_centring.LoopFinder):
+    """Loop 0.1 mm off the rotation axis, not found from 55 to 85 degrees"""
+
+    def find_loop(self, image, rotation=None):
+        phi = image[0]
+        if 55 <= phi < 85:
+            return "No loop detected", None, None
+        return "Coord", 200, 100 + 100 * math.sin(math.radians(phi))
+
+
+@pytest.mark.parametrize("continuous", [False, True])
+def test_auto_center_pipelined(monkeypatch, continuous):
+    monkeypatch.setattr(sample_centring, "LOOP_FINDER", OffCentreLoopFinder())
+    motors = {
+        name: sample_centring.CentringMotor(FakeMotor())
+        for name in ("phi", "phiy", "phiz", "sampx", "sampy")
+    }
+    phi, phiy, phiz, sampx, sampy = sample_centring.prepare(motors)
+    messages = []
+    points = []
+
+    centred_pos = sample_centring.auto_center_pipelined(
+        PhiSampleView(phi.motor),
+        phi,
+        phiy,
+        phiz,
+        sampx,
+        sampy,
+        1000.0,
+        1000.0,
+        200,
+        100,
+        0,
+        7,
+        messages.append,
+        points.append,
+        continuous=continuous,
+    )
+    # the image at (about) 60 degrees is left out of the fit
+    assert len(points) == 1 + 6
+    assert messages[-1].startswith("Loop found in 6 of 7 images")
+    # the loop moves on a 0.1 mm circle, centred on the beam
+    assert abs(centred_pos[phiy.motor]) < 1e-3
+    assert abs(centred_pos[phiz.motor]) < 1e-3
+    assert math.hypot(centred_pos[sampx.motor], centred_pos[sampy.motor]) == (
+        pytest.approx(0.1, abs=2e-3)
+    )
+    # phi back to its initial position
+    assert phi.get_value() == 0
+
+
+def test_auto_center_pipelined_without_loop(monkeypatch):
+    monkeypatch.setattr(
+        sample_centring, "LOOP_FINDER", FakeLoopFinder(("No loop detected", -1, -1))
+    )
+    motors = {
+        name: sample_centring.CentringMotor(FakeMotor())
+        for name in ("phi", "phiy", "phiz", "sampx", "sampy")
+    }
+    phi, phiy, phiz, sampx, sampy = sample_centring.prepare(motors)
+    messages = []
+
+    sample_centring.auto_center_pipelined(
+        PhiSampleView(phi.motor),
+        phi,
+        phiy,
+        phiz,
+        sampx,
+        sampy,
+        1000.0,
+        1000.0,
+        200,
+        100,
+        0,
+        3,
+        messages.append,
+        None,
+    )
+    assert messages[-1] == "No loop detected, aborting"
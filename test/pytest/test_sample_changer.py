@@ -1,3 +1,8 @@
+import gevent.queue
+
+from mxcubecore.CommandContainer import ChannelObject
+
+
 def test_sample_change_init(beamline):
     assert (
         beamline.sample_changer is not None
@@ -38,3 +43,95 @@ def test_sample_changer_get_status(beamline):
 
 def test_sample_changer_get_loaded_sample(beamline):
     pass
+
+
+def test_container_indexes(beamline):
+    sample_changer = beamline.sample_changer
+    basket = sample_changer.get_component_by_address("2")
+    pin = sample_changer.get_component_by_address("2:03")
+    assert pin in basket.get_components()
+    assert basket.get_component_by_address("2:03") is pin
+    assert sample_changer.get_component_by_address("9:99") is None
+
+    pin._set_info(True, "pin-id", False)
+    assert sample_changer.get_component_by_id("pin-id") is pin
+    assert basket.has_component_id("pin-id")
+    assert pin in sample_changer.get_present_samples()
+
+    pin.clear_info()
+    assert sample_changer.get_component_by_id("pin-id") is None
+    assert pin not in sample_changer.get_present_samples()
+
+    basket._remove_component(pin)
+    assert sample_changer.get_component_by_address("2:03") is None
+    assert pin not in sample_changer.get_sample_list()
+    basket._add_component(pin)
+    assert sample_changer.get_component_by_address("2:03") is pin
+    assert pin in sample_changer.get_sample_list()
+
+
+class SteppedEvent:
+    """Update event of the sample changer, each wait ended by the test"""
+
+    def __init__(self):
+        self.flag = False
+        self.waits = gevent.queue.Queue()
+        self.steps = gevent.queue.Queue()
+
+    def is_set(self):
+        return self.flag
+
+    def set(self):
+        self.flag = True
+
+    def clear(self):
+        self.flag = False
+
+    def wait(self, timeout=None):
+        self.waits.put(timeout)
+        self.steps.get()
+        return self.flag
+
+    def step(self):
+        """End the current wait: set if the event is set, timed out otherwise.
+        Returns:
+            (float): timeout of the next wait
+        """
+        self.steps.put(None)
+        return self.waits.get(timeout=5)
+
+
+def test_sample_changer_update_on_change(beamline, monkeypatch):
+    sample_changer = beamline.sample_changer
+    event = SteppedEvent()
+    monkeypatch.setattr(sample_changer, "_update_event", event)
+    monkeypatch.setattr(sample_changer, "UPDATE_COALESCE_TIME", 0)
+    channel = ChannelObject("presence")
+    channel.connect_signal("update", sample_changer._on_channel_update)
+    sample_changer.update_poll_interval = 0.2
+    sample_changer.update_max_poll_interval = 0.8
+    counters = sample_changer.get_update_counters()
+    update_task = sample_changer._start_update_on_change()
+    try:
+        assert event.waits.get(timeout=5) == 0.2
+
+        # a burst of updates is gathered in one refresh
+        for value in range(5):
+            channel.emit("update", value)
+        assert event.step() == 0.2
+        new_counters = sample_changer.get_update_counters()
+        assert new_counters["refreshes"] == counters["refreshes"] + 1
+        assert new_counters["skipped"] == counters["skipped"] + 4
+
+        # without updates, polls get further apart
+        assert [event.step() for _ in range(3)] == [0.4, 0.8, 0.8]
+        new_counters = sample_changer.get_update_counters()
+        assert new_counters["refreshes"] == counters["refreshes"] + 1
+        assert new_counters["polls"] == counters["polls"] + 3
+        assert new_counters["poll_interval"] == 0.8
+
+        # an update brings the polls closer again
+        channel.emit("update", 5)
+        assert event.step() == 0.2
+    finally:
+        update_task.kill()
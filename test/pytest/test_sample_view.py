@@ -21,8 +21,15 @@
 from __future__ import division, absolute_import
 from __future__ import print_function, unicode_literals
 
+import math
+import sys
+
+import numpy
 import pytest
 
+from mxcubecore.HardwareObjects import sample_centring
+from mxcubecore.HardwareObjects.GenericDiffractometer import GenericDiffractometer
+
 __copyright__ = """ Copyright © 2010 - 2020 by MXCuBE Collaboration """
 __license__ = "LGPLv3+"
 
@@ -133,3 +140,153 @@ def test_sample_view_select_shape(sample_view):
 
     sample_view.de_select_all()
     assert len(sample_view.get_selected_shapes()) == 0
+
+
+class FakeMotor:
+    def __init__(self, value):
+        self.value = value
+
+    def get_value(self):
+        return self.value
+
+
+CURRENT_POSITION = {
+    "phi": 30.0,
+    "phiy": 0.1,
+    "phiz": -0.2,
+    "sampx": 0.3,
+    "sampy": 0.4,
+}
+
+
+def centred_diffractometer(monkeypatch, diffractometer_class=GenericDiffractometer):
+    diffractometer = diffractometer_class("diffractometer")
+    monkeypatch.setattr(diffractometer, "update_zoom_calibration", lambda: None)
+    diffractometer.use_sample_centring = True
+    diffractometer.pixels_per_mm_x = 400.0
+    diffractometer.pixels_per_mm_y = 500.0
+    diffractometer.beam_position = (320, 240)
+    for name, value in CURRENT_POSITION.items():
+        setattr(
+            diffractometer,
+            "centring_" + name,
+            sample_centring.CentringMotor(
+                FakeMotor(value), direction=-1 if name in ("phi", "phiy") else 1
+            ),
+        )
+    return diffractometer
+
+
+def test_motor_positions_to_screen_batch(monkeypatch):
+    diffractometer = centred_diffractometer(monkeypatch)
+    current = CURRENT_POSITION
+    assert diffractometer.supports_batch_projection()
+
+    positions = numpy.random.default_rng(0).uniform(-1, 1, (50, 5))
+    screen_positions = diffractometer.motor_positions_to_screen_batch(positions)
+    assert screen_positions.shape == (50, 2)
+
+    phi = math.radians(-current["phi"])
+    for (_, phiy, phiz, sampx, sampy), (x, y) in zip(positions, screen_positions):
+        sampx -= current["sampx"]
+        sampy -= current["sampy"]
+        dy = sampx * math.sin(phi) + sampy * math.cos(phi)
+        assert x == pytest.approx(320 - (phiy - current["phiy"]) * 400)
+        assert y == pytest.approx(240 + dy * 400 + (phiz - current["phiz"]) * 500)
+
+    position = dict(zip(diffractometer.SCREEN_PROJECTION_MOTORS, positions[0]))
+    assert diffractometer.motor_positions_to_screen(position) == pytest.approx(
+        tuple(screen_positions[0])
+    )
+    del position["sampy"]
+    with pytest.raises(KeyError):
+        diffractometer.motor_positions_to_screen(position)
+
+
+class OffsetDiffractometer(GenericDiffractometer):
+    """Diffractometer with its own projection, based on the generic one"""
+
+    def motor_positions_to_screen(self, centred_positions_dict):
+        x, y = super().motor_positions_to_screen(centred_positions_dict)
+        return x + 10, y
+
+
+def test_motor_positions_to_screen_override(monkeypatch):
+    diffractometer = centred_diffractometer(monkeypatch, OffsetDiffractometer)
+    generic_diffractometer = centred_diffractometer(monkeypatch)
+    assert not diffractometer.supports_batch_projection()
+
+    # the override is used in batch, and its super() call does not recurse
+    positions = numpy.random.default_rng(0).uniform(-1, 1, (5, 5))
+    screen_positions = diffractometer.motor_positions_to_screen_batch(positions)
+    expected = generic_diffractometer.motor_positions_to_screen_batch(positions)
+    assert screen_positions == pytest.approx(expected + [10, 0])
+
+
+class FakeClock:
+    """Clock and timer of the shape updates throttling"""
+
+    def __init__(self):
+        self.time = 100.0
+        self.timers = []
+
+    def monotonic(self):
+        return self.time
+
+    def spawn_later(self, delay, function):
+        self.timers.append((self.time + delay, function))
+        return function
+
+    def run_timer(self):
+        self.time, function = self.timers.pop(0)
+        function()
+
+
+def test_sample_view_update_throttling(sample_view, monkeypatch):
+    clock = FakeClock()
+    module = sys.modules[type(sample_view).__module__]
+    monkeypatch.setattr(module, "time", clock)
+    monkeypatch.setattr(module, "gevent", clock)
+    updates = []
+    sample_view.connect("shapesChanged", lambda: updates.append(clock.time))
+    sample_view._shape_update_interval = 0.05
+    sample_view._last_shape_update = 0
+
+    # the first update is done at once, the next one when it is due
+    sample_view._update_shape_positions()
+    assert updates == [100.0]
+    for _ in range(10):
+        clock.time += 0.001
+        sample_view._update_shape_positions()
+    assert updates == [100.0]
+    assert [due for due, _ in clock.timers] == [pytest.approx(100.05)]
+
+    clock.run_timer()
+    assert updates == [100.0, pytest.approx(100.05)]
+    assert sample_view._shape_update_task is None
+
+    # requested after the interval: done at once
+    clock.time += 0.2
+    sample_view._update_shape_positions()
+    assert len(updates) == 3
+    assert not clock.timers
+    for shape in sample_view.get_shapes():
+        if shape.state != "HIDDEN":
+            assert len(shape.screen_coord) == 2 * len(shape.cp_list)
+
+
+def test_sample_view_update_own_projection(sample_view, beamline, monkeypatch):
+    diffractometer = beamline.diffractometer
+
+    def batch(positions):
+        raise AssertionError("positions projected in batch")
+
+    # the diffractometer has its own projection, which may need other motors
+    monkeypatch.setattr(diffractometer, "motor_positions_to_screen_batch", batch)
+    monkeypatch.setattr(
+        diffractometer, "motor_positions_to_screen", lambda cpos: (cpos["kappa"], 7)
+    )
+    sample_view.update_shape_positions()
+
+    point = sample_view.get_points()[0]
+    assert point.screen_coord == (point.cp_list[0].as_dict()["kappa"], 7)
@@ -0,0 +1,174 @@
+import os
+
+import pytest
+
+from mxcubecore.utils import soap_clients
+
+WSDL = """<?xml version="1.0" encoding="UTF-8"?>
+<definitions xmlns="http://schemas.xmlsoap.org/wsdl/"
+    xmlns:soap="http://schemas.xmlsoap.org/wsdl/soap/"
+    xmlns:xs="http://www.w3.org/2001/XMLSchema"
+    xmlns:tns="http://ispyb.test/"
+    targetNamespace="http://ispyb.test/" name="ToolsForCollectionWebService">
+  <types>
+    <xs:schema targetNamespace="http://ispyb.test/" version="1.0">
+      <xs:element name="storeOrUpdateWorkflow" type="tns:storeOrUpdateWorkflow"/>
+      <xs:element name="storeOrUpdateWorkflowResponse"
+          type="tns:storeOrUpdateWorkflowResponse"/>
+      <xs:complexType name="storeOrUpdateWorkflow">
+        <xs:sequence>
+          <xs:element name="workflow" type="tns:workflow3VO" minOccurs="0"/>
+        </xs:sequence>
+      </xs:complexType>
+      <xs:complexType name="storeOrUpdateWorkflowResponse">
+        <xs:sequence>
+          <xs:element name="return" type="xs:int"/>
+        </xs:sequence>
+      </xs:complexType>
+      <xs:complexType name="workflow3VO">
+        <xs:sequence>
+          <xs:element name="workflowId" type="xs:int" minOccurs="0"/>
+          <xs:element name="workflowType" type="xs:string" minOccurs="0"/>
+          <xs:element name="comments" type="xs:string" minOccurs="0"/>
+        </xs:sequence>
+      </xs:complexType>
+    </xs:schema>
+  </types>
+  <message name="storeOrUpdateWorkflow">
+    <part name="parameters" element="tns:storeOrUpdateWorkflow"/>
+  </message>
+  <message name="storeOrUpdateWorkflowResponse">
+    <part name="parameters" element="tns:storeOrUpdateWorkflowResponse"/>
+  </message>
+  <portType name="ToolsForCollectionWebService">
+    <operation name="storeOrUpdateWorkflow">
+      <input message="tns:storeOrUpdateWorkflow"/>
+      <output message="tns:storeOrUpdateWorkflowResponse"/>
+    </operation>
+  </portType>
+  <binding name="CollectionBinding" type="tns:ToolsForCollectionWebService">
+    <soap:binding style="document" transport="http://schemas.xmlsoap.org/soap/http"/>
+    <operation name="storeOrUpdateWorkflow">
+      <soap:operation soapAction=""/>
+      <input><soap:body use="literal"/></input>
+      <output><soap:body use="literal"/></output>
+    </operation>
+  </binding>
+  <service name="ToolsForCollectionWebService">
+    <port name="CollectionPort" binding="tns:CollectionBinding">
+      <soap:address location="http://ispyb.test/ToolsForCollectionWebService"/>
+    </port>
+  </service>
+</definitions>
+"""
+
+REPLY = b"""<?xml version="1.0" encoding="UTF-8"?>
+<S:Envelope xmlns:S="http://schemas.xmlsoap.org/soap/envelope/">
+  <S:Body>
+    <ns2:storeOrUpdateWorkflowResponse xmlns:ns2="http://ispyb.test/">
+      <return>42</return>
+    </ns2:storeOrUpdateWorkflowResponse>
+  </S:Body>
+</S:Envelope>
+"""
+
+
+class FakeResponse:
+    status_code = 200
+    reason = "OK"
+    headers = {"Content-Type": "text/xml"}
+    content = REPLY
+
+
+class FakeSession:
+    """requests.Session, recording the requests"""
+
+    sessions = []
+
+    def __init__(self):
+        self.auth = None
+        self.proxies = {}
+        self.posts = []
+        FakeSession.sessions.append(self)
+
+    def post(self, url, data=None, headers=None, timeout=None):
+        self.posts.append((url, data))
+        return FakeResponse()
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def wsdl_urls(tmp_path):
+    urls = []
+    for name in ("collection", "shipping"):
+        path = tmp_path / ("%s.wsdl" % name)
+        path.write_text(WSDL)
+        urls.append(path.as_uri())
+    return urls
+
+
+@pytest.fixture
+def registry(tmp_path, monkeypatch):
+    FakeSession.sessions = []
+    monkeypatch.setattr(soap_clients.requests, "Session", FakeSession)
+    return soap_clients.SoapClientRegistry(str(tmp_path / "cache"))
+
+
+def test_clients_and_sessions_reused(registry, wsdl_urls):
+    collection_url, shipping_url = wsdl_urls
+    client = registry.get_client(collection_url, "user", "secret")
+    assert registry.get_client(collection_url, "user", "secret") is client
+    shipping_client = registry.get_client(shipping_url, "user", "secret")
+    assert shipping_client is not client
+    assert len(FakeSession.sessions) == 1
+    assert FakeSession.sessions[0].auth == ("user", "secret")
+    assert registry.get_client(collection_url, "other", "secret") is not client
+    assert len(FakeSession.sessions) == 2
+
+
+def test_wsdl_disk_cache(registry, wsdl_urls, tmp_path):
+    registry.get_client(wsdl_urls[0])
+    assert os.listdir(str(tmp_path / "cache"))
+
+    # an other process: the WSDL is read from the cache
+    os.remove(str(tmp_path / "collection.wsdl"))
+    other_registry = soap_clients.SoapClientRegistry(str(tmp_path / "cache"))
+    client = other_registry.get_client(wsdl_urls[0])
+    assert client.factory.create("workflow3VO") is not None
+
+    no_cache_registry = soap_clients.SoapClientRegistry("")
+    with pytest.raises(Exception):
+        no_cache_registry.get_client(wsdl_urls[0])
+
+
+def test_create_object(registry, wsdl_urls):
+    first = registry.create_object(wsdl_urls[0], "workflow3VO")
+    first.workflowType = "MeshScan"
+    second = registry.create_object(wsdl_urls[0], "workflow3VO")
+    assert second.workflowType is None
+    assert len(registry._prototypes) == 1
+    # the client created for the value objects is the one of the web service
+    assert list(registry._clients) == [(wsdl_urls[0], None, None, ())]
+
+
+def test_latency_metrics(registry, wsdl_urls):
+    client = registry.get_client(wsdl_urls[0])
+    workflow = registry.create_object(wsdl_urls[0], "workflow3VO")
+    workflow.workflowType = "MeshScan"
+
+    assert client.service.storeOrUpdateWorkflow(workflow) == 42
+    assert client.service.storeOrUpdateWorkflow(workflow) == 42
+
+    session = FakeSession.sessions[0]
+    assert [url for url, _ in session.posts] == [
+        "http://ispyb.test/ToolsForCollectionWebService"
+    ] * 2
+    assert b"MeshScan" in session.posts[0][1]
+    metrics = registry.get_latency_metrics()
+    assert list(metrics) == ["ToolsForCollectionWebService.storeOrUpdateWorkflow"]
+    assert metrics["ToolsForCollectionWebService.storeOrUpdateWorkflow"]["calls"] == 2
+    assert metrics["ToolsForCollectionWebService.storeOrUpdateWorkflow"]["errors"] == 0
+    registry.reset_latency_metrics()
+    assert registry.get_latency_metrics() == {}
@@ -0,0 +1,194 @@
+import gevent
+import PyTango
+import pytest
+
+from mxcubecore.Command import Tango
+
+DEVICE_NAME = "test/polled/device"
+
+
+class FakeAttribute:
+    def __init__(self, value):
+        self.value = value
+        self.has_failed = False
+
+
+class FakeDevice:
+    """Tango device proxy, counting the reads"""
+
+    def __init__(self, device_name):
+        self.values = {"position": 1.0, "state": "ON", "velocity": 2.0}
+        self.broken = set()
+        # attributes read without a value
+        self.invalid = set()
+        self.grouped_reads = 0
+        self.reads = 0
+
+    def read_attributes(self, attribute_names, extract_as=None):
+        self.grouped_reads += 1
+        if self.broken.intersection(attribute_names):
+            raise PyTango.DevFailed()
+        return [self._attribute(name) for name in attribute_names]
+
+    def read_attribute(self, attribute_name, extract_as=None):
+        self.reads += 1
+        if attribute_name in self.broken:
+            raise PyTango.DevFailed()
+        return self._attribute(attribute_name)
+
+    def _attribute(self, attribute_name):
+        attribute = FakeAttribute(self.values[attribute_name])
+        if attribute_name in self.invalid:
+            attribute.value = None
+            attribute.has_failed = True
+        return attribute
+
+
+class FakeChannel:
+    def __init__(self, attribute_name):
+        self.attribute_name = attribute_name
+        self.values = []
+        self.errors = []
+
+    def polled_value_changed(self, value):
+        self.values.append(value)
+
+    def poll_failed(self, e, poller_id):
+        self.errors.append(e)
+
+
+def wait_for(condition, timeout=3):
+    with gevent.Timeout(timeout):
+        while not condition():
+            gevent.sleep(0.01)
+
+
+@pytest.fixture
+def polled_device(monkeypatch):
+    monkeypatch.setattr(Tango, "DeviceProxy", FakeDevice)
+    polled_device = Tango.get_polled_device(DEVICE_NAME, 10)
+    yield polled_device
+    polled_device.stop()
+
+
+def add_channels(polled_device):
+    channels = [FakeChannel(name) for name in ("position", "state", "velocity")]
+    for channel in channels:
+        polled_device.add_channel(channel)
+    return channels
+
+
+def test_polled_channels_grouped(polled_device):
+    assert Tango.get_polled_device(DEVICE_NAME, 10) is polled_device
+    other_polled_device = Tango.get_polled_device(DEVICE_NAME, 100)
+    assert other_polled_device is not polled_device
+    other_polled_device.stop()
+
+    channels = add_channels(polled_device)
+    wait_for(lambda: all(channel.values for channel in channels))
+
+    assert [channel.values[0] for channel in channels] == [1.0, "ON", 2.0]
+    assert polled_device.raw_device.reads == 0
+    assert Tango.get_polling_statistics()["polled_attributes"] >= 3
+
+
+def test_polled_channels_round_trips(polled_device):
+    channels = add_channels(polled_device)
+    wait_for(lambda: polled_device.raw_device.grouped_reads)
+    polled_device.poller.stop()
+    # let a read in progress finish
+    gevent.sleep(0.1)
+
+    round_trips_saved = Tango._PolledDevice.round_trips_saved
+    values = polled_device.read()
+    assert [attr.value for _, attr in values] == [1.0, "ON", 2.0]
+    assert Tango._PolledDevice.round_trips_saved == round_trips_saved + 2
+
+    # read attribute by attribute: no round-trip saved
+    polled_device.raw_device.broken.add("state")
+    polled_device.read()
+    assert Tango._PolledDevice.round_trips_saved == round_trips_saved + 2
+    assert polled_device.raw_device.reads == len(channels)
+
+
+def test_polled_channel_failure_isolated(polled_device):
+    polled_device.raw_device.broken.add("state")
+    position, state, velocity = add_channels(polled_device)
+
+    wait_for(lambda: state.errors and position.values and velocity.values)
+    assert isinstance(state.errors[0], PyTango.DevFailed)
+    assert not position.errors and not velocity.errors
+    assert [attr for _, attr in polled_device.channels] == ["position", "velocity"]
+
+    # the other channels are still polled, grouped again
+    grouped_reads = polled_device.raw_device.grouped_reads
+    values_num = len(position.values)
+    wait_for(lambda: len(position.values) > values_num + 2)
+    assert polled_device.raw_device.grouped_reads > grouped_reads
+    assert len(state.errors) == 1
+    assert polled_device.poller is not None
+
+
+def test_polled_channel_without_value(polled_device):
+    polled_device.raw_device.invalid.add("state")
+    position, state, velocity = add_channels(polled_device)
+
+    wait_for(lambda: len(state.values) > 2)
+    # still polled, the value is None and not an error
+    assert set(state.values) == {None}
+    assert not state.errors
+    assert len(polled_device.channels) == 3
+
+    polled_device.raw_device.invalid.clear()
+    wait_for(lambda: state.values[-1] == "ON")
+
+
+def test_polled_device_failure(polled_device):
+    polled_device.raw_device.broken.update(["position", "state", "velocity"])
+    channels = add_channels(polled_device)
+
+    wait_for(lambda: all(channel.errors for channel in channels))
+    assert polled_device.poller is None
+    assert not any(channel.values for channel in channels)
+
+
+class Receiver:
+    def __init__(self):
+        self.values = []
+
+    def update(self, value):
+        self.values.append(value)
+
+
+def test_events_coalesced():
+    events = Tango._TangoEventQueue()
+    # the state receiver is only referenced from the list, to be dropped
+    position, receivers = Receiver(), [Receiver()]
+    events.register(1, position.update)
+    events.register(2, receivers[0].update)
+
+    # events pushed before the hub wakes up: only the last value is delivered
+    for value in (1.0, 2.0, 3.0):
+        events.put(1, value)
+    events.put(2, "ON")
+    wait_for(lambda: position.values and receivers[0].values)
+    assert position.values == [3.0]
+    assert receivers[0].values == ["ON"]
+
+    events.put(1, 4.0)
+    wait_for(lambda: len(position.values) == 2)
+    assert position.values == [3.0, 4.0]
+    assert events.get_statistics() == {
+        "receivers": 2,
+        "pending": 0,
+        "events_received": 5,
+        "events_coalesced": 2,
+        "events_delivered": 3,
+    }
+
+    # the receiver is removed with its channel
+    receivers.clear()
+    assert events.get_statistics()["receivers"] == 1
+    events.put(2, "OFF")
+    gevent.sleep(0.05)
+    assert events.get_statistics()["events_delivered"] == 3